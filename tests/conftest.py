@@ -10,6 +10,8 @@
       
 """
 
+import os
+
 import pytest
 
 
@@ -17,6 +19,7 @@ def pytest_addoption(parser):
     parser.addoption("--runstaged", action="store_true", default=False, help="run staged order tests")
     parser.addoption("--runalgo", action="store_true", default=False, help="run algo order tests")
     parser.addoption("--runbars", action="store_true", default=True, help="run barchart tests")
+    parser.addoption("--runbenchmark", action="store_true", default=False, help="run benchmark tests")
 
 
 def pytest_collection_modifyitems(config, items):
@@ -31,3 +34,44 @@ def pytest_collection_modifyitems(config, items):
     modify('--runstaged', 'need --runstaged option to run', 'staged')
     modify('--runalgo', 'need --runalgo option to run', 'algo')
     modify('--runbars', 'need --runbars option to run', 'bars')
+    modify('--runbenchmark', 'need --runbenchmark option to run', 'benchmark')
+
+
+class IdleLoop(object):
+    """LoopingCall stand-in for local tests, which call the periodic methods themselves"""
+
+    def __init__(self, f, *args, **kwargs):
+        self.f = f
+
+    def start(self, interval, now=True):
+        pass
+
+    def stop(self):
+        pass
+
+
+@pytest.fixture
+def rtx_api(request, monkeypatch, tmp_path):
+    """an RTX built from the config defaults, with no gateway connections or timers running
+
+    parametrize indirectly with a dict of config overrides, e.g. {'API_SESSION_ROUTES': 'TA_SRV=market'}; reported
+    errors and client broadcasts are recorded in api.errors and api.broadcast; order history files are kept in
+    tmp_path/order-history
+    """
+    from txtrader import rtx
+    for key in [key for key in os.environ if key.startswith('TXTRADER_')]:
+        monkeypatch.delenv(key)
+    monkeypatch.setenv('TXTRADER_ORDER_HISTORY_DIR', str(tmp_path / 'order-history'))
+    for key, value in getattr(request, 'param', {}).items():
+        monkeypatch.setenv(f"TXTRADER_{key}", str(value))
+    monkeypatch.setattr(rtx.RTX_Session, 'connect', lambda session: None)
+    monkeypatch.setattr(rtx, 'LoopingCall', IdleLoop)
+    api = rtx.RTX()
+    api.errors = []
+    api.broadcast = []
+    monkeypatch.setattr(api, 'error_handler', lambda id, msg: api.errors.append(msg))
+    monkeypatch.setattr(api, 'WriteAllClients', lambda msg, option_flag=None: api.broadcast.append(msg))
+    yield api
+    timer = api.send_scheduler.timer
+    if timer and timer.active():
+        timer.cancel()
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+  test_benchmark.py
+  -----------------
+
+  TxTrader local benchmark tests; run with --runbenchmark
+
+  Copyright (c) 2020 Reliance Systems Inc. <mkrueger@rstms.net>
+  Licensed under the MIT license.  See LICENSE for details.
+
+"""
+
+import datetime
+import json
+import time
+
+import pytest
+import pytz
+
+from txtrader.rtx import API_TimeConverter, API_Order, API_Callback, API_IndexedStore, API_OrderHistory, NAIVE_EPOCH
+
+TIME_CONVERSION_COUNT = 1000000
+ORDER_UPDATE_COUNT = 500
+ORDER_QUERY_COUNT = 20000
+
+
+class BenchmarkAPI(object):
+    """minimal RTX stand-in for exercising order objects without a gateway"""
+
+    log_order_updates = False
+    log_order_update_dups = False
+    callback_timeout = {'DEFAULT': 60}
+    order_history_size = 50
+
+    def __init__(self, path):
+        self.sent = []
+        self.deltas = []
+        self.orders = API_IndexedStore()
+        self.order_history = API_OrderHistory(self, str(path))
+
+    def debug(self, msg):
+        pass
+
+    def output(self, msg):
+        pass
+
+    def error_handler(self, id, msg):
+        raise AssertionError(f"{id} {msg}")
+
+    def get_cusip(self, symbol):
+        return '000000000'
+
+    def make_account(self, row):
+        return '%s.%s.%s.%s' % (row['BANK'], row['BRANCH'], row['CUSTOMER'], row['DEPOSIT'])
+
+    def send_order_update(self, fields, serialized=None, delta=None):
+        self.sent.append(fields)
+        self.deltas.append(delta)
+
+    def record_callback_metrics(self, label, msec, expired):
+        pass
+
+
+def order_row(order_id, n, customer='CUSTOMER'):
+    return {
+        'ORIGINAL_ORDER_ID': 'OID-1',
+        'ORDER_ID': order_id,
+        'TYPE': 'UserSubmitOrder' if n == 0 else 'ExchangeReportStatus',
+        'CURRENT_STATUS': 'LIVE',
+        'BANK': 'BANK',
+        'BRANCH': 'BRANCH',
+        'CUSTOMER': customer,
+        'DEPOSIT': 'DEPOSIT',
+        'DISP_NAME': 'IBM',
+        'CUSIP': '000000000',
+        'BUYORSELL': 'Buy',
+        'VOLUME': 1000,
+        'VOLUME_TRADED': n,
+        'ORDER_RESIDUAL': 1000 - n,
+        'AVG_PRICE': 100.0 + n / 100,
+    }
+
+
+@pytest.mark.benchmark
+def test_time_conversion():
+    feedzone = pytz.timezone('US/Eastern')
+    localzone = pytz.timezone('US/Pacific')
+    converter = API_TimeConverter(feedzone, localzone)
+    # one year of timestamps, spanning both DST transitions
+    start = int((datetime.datetime(2020, 1, 1) - NAIVE_EPOCH).total_seconds())
+    step = int(366 * 86400 / TIME_CONVERSION_COUNT)
+    stamps = [start + i * step for i in range(TIME_CONVERSION_COUNT)]
+
+    begin = time.time()
+    converted = [converter.convert_seconds(s) for s in stamps]
+    elapsed = time.time() - begin
+    print(f"\nconverted {len(stamps)} timestamps in {elapsed:.3f} seconds ({len(stamps) / elapsed:.0f}/sec)")
+
+    for i in range(0, TIME_CONVERSION_COUNT, 997):
+        t = NAIVE_EPOCH + datetime.timedelta(seconds=stamps[i])
+        expected = feedzone.localize(t).astimezone(localzone).replace(tzinfo=None)
+        assert NAIVE_EPOCH + datetime.timedelta(seconds=converted[i]) == expected
+
+
+@pytest.mark.benchmark
+def test_order_updates(tmp_path):
+    api = BenchmarkAPI(tmp_path)
+    order = API_Order(api, 'OID-1', order_row('(init)', 0), 'realtick')
+    begin = time.time()
+    for n in range(ORDER_UPDATE_COUNT):
+        order.update(order_row(f"ORDER-{n}", n))
+    # refreshing with unchanged messages must not generate updates
+    for n in range(ORDER_UPDATE_COUNT):
+        order.update(order_row(f"ORDER-{n}", n))
+    elapsed = time.time() - begin
+    print(f"\napplied {2 * ORDER_UPDATE_COUNT} order updates in {elapsed:.3f} seconds")
+    assert len(api.sent) == ORDER_UPDATE_COUNT
+    assert [fields['version'] for fields in api.sent] == list(range(2, ORDER_UPDATE_COUNT + 2))
+    delta = api.deltas[-1]
+    assert 'updates' not in delta
+    assert delta['update']['id'] == f"ORDER-{ORDER_UPDATE_COUNT - 1}"
+    assert delta['raw']['VOLUME_TRADED'] == ORDER_UPDATE_COUNT - 1
+    assert delta['version'] == ORDER_UPDATE_COUNT + 1
+    assert 'symbol' not in delta
+    assert len(order.updates) == api.order_history_size + 1
+    history = order.history()
+    assert [update['id'] for update in history] == ['(init)'] + [f"ORDER-{n}" for n in range(ORDER_UPDATE_COUNT)]
+    assert order.render()['update_count'] == len(history)
+
+
+@pytest.mark.benchmark
+def test_query_orders(tmp_path):
+    api = BenchmarkAPI(tmp_path)
+    for n in range(ORDER_QUERY_COUNT):
+        oid = f"OID-{n}"
+        api.orders[oid] = API_Order(api, oid, order_row(f"ORDER-{n}", 0), 'realtick')
+    results = []
+    begin = time.time()
+    for _ in range(2):
+        callback = API_Callback(api, 0, 'orders', None)
+        results.append(callback.format_results([]))
+    elapsed = time.time() - begin
+    print(f"\nformatted {ORDER_QUERY_COUNT} orders twice in {elapsed:.3f} seconds")
+    assert results[0] == results[1]
+    orders = json.loads(results[0])
+    assert len(orders) == ORDER_QUERY_COUNT
+    assert orders['OID-1']['permid'] == 'OID-1'
+
+
+@pytest.mark.benchmark
+def test_query_filtered_orders(tmp_path):
+    api = BenchmarkAPI(tmp_path)
+    for n in range(ORDER_QUERY_COUNT):
+        oid = f"OID-{n}"
+        api.orders[oid] = API_Order(api, oid, order_row(f"ORDER-{n}", 0, f"C{n % 100}"), 'realtick')
+    begin = time.time()
+    callback = API_Callback(api, 0, 'orders', None, query={'account': ['BANK.BRANCH.C7.DEPOSIT'], 'fields': ['status']})
+    results = json.loads(callback.format_results([]))
+    elapsed = time.time() - begin
+    print(f"\nselected {len(results)} of {ORDER_QUERY_COUNT} orders by account in {elapsed:.3f} seconds")
+    assert len(results) == ORDER_QUERY_COUNT // 100
+    assert results['OID-7'] == {'status': 'Pending'}
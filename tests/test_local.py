@@ -0,0 +1,1167 @@
+# -*- coding: utf-8 -*-
+"""
+  test_local.py
+  -------------
+
+  TxTrader local unit tests; these exercise API objects against the rtx_api
+  fixture and don't need a running server
+
+  Copyright (c) 2020 Reliance Systems Inc. <mkrueger@rstms.net>
+  Licensed under the MIT license.  See LICENSE for details.
+
+"""
+
+import datetime
+import json
+import os
+import time
+import types
+
+import pytest
+import pytz
+
+from txtrader import rtx
+from txtrader.rtx import API_Symbol, API_Barchart, API_BarCache, API_BarCacheRequest, API_TimeConverter
+from txtrader.rtx import API_BarArchive, API_BarArchiveRequest
+from txtrader.rtx import API_Order, API_OrderArchive, API_OrderHistory, RTX_LocalCallback
+from txtrader.rtx import API_Order_Update, API_Execution_Update, API_OrderJournal
+from txtrader.rtx import API_AccountData, API_CoalescedRequest
+from txtrader.tcpserver import tcpserver, serverFactory
+
+GATEWAY_STARTUP = {'msg': 'startup', 'item': 'rtgw'}
+ACCOUNT = 'BANK.BRANCH.CUSTOMER.DEPOSIT'
+
+
+def order_row(order_id, n, customer='CUSTOMER'):
+    return {
+        'ORIGINAL_ORDER_ID': 'OID-1',
+        'ORDER_ID': order_id,
+        'TYPE': 'UserSubmitOrder' if n == 0 else 'ExchangeReportStatus',
+        'CURRENT_STATUS': 'LIVE',
+        'BANK': 'BANK',
+        'BRANCH': 'BRANCH',
+        'CUSTOMER': customer,
+        'DEPOSIT': 'DEPOSIT',
+        'DISP_NAME': 'IBM',
+        'CUSIP': '000000000',
+        'BUYORSELL': 'Buy',
+        'VOLUME': 1000,
+        'VOLUME_TRADED': n,
+        'ORDER_RESIDUAL': 1000 - n,
+        'AVG_PRICE': 100.0 + n / 100,
+    }
+
+
+def execution_row(xid, oid):
+    return {
+        'ORDER_ID': xid,
+        'ORIGINAL_ORDER_ID': oid,
+        'TYPE': 'ExchangeTradeOrder',
+        'CURRENT_STATUS': 'COMPLETED',
+        'BANK': 'BANK',
+        'BRANCH': 'BRANCH',
+        'CUSTOMER': 'CUSTOMER',
+        'DEPOSIT': 'DEPOSIT',
+        'DISP_NAME': 'IBM',
+        'CUSIP': '000000000',
+        'VOLUME': 100,
+    }
+
+
+def position_rows(**positions):
+    return [
+        {'BANK': 'BANK', 'BRANCH': 'BRANCH', 'CUSTOMER': 'CUSTOMER', 'DEPOSIT': 'DEPOSIT', 'DISP_NAME': symbol, 'LONGPOS': quantity}
+        for symbol, quantity in positions.items()
+    ]
+
+
+def record(monkeypatch, obj, name):
+    """replace a method of obj with one recording its arguments; a single argument is recorded bare"""
+    calls = []
+    monkeypatch.setattr(obj, name, lambda *args, **kwargs: calls.append(args[0] if len(args) == 1 else args))
+    return calls
+
+
+class Results(object):
+    """a callback recording the results it is completed with"""
+
+    def __init__(self, label='request'):
+        self.label = label
+        self.done = False
+        self.results = []
+
+    def complete(self, results):
+        self.results.append(results)
+        self.done = True
+
+
+def tcp_client(**options):
+    client = tcpserver()
+    client.options = options
+    return client
+
+
+class AdviseSymbol(API_Symbol):
+    """symbol with its clients set directly, without the initial gateway request"""
+
+    def __init__(self, api, clients=(), symbol='IBM'):
+        self.api = api
+        self.symbol = symbol
+        self.clients = set(clients)
+        self.barchart = API_Barchart()
+        self.bar_volume_base = None
+        self.volume = 0
+        self.size = 0
+        self.advise_what = None
+
+    def __del__(self):
+        pass
+
+
+@pytest.mark.parametrize('rtx_api', [{'ENABLE_TICKER': 1, 'ENABLE_HIGH_LOW': 0}], indirect=True)
+def test_symbol_advise_fields(rtx_api):
+    api = rtx_api
+    available = api.quotes_advise_available_fields()
+
+    # no clients and unrestricted clients both advise every available field
+    assert AdviseSymbol(api, []).quotes_advise_what() == available
+    assert AdviseSymbol(api, [object()]).quotes_advise_what() == available
+
+    # internal lookups fall back to the minimum trade fields
+    assert AdviseSymbol(api, [api]).quotes_advise_what() == ['TRD_DATE', 'TRDTIM_1', 'TRDPRC_1']
+
+    # restricted clients are merged, with dependencies added and advise order preserved
+    vwap = tcp_client(SYMBOL_FIELDS=['VWAP', 'HIGH_1'])
+    quotes = tcp_client(SYMBOL_FIELDS=['HST_CLOSE'], quotes=True)
+    assert AdviseSymbol(api, [vwap]).quotes_advise_what() == ['VWAP']
+    assert AdviseSymbol(api, [vwap, quotes]).quotes_advise_what() == [
+        'HST_CLOSE', 'VWAP', 'BID', 'BIDSIZE', 'ASK', 'ASKSIZE'
+    ]
+
+    # P&L marking needs the last, prior close and quote prices
+    assert AdviseSymbol(api, [api.pnl]).quotes_advise_what() == [
+        'TRD_DATE', 'TRDTIM_1', 'TRDPRC_1', 'HST_CLOSE', 'BID', 'BIDSIZE', 'ASK', 'ASKSIZE'
+    ]
+
+    # barchart maintenance always needs the trade fields
+    api.enable_symbol_barchart = True
+    assert AdviseSymbol(api, [vwap]).quotes_advise_what() == [
+        'TRD_DATE', 'TRDTIM_1', 'TRDPRC_1', 'TRDVOL_1', 'ACVOL_1', 'VWAP'
+    ]
+
+
+@pytest.mark.parametrize('rtx_api', [{'ENABLE_TICKER': 1}], indirect=True)
+def test_symbol_narrowed_advise(rtx_api):
+    api = rtx_api
+    symbol = AdviseSymbol(api)
+    symbol.clear()
+    symbol.cxn_init = None
+    assert sorted(symbol.export()) == sorted(
+        ['symbol', 'last', 'tradetime', 'size', 'volume', 'open', 'close', 'vwap', 'fullname', 'cusip', 'high', 'low',
+         'bid', 'bidsize', 'ask', 'asksize']
+    )
+
+    # fields outside a narrowed advise are left out of the export, and trades and quotes aren't broadcast
+    symbol.advise_what = 'VWAP,HIGH_1,LOW_1,BID,BIDSIZE'
+    assert sorted(symbol.export()) == ['bid', 'bidsize', 'cusip', 'fullname', 'high', 'low', 'symbol', 'vwap']
+    symbol.parse_fields(None, {'HIGH_1': '101.0', 'BID': '99.0', 'BIDSIZE': '100'})
+    assert symbol.high == 101.0 and api.broadcast == []
+
+    symbol.advise_what = ','.join(api.quotes_advise_available_fields())
+    symbol.parse_fields(None, {'HIGH_1': '102.0', 'BID': '99.5', 'BIDSIZE': '100'})
+    assert [msg.split(':')[0] for msg in api.broadcast] == ['quote.IBM', 'trade.IBM']
+
+
+def symbol_trade(symbol, trade_time, price, volume):
+    volume_base = symbol.volume
+    symbol.last = price
+    symbol.volume = volume
+    symbol.last_trade_time = f"2020-06-01 {trade_time}"
+    symbol.barchart_add_trade(volume_base, True, False)
+
+
+def test_symbol_barchart_trades(rtx_api):
+    symbol = AdviseSymbol(rtx_api)
+    symbol.volume = 900
+    symbol_trade(symbol, '09:30:10', 100.0, 1000)
+    symbol_trade(symbol, '09:30:20', 101.0, 1050)
+    symbol_trade(symbol, '09:30:30', 99.5, 1060)
+    assert symbol.barchart_render() == [['2020-06-01', '09:30:00', 100.0, 101.0, 99.5, 99.5, 160]]
+
+    # a reconcile query replaces the bar; later trades add to the queried volume
+    symbol.barchart_update([['2020-06-01', '09:30:00', 100.0, 101.0, 99.5, 99.5, 200]])
+    symbol_trade(symbol, '09:30:40', 100.5, 1090)
+    symbol_trade(symbol, '09:31:05', 100.25, 1100)
+    assert symbol.barchart_render() == [
+        ['2020-06-01', '09:30:00', 100.0, 101.0, 99.5, 100.5, 230],
+        ['2020-06-01', '09:31:00', 100.25, 100.25, 100.25, 100.25, 10],
+    ]
+
+
+class ReconcileSymbol(object):
+    cxn_updates = True
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.reconciled = 0
+
+    def is_valid(self):
+        return True
+
+    def barchart_reconcile(self):
+        self.reconciled += 1
+
+
+@pytest.mark.parametrize('rtx_api', [{'BARCHART_RECONCILE_INTERVAL': 30}], indirect=True)
+def test_reconcile_barcharts_staggered(rtx_api, monkeypatch):
+    api = rtx_api
+    api.initialized = True
+    api.feed_now = True
+    api.symbols = {s: ReconcileSymbol(s) for s in ['IBM', 'AAPL', 'MSFT', 'TSLA', 'GE', 'F', 'T', 'X']}
+    reconciled = []
+    for second in range(60):
+        monkeypatch.setattr(rtx.time, 'time', lambda: 1590000000.0 + second)
+        before = sum(s.reconciled for s in api.symbols.values())
+        api.reconcile_barcharts()
+        reconciled.append(sum(s.reconciled for s in api.symbols.values()) - before)
+    # every symbol is queried once per interval, never all in the same second
+    assert all(s.reconciled == 2 for s in api.symbols.values())
+    assert max(reconciled) < len(api.symbols)
+
+
+def test_barchart_store():
+    bars = API_Barchart()
+    # out of order upserts render in time order, and an upsert replaces the slot
+    bars.upsert('2020-06-01', '09:32:00', 3.0, 3.5, 2.5, 3.25, 30)
+    bars.upsert('2020-06-01', '04:00:00', 1.0, 1.0, 1.0, 1.0, 5)
+    bars.upsert('2020-06-01', '09:31:00', 2.0, 2.5, 1.5, 2.25, 20)
+    bars.upsert('2020-06-01', '09:32:00', 3.0, 4.0, 2.0, 3.75, 40)
+    assert len(bars) == 3
+    assert bars.render() == [
+        ['2020-06-01', '04:00:00', 1.0, 1.0, 1.0, 1.0, 5],
+        ['2020-06-01', '09:31:00', 2.0, 2.5, 1.5, 2.25, 20],
+        ['2020-06-01', '09:32:00', 3.0, 4.0, 2.0, 3.75, 40],
+    ]
+
+    # resampled bars are aligned to the origin slot
+    assert bars.resample(0, 1439, 5, origin=9 * 60 + 30) == [
+        ['2020-06-01', '04:00:00', 1.0, 1.0, 1.0, 1.0, 5],
+        ['2020-06-01', '09:30:00', 2.0, 4.0, 1.5, 3.75, 60],
+    ]
+
+    # bars for an earlier date are rejected; a later date starts a new session
+    assert bars.upsert('2020-05-29', '15:59:00', 1.0, 1.0, 1.0, 1.0, 1) is None
+    assert bars.slot('2020-06-02', '09:30:00') == (570, True)
+    assert bars.slot('2020-06-02', '09:30:59') == (570, False)
+    assert (bars.date, len(bars)) == ('2020-06-02', 1)
+
+    # bars with empty or malformed labels are skipped
+    for label in [('', ''), ('2020-06-03', ''), ('Error 1', '09:30:00'), ('2020-06-03', '9:30'), (None, '09:30:00')]:
+        assert bars.upsert(*label, 1.0, 1.0, 1.0, 1.0, 1) is None
+    assert (bars.date, len(bars)) == ('2020-06-02', 1)
+
+
+def pacific_clock(api):
+    """run api with an Eastern feed clock and a Pacific local clock"""
+    api.feedzone = pytz.timezone('US/Eastern')
+    api.localzone = pytz.timezone('US/Pacific')
+    api.feed_converter = API_TimeConverter(api.feedzone, api.localzone)
+    api.local_converter = API_TimeConverter(api.localzone, api.feedzone)
+
+
+class BarSymbol(object):
+
+    def __init__(self, api):
+        self.bar_cache = API_BarCache(api)
+
+
+def minute_bars(api, requests):
+    """return a request_bars replacement answering with local 1-minute bars"""
+
+    def request_bars(symbol, table, interval, bar_start, bar_end, label, callback):
+        requests.append((bar_start, bar_end))
+        bars = []
+        t = api.localize_time(bar_start)
+        while t <= api.localize_time(bar_end):
+            bars.append([t.date().isoformat(), t.time().isoformat(), 1.0, 2.0, 0.5, 1.5, 10])
+            t += datetime.timedelta(minutes=1)
+        callback.callback(bars)
+
+    return request_bars
+
+
+def cached_bars(api, bar_start, bar_end, interval=5):
+    results = []
+    session_start = datetime.datetime(1900, 1, 1, 9, 30)
+    callback = RTX_LocalCallback(api, results.append)
+    API_BarCacheRequest(api, 'IBM', interval, bar_start, bar_end, session_start, callback, True).query()
+    return results[0]
+
+
+def test_bar_cache_local_clock(rtx_api, monkeypatch):
+    api = rtx_api
+    pacific_clock(api)
+    requests = []
+    monkeypatch.setattr(api, 'request_bars', minute_bars(api, requests))
+    api.symbols['IBM'] = BarSymbol(api)
+    api.feed_now = datetime.datetime(2020, 6, 1, 9, 50, 30)
+    bars = cached_bars(api, datetime.datetime(2020, 6, 1, 9, 30), datetime.datetime(2020, 6, 1, 9, 44))
+    assert requests == [(datetime.datetime(2020, 6, 1, 9, 30), datetime.datetime(2020, 6, 1, 9, 44))]
+    assert [bar[:2] + bar[6:] for bar in bars] == [
+        ['2020-06-01', '06:30:00', 50], ['2020-06-01', '06:35:00', 50], ['2020-06-01', '06:40:00', 50]
+    ]
+    assert api.symbols['IBM'].bar_cache.missing('2020-06-01', 390, 404) is None
+
+    # the same range is a hit; an extended range fetches only the uncached minutes, in API time
+    assert cached_bars(api, datetime.datetime(2020, 6, 1, 9, 30), datetime.datetime(2020, 6, 1, 9, 44)) == bars
+    bars = cached_bars(api, datetime.datetime(2020, 6, 1, 9, 30), datetime.datetime(2020, 6, 1, 9, 59))
+    assert requests[1] == (datetime.datetime(2020, 6, 1, 9, 45), datetime.datetime(2020, 6, 1, 9, 59))
+    assert api.query_bar_cache_metrics() == {'5': {'hit': 1, 'miss': 2}}
+    # only completed minutes of the current session are recorded as fetched
+    assert api.symbols['IBM'].bar_cache.missing('2020-06-01', 390, 419) == 410
+    assert len(bars) == 6
+
+
+def archive_api(api, monkeypatch, path, max_bytes=0, max_age_days=0):
+    """give api a bar archive, and a gateway returning 30-minute bars for weekdays only; return its request list"""
+    pacific_clock(api)
+    api.feed_now = datetime.datetime(2020, 6, 8, 12, 0)
+    api.bar_archive = API_BarArchive(api, str(path), max_bytes, max_age_days)
+    requests = []
+
+    def request_gateway_bars(symbol, table, interval, bar_start, bar_end, label, callback):
+        requests.append((bar_start, bar_end))
+        bars = []
+        t = bar_start
+        while t <= bar_end:
+            if t.weekday() < 5 and datetime.time(9, 30) <= t.time() <= datetime.time(16, 0):
+                local = api.localize_time(t)
+                bars.append([local.date().isoformat(), local.time().isoformat(), 1.0, 2.0, 0.5, 1.5, t.day])
+            t += datetime.timedelta(minutes=30)
+        callback.callback(bars)
+
+    monkeypatch.setattr(api, 'request_gateway_bars', request_gateway_bars)
+    monkeypatch.setattr(
+        api, 'session_times', lambda symbol: (datetime.datetime(1900, 1, 1, 9, 30), datetime.datetime(1900, 1, 1, 16, 0))
+    )
+    return requests
+
+
+def archive_bars(api, bar_start, bar_end):
+    results = []
+    callback = RTX_LocalCallback(api, results.append)
+    API_BarArchiveRequest(api, 'IBM', 'INTRADAY', 30, bar_start, bar_end, 'barchart_data', callback).query()
+    return results[0]
+
+
+def test_bar_archive_request(rtx_api, monkeypatch, tmp_path):
+    api = rtx_api
+    requests = archive_api(api, monkeypatch, tmp_path)
+    archive = api.bar_archive
+    # a request starting after the session open can't archive its first date
+    bars = archive_bars(api, datetime.datetime(2020, 6, 4, 12, 0), datetime.datetime(2020, 6, 8, 11, 0))
+    assert bars[0][:2] == ['2020-06-04', '09:00:00']
+    assert bars[-1][:2] == ['2020-06-08', '08:00:00']
+    # only complete sessions before the current date are archived, keyed by API date; the weekend dates,
+    # followed by bars for a later date, are archived empty
+    written = sorted(os.path.basename(p) for p in archive.files)
+    assert written == ['2020-06-05.bars', '2020-06-06.bars', '2020-06-07.bars']
+    assert archive.read('IBM', 'INTRADAY', 30, datetime.date(2020, 6, 6)) == []
+    stored = archive.read('IBM', 'INTRADAY', 30, datetime.date(2020, 6, 5))
+    assert len(stored) == 14
+    assert stored[0] == ['2020-06-05', '06:30:00', 1.0, 2.0, 0.5, 1.5, 5]
+    assert stored[-1][:2] == ['2020-06-05', '13:00:00']
+
+    # archived dates are served from the archive; only the unarchived dates are requested from the gateway
+    del requests[:]
+    bars = archive_bars(api, datetime.datetime(2020, 6, 5, 9, 30), datetime.datetime(2020, 6, 8, 16, 0))
+    assert requests == [(datetime.datetime(2020, 6, 8, 9, 30), datetime.datetime(2020, 6, 8, 16, 0))]
+    assert [bar[6] for bar in bars] == [5] * 14 + [8] * 14
+    assert archive.query_metrics()['write'] == 3
+
+    del requests[:]
+    bars = archive_bars(api, datetime.datetime(2020, 6, 3, 9, 30), datetime.datetime(2020, 6, 8, 16, 0))
+    assert requests == [
+        (datetime.datetime(2020, 6, 3, 9, 30), datetime.datetime(2020, 6, 4, 16, 0)),
+        (datetime.datetime(2020, 6, 8, 9, 30), datetime.datetime(2020, 6, 8, 16, 0)),
+    ]
+    assert [bar[6] for bar in bars] == [3] * 14 + [4] * 14 + [5] * 14 + [8] * 14
+    assert archive.query_metrics()['write'] == 5
+
+    # an empty date at the end of a response may be a gateway gap, and isn't archived
+    api.feed_now = datetime.datetime(2020, 6, 10, 12, 0)
+    monkeypatch.setattr(api, 'request_gateway_bars', lambda *args: args[-1].callback([]))
+    assert archive_bars(api, datetime.datetime(2020, 6, 9, 9, 30), datetime.datetime(2020, 6, 9, 16, 0)) == []
+    assert archive.read('IBM', 'INTRADAY', 30, datetime.date(2020, 6, 9)) is None
+
+
+def test_bar_archive_evict(rtx_api, monkeypatch, tmp_path):
+    api = rtx_api
+    archive_api(api, monkeypatch, tmp_path)
+    archive = api.bar_archive
+    bars = [['2020-06-01', '06:30:00', 1.0, 2.0, 0.5, 1.5, 100]] * 10
+    for day in range(1, 6):
+        archive.write('IBM', 'INTRADAY', 1, datetime.date(2020, 6, day), bars)
+    size = archive.size // 5
+    assert archive.read('IBM', 'INTRADAY', 1, datetime.date(2020, 6, 1)) == bars
+
+    # least recently used files are evicted first when over the size limit
+    archive.max_bytes = size * 3
+    archive.evict()
+    names = sorted(os.path.basename(p) for p in archive.files)
+    assert names == ['2020-06-01.bars', '2020-06-04.bars', '2020-06-05.bars']
+    assert archive.size == size * 3
+
+    # files older than the age limit are removed without also evicting by size
+    archive.max_age_days = 5
+    archive.evict()
+    names = sorted(os.path.basename(p) for p in archive.files)
+    assert names == ['2020-06-04.bars', '2020-06-05.bars']
+    assert sorted(os.listdir(tmp_path / 'IBM' / 'INTRADAY-1')) == names
+
+    # a restarted archive finds the remaining files
+    assert API_BarArchive(api, str(tmp_path), 0, 0).size == size * 2
+
+
+def test_tcp_order_query(rtx_api):
+    client = tcp_client()
+    client.factory = serverFactory(rtx_api)
+    sent = []
+    client.sendString = sent.append
+    assert client._order_query('orders') == (False, {})
+    assert client._order_query('orders refresh account=A,B') == (True, {'account': 'A,B'})
+    assert client._order_query('tickets refresh=true status=Filled') == (True, {'status': 'Filled'})
+    assert client._order_query('executions refresh=0') == (False, {})
+    assert sent == []
+
+    # an unknown key is answered with an error instead of raising
+    assert client._order_query('orders refresh side=buy') == (True, None)
+    assert [line.decode() for line in sent] == [f"{rtx_api.channel}.error: unknown order query key: side"]
+
+
+def add_order(api, n):
+    oid = f"OID-{n}"
+    api.orders[oid] = API_Order(api, oid, order_row(f"ORDER-{n}", 0), 'realtick')
+
+
+@pytest.mark.parametrize('rtx_api', [{'CHANGE_LOG_SIZE': 5}], indirect=True)
+def test_change_log(rtx_api):
+    api = rtx_api
+    # a first poll, without an epoch, resyncs and returns the epoch to send back
+    changes = json.loads(api.query_changes_since('orders', 0, ''))
+    assert (changes['seq'], changes['resync']) == (0, True)
+    epoch = changes['epoch']
+    # a seq ahead of the log forces a resync
+    assert json.loads(api.query_changes_since('orders', 4, epoch))['resync']
+
+    for n in range(3):
+        add_order(api, n)
+    changes = json.loads(api.query_changes_since('orders', 1, epoch))
+    assert (changes['seq'], changes['resync'], sorted(changes['orders']), changes['removed']) == (
+        3, False, ['OID-1', 'OID-2'], []
+    )
+    assert json.loads(api.query_changes_since('executions', 0, epoch))['executions'] == {}
+
+    # a seq from another server process forces a resync, even if this log covers it
+    changes = json.loads(api.query_changes_since('orders', 1, 'epoch-before-restart'))
+    assert changes['resync'] and sorted(changes['orders']) == ['OID-0', 'OID-1', 'OID-2']
+
+    # removed objects are reported by key
+    del api.orders['OID-1']
+    changes = json.loads(api.query_changes_since('orders', 3, epoch))
+    assert (changes['seq'], changes['orders'], changes['removed']) == (4, {}, ['OID-1'])
+
+    # a seq whose changes were dropped from the log forces a resync
+    for n in range(3, 7):
+        add_order(api, n)
+    changes = json.loads(api.query_changes_since('orders', 2, epoch))
+    assert changes['resync']
+    assert sorted(changes['orders']) == ['OID-0', 'OID-2', 'OID-3', 'OID-4', 'OID-5', 'OID-6']
+    assert not json.loads(api.query_changes_since('orders', 3, epoch))['resync']
+
+
+def test_execution_order_lookup(rtx_api, monkeypatch):
+    api = rtx_api
+    record(monkeypatch, api, 'send_execution_update')
+    add_order(api, 1)
+    api.orders['OID-1'].update(order_row('ORDER-1b', 1))
+    api.orders.reindex('OID-1')
+    assert api.orders.lookup('order_id', 'ORDER-1b') == set(['OID-1'])
+
+    # an execution naming one of the order's ORDER_IDs is filed under the order
+    api.handle_execution_response(execution_row('X-1', 'ORDER-1b'))
+    api.handle_execution_response(execution_row('X-2', 'OID-1'))
+    assert api.executions.lookup('order', 'OID-1') == set(['X-1', 'X-2'])
+    assert api.execution_order_id({'ORIGINAL_ORDER_ID': 'OID-9'}) == 'OID-9'
+
+
+def test_update_data_clients(rtx_api, monkeypatch):
+    api = rtx_api
+    monkeypatch.setattr(api, 'WriteAllClients', types.MethodType(rtx.RTX.WriteAllClients, api))
+    dumped = []
+    dumps = rtx.json.dumps
+    monkeypatch.setattr(rtx, 'json', types.SimpleNamespace(dumps=lambda obj: dumped.append(obj) or dumps(obj)))
+    fields = dict(execution_row('X-1', 'OID-1'), ACCOUNT=ACCOUNT, PRICE=1.0, BUYORSELL='Buy', ORDER_RESIDUAL=0)
+    delta = {'ORDER_ID': 'X-1', 'version': 2}
+
+    # nothing is serialized without data or delta clients
+    api.send_execution_update(fields, None, delta)
+    assert dumped == []
+
+    data, deltas = tcp_client(**{'execution-data': True}), tcp_client(**{'execution-delta': True})
+    for client in [data, deltas]:
+        client.sent = []
+        client.sendString = client.sent.append
+    api.clients.add(deltas)
+    api.send_execution_update(fields, 'serialized', delta)
+    assert dumped == [delta]
+    assert deltas.sent == [f"{api.channel}.execution-delta {dumps(delta)}".encode()]
+
+    # an update sent after CUSIP mapping has no delta; the fields are serialized once for both
+    del dumped[:]
+    api.clients.add(data)
+    api.send_execution_update(fields, None, None, mapped=True)
+    assert dumped == [fields]
+    assert [line.split(b' ', 1)[1] for line in data.sent + deltas.sent[1:]] == [dumps(fields).encode()] * 2
+
+
+class ClientTransport(object):
+
+    def getPeer(self):
+        return 'peer'
+
+
+@pytest.mark.parametrize('rtx_api', [{'USERNAME': 'user', 'PASSWORD': 'password'}], indirect=True)
+def test_tcp_auth_delta_snapshot(rtx_api):
+    api = rtx_api
+    api.initialized = True
+    add_order(api, 1)
+    client = tcp_client()
+    client.factory = serverFactory(api)
+    client.transport = ClientTransport()
+    sent = []
+    client.sendString = sent.append
+    client.stringReceived(b'auth user password {"order-delta": true}')
+    assert [line.decode().split(' ')[0] for line in sent] == ['.Authorized', f"{api.channel}.order-data"]
+    assert client in api.clients
+
+
+def test_order_archive(rtx_api, monkeypatch, tmp_path):
+    api = rtx_api
+    api.order_archive = archive = API_OrderArchive(api, str(tmp_path))
+    sent = record(monkeypatch, api, 'send_execution_update')
+    invalidated = record(monkeypatch, api.account_data, 'invalidate')
+    archive.write('OID-1', {'permid': 'OID-1'}, [{'id': 'ORDER-1'}], {'X-1': {'ORDER_ID': 'X-1'}})
+    archive.write('OID-2', {'permid': 'OID-2'}, [], {})
+    assert archive.read('OID-1')['history'] == [{'id': 'ORDER-1'}]
+    assert archive.read_execution('X-1') == {'ORDER_ID': 'X-1'}
+    assert archive.read('OID-3') is None and archive.read_execution('X-3') is None
+
+    # a late execution for an archived order is reported, then appended to the archive instead of kept in memory
+    api.handle_execution_response(execution_row('X-2', 'OID-1'))
+    assert [fields['ORDER_ID'] for fields, serialized, delta in sent] == ['X-2']
+    assert invalidated == [ACCOUNT]
+    assert 'X-2' not in api.executions
+    assert sorted(archive.read('OID-1')['executions']) == ['X-1', 'X-2']
+    # repeated gateway rows for archived executions are ignored
+    api.handle_execution_response(execution_row('X-2', 'OID-1'))
+    assert len(sent) == 1
+
+    # a restart loads the id index instead of the records
+    [pathname] = [os.path.join(tmp_path, f) for f in os.listdir(tmp_path) if f.endswith('.jsonl')]
+    restarted = API_OrderArchive(api, str(tmp_path))
+    assert restarted.orders == archive.orders and restarted.executions == archive.executions
+    assert restarted.read_execution('X-2')['ORIGINAL_ORDER_ID'] == 'OID-1'
+
+    # a missing index, or one that doesn't cover the file, is rebuilt from the records
+    os.remove(pathname[:-len('.jsonl')] + '.idx')
+    assert API_OrderArchive(api, str(tmp_path)).orders == archive.orders
+    with open(pathname, 'ab') as ofp:
+        ofp.write(b'{"oid": "OID-4", "ord')
+    restarted = API_OrderArchive(api, str(tmp_path))
+    assert restarted.orders == archive.orders
+    assert os.path.getsize(pathname) == archive.orders['OID-1'][-1][1] + archive.orders['OID-1'][-1][2]
+    assert len(api.errors) == 1
+
+
+def history_date(monkeypatch, day):
+    """run the order history on 2020-06-day"""
+
+    class HistoryDate(datetime.date):
+
+        @classmethod
+        def today(cls):
+            return cls(2020, 6, day)
+
+    monkeypatch.setattr(rtx.datetime, 'date', HistoryDate)
+
+
+def test_order_history(rtx_api, monkeypatch, tmp_path):
+    api = rtx_api
+    path = tmp_path / 'order-history'
+    # files left by a previous run are removed at startup, since orders are rebuilt from the gateway or journal
+    (path / 'order-history-2020-05-29.jsonl').write_bytes(b'{"id": "ORDER-1"}\n')
+    history = API_OrderHistory(api, str(path))
+    assert os.listdir(path) == []
+
+    history_date(monkeypatch, 1)
+    history.append('OID-1', {'id': 'ORDER-1'})
+    history.append('OID-2', {'id': 'ORDER-2'})
+    history_date(monkeypatch, 2)
+    history.append('OID-2', {'id': 'ORDER-3'})
+    assert sorted(os.listdir(path)) == ['order-history-2020-06-01.jsonl', 'order-history-2020-06-02.jsonl']
+    assert history.read('OID-2') == [{'id': 'ORDER-2'}, {'id': 'ORDER-3'}]
+
+    # an earlier date's file is removed once the orders it holds entries for are discarded
+    history.discard('OID-1')
+    assert history.read('OID-1') == [] and history.count('OID-2') == 2
+    history.discard('OID-2')
+    assert os.listdir(path) == ['order-history-2020-06-02.jsonl']
+
+
+class PendingMapper(object):
+
+    def __init__(self, updates):
+        self.updates = updates
+
+
+def test_archive_discards_mapper_updates(rtx_api):
+    api = rtx_api
+    mapper = PendingMapper(
+        [
+            API_Order_Update(api, 'IBM', {'permid': 'OID-1'}, None),
+            API_Execution_Update(api, 'IBM', {'ORDER_ID': 'X-1'}, None),
+            API_Order_Update(api, 'IBM', {'permid': 'OID-2'}, None),
+            API_Execution_Update(api, 'IBM', {'ORDER_ID': 'X-2'}, None),
+        ]
+    )
+    api.pending_mapper_lookups = {'IBM': mapper}
+    api.discard_mapper_updates('OID-1', ['X-1'])
+    assert [update.fields for update in mapper.updates] == [{'permid': 'OID-2'}, {'ORDER_ID': 'X-2'}]
+
+
+def journal_replay(api, path):
+    rows = []
+    journal = API_OrderJournal(api, str(path))
+    count = journal.replay({'orders': rows.append, 'executions': rows.append})
+    return journal, count, rows
+
+
+def test_order_journal(rtx_api, tmp_path):
+    api = rtx_api
+    journal = API_OrderJournal(api, str(tmp_path))
+    rows = [order_row(f"ORDER-{n}", n) for n in range(3)]
+    for row in rows:
+        journal.append('orders', row)
+    journal.flush()
+
+    # a restart replays the rows, then appends to a new segment
+    journal, count, replayed = journal_replay(api, tmp_path)
+    assert (count, replayed) == (3, rows)
+    journal.append('executions', execution_row('X-1', 'OID-1'))
+    journal.flush()
+    assert [f[-8:] for f in sorted(os.listdir(tmp_path)) if f.endswith('.seg')] == ['0001.seg', '0002.seg']
+    assert journal_replay(api, tmp_path)[1] == 4
+
+    # a torn record ends its segment's replay; the other segments are still replayed
+    [first, second] = sorted(os.path.join(tmp_path, f) for f in os.listdir(tmp_path) if f.endswith('.seg'))
+    with open(first, 'rb+') as fp:
+        fp.truncate(os.path.getsize(first) - 3)
+    journal, count, replayed = journal_replay(api, tmp_path)
+    assert (count, [row['ORDER_ID'] for row in replayed]) == (3, ['ORDER-0', 'ORDER-1', 'X-1'])
+    assert len(api.errors) == 1
+
+    # the first append on a new date starts that date's segments and removes the previous date's
+    today = datetime.date.today().isoformat()
+    for pathname in [first, second]:
+        os.rename(pathname, pathname.replace(today, '2020-01-01'))
+    journal.date = '2020-01-01'
+    journal.append('orders', rows[0])
+    journal.flush()
+    segments = [f for f in os.listdir(tmp_path) if f.endswith('.seg')]
+    assert segments == [f"journal-{today}-0001.seg"]
+
+
+def test_order_journal_raw_rows(rtx_api, monkeypatch, tmp_path):
+    api = rtx_api
+    api.order_journal = API_OrderJournal(api, str(tmp_path))
+    monkeypatch.setattr(api, 'get_cusip', lambda symbol: '000000000')
+    record(monkeypatch, api, 'send_execution_update')
+    row = execution_row('X-1', 'OID-1')
+    del row['CUSIP']
+    api.handle_execution_response(dict(row))
+    assert api.executions['X-1'].fields['CUSIP'] == '000000000'
+    api.order_journal.flush()
+    assert journal_replay(api, tmp_path)[2] == [row]
+
+
+class PositionFill(object):
+
+    def __init__(self, xid, symbol, quantity):
+        self.oid = xid
+        self.fields = dict(execution_row(xid, 'OID-1'), DISP_NAME=symbol, VOLUME=quantity, BUYORSELL='Buy')
+
+
+def test_position_reconcile(rtx_api, monkeypatch):
+    api = rtx_api
+    api.accounts = [ACCOUNT]
+    record(monkeypatch, api, 'send_position_update')
+    positions = api.positions
+    positions.set_baseline(position_rows(IBM=100, MSFT=50))
+    positions.apply_execution(PositionFill('X-1', 'IBM', 10))
+    assert positions.positions[ACCOUNT] == {'IBM': 110, 'MSFT': 50}
+
+    # a fill while the snapshot is pending leaves that symbol out, but the others are still compared
+    applied = dict(positions.applied)
+    positions.apply_execution(PositionFill('X-2', 'IBM', 5))
+    positions.reconcile(position_rows(IBM=110, MSFT=50), applied)
+    assert (positions.mismatches, api.errors) == (0, [])
+    applied = dict(positions.applied)
+    positions.apply_execution(PositionFill('X-3', 'IBM', 5))
+    positions.reconcile(position_rows(IBM=115, MSFT=40), applied)
+    assert positions.mismatches == 1
+    assert 'MSFT 50!=40' in api.errors[0]
+    assert positions.positions[ACCOUNT] == {'IBM': 120, 'MSFT': 40}
+
+    # with no fills pending, every position is compared
+    positions.reconcile(position_rows(IBM=120, MSFT=40), dict(positions.applied))
+    assert positions.mismatches == 1
+    positions.reconcile(position_rows(IBM=119, MSFT=40), dict(positions.applied))
+    assert positions.mismatches == 2
+    assert positions.positions[ACCOUNT] == {'IBM': 119, 'MSFT': 40}
+
+
+def test_pnl_accounts(rtx_api):
+    pnl = rtx_api.pnl
+    pnl.sync({'A': {'IBM': 0}, 'B': {'MSFT': 0}})
+    pnl.add_fill('A', 'IBM', 100, 10.0)
+    pnl.add_fill('A', 'IBM', -40, 12.0)
+    pnl.add_fill('B', 'IBM', 10, 11.0)
+    pnl.add_fill('B', 'MSFT', -5, 20.0)
+    assert sorted(pnl.render()) == ['A', 'B']
+    account = pnl.render('A')['A']
+    assert sorted(account['symbols']) == ['IBM']
+    assert account['symbols']['IBM']['position'] == 60
+    assert account['realized'] == 80.0
+    assert sorted(pnl.render('B')['B']['symbols']) == ['IBM', 'MSFT']
+    assert pnl.render('C') == {'C': {'realized': 0, 'unrealized': 0, 'total': 0, 'symbols': {}}}
+
+
+def test_pnl_unwatch(rtx_api, monkeypatch):
+    api = rtx_api
+    api.initialized = True
+    pnl = api.pnl
+    enabled = record(monkeypatch, api, 'symbol_enable')
+    disabled = record(monkeypatch, api, 'symbol_disable')
+    pnl.add_fill('A', 'IBM', 100, 10.0)
+    pnl.add_fill('B', 'IBM', 10, 11.0)
+    assert [args[:2] for args in enabled] == [('IBM', pnl)]
+    api.symbols['IBM'] = symbol = AdviseSymbol(api, [pnl])
+    symbol.last = 12.0
+    enabled[0][2].callback(None)
+    assert pnl.render('A')['A']['unrealized'] == 200.0
+
+    # the subscription is kept until every account is flat; realized P&L is still reported
+    pnl.add_fill('A', 'IBM', -100, 12.0)
+    assert disabled == [] and 'IBM' in pnl.holders
+    pnl.add_fill('B', 'IBM', -10, 12.0)
+    assert disabled == [('IBM', pnl)]
+    assert 'IBM' not in pnl.holders
+    assert pnl.render('B')['B']['symbols']['IBM']['unrealized'] == 0.0
+    assert pnl.render('A')['A']['realized'] == 200.0
+
+    # a new position watches the symbol again
+    del api.symbols['IBM']
+    pnl.add_fill('A', 'IBM', 5, 12.0)
+    assert pnl.holders['IBM'] == set(['A']) and len(enabled) == 2
+
+
+def test_account_data_cache(rtx_api, monkeypatch):
+    api = rtx_api
+    queries = []
+    monkeypatch.setattr(api, 'request_account_data_query', lambda account, fields, callback: queries.append(callback))
+    cache = API_AccountData(api, 5)
+    results = []
+    callback = RTX_LocalCallback(api, results.append)
+
+    # concurrent requests share a query; a null response is returned to both but not cached
+    cache.request('A', None, callback)
+    cache.request('A', None, callback)
+    queries.pop().callback('null')
+    assert results == ['null', 'null'] and (cache.coalesced, cache.cache) == (1, {})
+
+    cache.request('A', ['EXCESS_EQ'], callback)
+    queries.pop().callback('{"EXCESS_EQ":"100"}')
+    cache.request('A', ['EXCESS_EQ'], callback)
+    assert results[-2:] == ['{"EXCESS_EQ":"100"}'] * 2
+    assert (cache.hits, cache.misses, queries) == (1, 2, [])
+
+    # executions for the account expire its cached data, including responses already in flight
+    cache.request('A', None, callback)
+    cache.invalidate('A')
+    queries.pop().callback('{"EXCESS_EQ":"90"}')
+    assert cache.cache == {}
+
+
+def test_coalesced_request(rtx_api, monkeypatch):
+    api = rtx_api
+    applied = record(monkeypatch, api, 'handle_order_response')
+    key = ('ACCOUNT_GATEWAY', 'ORDER', 'ORDERS', '*', '')
+    pending = API_CoalescedRequest(api, key)
+    api.pending_requests[key] = pending
+    callbacks = [Results('orders'), Results('orders'), Results('tickets')]
+    pending.callbacks.extend(callbacks)
+    pending.complete([{'ORIGINAL_ORDER_ID': 'OID-1'}, None, {'ORIGINAL_ORDER_ID': 'OID-2'}])
+    # the rows are applied once; the callbacks render from the store
+    assert len(applied) == 2
+    assert [cb.results for cb in callbacks] == [[None]] * 3
+    assert api.pending_requests == {}
+
+    # other labels format the rows themselves
+    pending = API_CoalescedRequest(api, key)
+    pending.callbacks.append(Results('account_data'))
+    pending.complete([{'EXCESS_EQ': '1'}])
+    assert pending.callbacks[0].results == [[{'EXCESS_EQ': '1'}]]
+
+    # a request whose callbacks have all expired is dropped
+    pending = API_CoalescedRequest(api, key)
+    pending.callbacks.append(Results('orders'))
+    api.pending_requests[key] = pending
+    api.CheckPendingResults()
+    assert key in api.pending_requests
+    pending.callbacks[0].done = True
+    api.CheckPendingResults()
+    assert api.pending_requests == {}
+
+
+def test_position_snapshot_not_coalesced(rtx_api, monkeypatch):
+    api = rtx_api
+    api.accounts = [ACCOUNT]
+    record(monkeypatch, api, 'send_position_update')
+    submitted = record(monkeypatch, api, 'cxn_submit')
+    api.positions.set_baseline(position_rows(IBM=100))
+
+    # a snapshot gets its own request, compared with the fills applied when it was requested
+    api.request_positions(Results(), refresh=True)
+    api.positions.apply_execution(PositionFill('X-1', 'IBM', 10))
+    api.request_position_snapshot()
+    api.request_positions(Results(), refresh=True)
+    assert len(submitted) == 2
+    assert api.query_request_metrics()['POSITION'] == {'sent': 2, 'saved': 1}
+    snapshot = submitted[1][-1]
+    snapshot.complete(position_rows(IBM=110))
+    assert (api.positions.mismatches, api.errors) == (0, [])
+
+
+GATEWAY_CONFIG = {'CXN_POOL_MIN': 0, 'CXN_POOL_MAX': 2, 'CXN_POOL_IDLE_TIMEOUT': 60}
+
+
+class GatewayProtocol(object):
+    transport = None
+
+    def __init__(self, lines):
+        self.sendLine = lines.append
+
+
+def connect_sessions(api):
+    """give every session a sender recording its lines, with each group's primary serving, without startup queries"""
+    api.lines = {}
+    for session in api.sessions.values():
+        api.lines[session.name] = []
+        session.sender = api.lines[session.name].append
+        session.connected = True
+        session.serving = session.group is session
+
+
+def written(api, name='main'):
+    """return the lines written to a session since the last call"""
+    lines = [line.decode().strip() for line in api.lines[name]]
+    del api.lines[name][:]
+    return lines
+
+
+def cxn_ready(cxn):
+    cxn.receive('ack', 'CONNECTION PENDING')
+    cxn.receive('status', {'msg': 'OnInitAck', 'status': '1'})
+
+
+def cxn_respond(cxn, rows):
+    cxn.receive('ack', 'REQUEST_OK')
+    for i, row in enumerate(rows):
+        cxn.receive('response', {'row': row, 'complete': i == len(rows) - 1})
+
+
+@pytest.mark.parametrize('rtx_api', [dict(GATEWAY_CONFIG, CXN_POOL_MIN=1)], indirect=True)
+def test_connection_pool(rtx_api):
+    api = rtx_api
+    connect_sessions(api)
+    pool = api.cxn_pool('TA_SRV', 'LIVEQUOTE')
+    pool.prewarm()
+    first, = pool.connections.values()
+    assert written(api) == [f"connect {first.id} TA_SRV;LIVEQUOTE"]
+    cxn_ready(first)
+    assert list(pool.idle) == [first]
+
+    # an idle connection is reused; a busy pool below maximum opens another
+    a, b, c = [Results() for _ in range(3)]
+    api.cxn_submit('TA_SRV', 'LIVEQUOTE', 'request', 'LIVEQUOTE', '*', "DISP_NAME='IBM'", a)
+    assert written(api) == [f"request {first.id} LIVEQUOTE;*;DISP_NAME='IBM'"]
+    api.cxn_submit('TA_SRV', 'LIVEQUOTE', 'request', 'LIVEQUOTE', '*', "DISP_NAME='MSFT'", b)
+    second, = [cxn for cxn in pool.connections.values() if cxn is not first]
+    assert written(api) == [f"connect {second.id} TA_SRV;LIVEQUOTE"]
+
+    # at maximum the command queues on the connection with the fewest commands pending
+    api.cxn_submit('TA_SRV', 'LIVEQUOTE', 'request', 'LIVEQUOTE', '*', "DISP_NAME='AAPL'", c)
+    assert written(api) == []
+    assert len(first.pending) == 1
+    cxn_respond(first, [{'TRDPRC_1': '1'}])
+    assert a.results == [[{'TRDPRC_1': '1'}]]
+    assert written(api) == [f"request {first.id} LIVEQUOTE;*;DISP_NAME='AAPL'"]
+    cxn_ready(second)
+    assert written(api) == [f"request {second.id} LIVEQUOTE;*;DISP_NAME='MSFT'"]
+    cxn_respond(first, [{'TRDPRC_1': '3'}])
+    cxn_respond(second, [{'TRDPRC_1': '2'}])
+    assert b.results == [[{'TRDPRC_1': '2'}]] and c.results == [[{'TRDPRC_1': '3'}]]
+    assert len(pool.idle) == 2
+
+    stats = api.query_connection_stats()
+    assert list(stats) == ['main']
+    assert stats['main']['TA_SRV;LIVEQUOTE'] == pool.stats()
+    assert pool.stats()['size'] == 2 and pool.stats()['created'] == 2
+    assert pool.stats()['reused'] == 1 and pool.stats()['queued'] == 1
+
+    # idle connections above minimum are reaped
+    for idle in pool.idle:
+        pool.idle[idle] = time.time() - api.cxn_pool_idle_timeout - 1
+    pool.reap()
+    assert len(pool.connections) == 1 and pool.stats()['reaped'] == 1
+    reaped, = [cxn for cxn in (first, second) if cxn.terminated]
+    assert written(api) == [f"terminate {reaped.id} 0"]
+    reaped.receive('ack', 'TERMINATE_OK')
+    assert reaped.id not in api.active_cxn
+
+    # a detached connection leaves the pool
+    cxn = api.cxn_get('TA_SRV', 'LIVEQUOTE')
+    assert cxn.id not in pool.connections and cxn not in pool.idle
+    assert pool.stats()['reused'] == 2
+
+
+@pytest.mark.parametrize('rtx_api', [GATEWAY_CONFIG], indirect=True)
+def test_connection_fifo(rtx_api):
+    api = rtx_api
+    connect_sessions(api)
+    pool = api.cxn_pool('ACCOUNT_GATEWAY', 'ORDER')
+    cxn = pool.get()
+    callbacks = [Results() for _ in range(3)]
+    for i, callback in enumerate(callbacks):
+        cxn.request('ORDERS', '*', f"ORDER_ID='{i}'", callback)
+    # commands queue while connecting and are sent one at a time, in order
+    assert written(api) == [f"connect {cxn.id} ACCOUNT_GATEWAY;ORDER"]
+    assert len(cxn.pending) == 3
+    cxn_ready(cxn)
+    for i, callback in enumerate(callbacks):
+        assert written(api) == [f"request {cxn.id} ORDERS;*;ORDER_ID='{i}'"]
+        cxn_respond(cxn, [{'ORDER_ID': str(i)}])
+        assert callback.results == [[{'ORDER_ID': str(i)}]]
+    assert pool.waits == 3
+    assert cxn in pool.idle
+
+
+@pytest.mark.parametrize('rtx_api', [dict(GATEWAY_CONFIG, CXN_POOL_MAX=1)], indirect=True)
+def test_connection_failure(rtx_api):
+    api = rtx_api
+    connect_sessions(api)
+    pool = api.cxn_pool('ACCOUNT_GATEWAY', 'ORDER')
+    api.cxn_submit('ACCOUNT_GATEWAY', 'ORDER', 'request', 'ORDERS', '*', '', Results())
+    cxn, = pool.connections.values()
+    cxn_ready(cxn)
+    cxn_respond(cxn, [{}])
+    written(api)
+    a, b = Results(), Results()
+
+    # an ack mismatch fails the outstanding and queued commands and retires the connection
+    api.cxn_submit('ACCOUNT_GATEWAY', 'ORDER', 'request', 'ORDERS', '*', "ORDER_ID='2'", a)
+    api.cxn_submit('ACCOUNT_GATEWAY', 'ORDER', 'request', 'ORDERS', '*', "ORDER_ID='3'", b)
+    cxn.receive('ack', 'ADVISE_OK')
+    assert a.results == [None] and b.results == [None]
+    assert not cxn.response_pending and not cxn.pending
+    assert cxn.id not in pool.connections and cxn not in pool.idle
+    assert pool.stats()['failed'] == 1
+    assert written(api) == [f"request {cxn.id} ORDERS;*;ORDER_ID='2'", f"terminate {cxn.id} 0"]
+    cxn.receive('ack', 'TERMINATE_OK')
+    assert cxn.id not in api.active_cxn
+
+    # the next command opens a new connection
+    c = Results()
+    api.cxn_submit('ACCOUNT_GATEWAY', 'ORDER', 'request', 'ORDERS', '*', '', c)
+    replacement, = pool.connections.values()
+    assert replacement is not cxn
+
+    # an unexpected terminate fails the request without sending a terminate of its own
+    cxn_ready(replacement)
+    written(api)
+    replacement.receive('ack', 'REQUEST_OK')
+    replacement.receive('status', {'msg': 'OnTerminate', 'status': '1'})
+    assert c.results == [None]
+    assert written(api) == []
+    assert replacement.id not in api.active_cxn and pool.connections == {}
+    assert len(api.errors) == 2
+
+
+@pytest.mark.parametrize(
+    'rtx_api', [{'SEND_RATE_LIMITS': 'order=1,status=0,market=2,bars=0,housekeeping=0'}], indirect=True
+)
+def test_send_scheduler(rtx_api, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(rtx.time, 'time', lambda: clock[0])
+    api = rtx_api
+    connect_sessions(api)
+    scheduler = api.send_scheduler
+    scheduler.refilled = clock[0]
+    session = api.sessions['main']
+
+    # a class bursts to its rate, then queues; an unlimited class is never held
+    for i in range(3):
+        api.gateway_send(f"advise {i}", 'market', session)
+    api.gateway_send('request 0', 'status', session)
+    assert written(api) == ['advise 0', 'advise 1', 'request 0']
+    assert scheduler.timer.active()
+
+    # queued messages drain in priority order as the buckets refill
+    api.gateway_send('poke 0', 'order', session)
+    api.gateway_send('poke 1', 'order', session)
+    assert written(api) == ['poke 0']
+    clock[0] += 1
+    scheduler.drain()
+    assert written(api) == ['poke 1', 'advise 2']
+
+    metrics = api.query_send_metrics()
+    assert metrics['market']['sent'] == 3 and metrics['market']['delayed'] == 1
+    assert metrics['market']['max_wait'] == 1000 and metrics['market']['max_depth'] == 1
+    assert metrics['status']['rate'] == 0 and metrics['status']['delayed'] == 0
+
+    # a disconnected session's queued messages are dropped
+    clock[0] += 1
+    for i in range(4):
+        api.gateway_send(f"advise {i}", 'market', session)
+    assert written(api) == ['advise 0', 'advise 1']
+    scheduler.clear(session)
+    clock[0] += 1
+    scheduler.drain()
+    assert written(api) == []
+
+
+def initialize(api, monkeypatch):
+    """mark api initialized with every session up; the startup queries and order advises are recorded, not sent"""
+    connect_sessions(api)
+    api.connected = api.initialized = True
+    api.accounts = [ACCOUNT]
+    api.initial_account_request_pending = False
+    api.initial_order_request_pending = False
+    api.initial_execution_request_pending = False
+    api.initial_update_mapper_pending = False
+    api.connection_status = api.last_connection_status = 'Up'
+    api.queries = []
+    monkeypatch.setattr(api, 'setup_local_queries', lambda session: api.queries.append(session.name))
+    api.reconciled = record(monkeypatch, api, 'reconcile_order_cache')
+
+
+@pytest.mark.parametrize(
+    'rtx_api', [dict(GATEWAY_CONFIG, API_SESSION_ROUTES='TA_SRV=market,TA_SRV/INTRADAY=bars')], indirect=True
+)
+def test_session_routing(rtx_api, monkeypatch):
+    api = rtx_api
+    initialize(api, monkeypatch)
+    main, market, bars = [api.sessions[name] for name in ['main', 'market', 'bars']]
+    assert api.route_session('ACCOUNT_GATEWAY', 'ORDER') is main
+    assert api.route_session('TA_SRV', 'LIVEQUOTE') is market
+    assert api.route_session('TA_SRV', 'INTRADAY') is bars
+    api.cxn_submit('TA_SRV', 'LIVEQUOTE', 'request', 'LIVEQUOTE', '*', "DISP_NAME='IBM'", Results())
+    cxn, = api.active_cxn.values()
+    assert written(api, 'market') == [f"connect {cxn.id} TA_SRV;LIVEQUOTE"]
+    assert written(api, 'main') == []
+
+    # losing a market data session leaves orders up
+    api.gateway_connect(None, market)
+    assert api.initialized and api.accounts
+    assert not api.session_available('TA_SRV', 'LIVEQUOTE') and api.session_available('TA_SRV', 'INTRADAY')
+    assert api.order_cache_ready(False)
+    assert api.connection_status == 'Degraded'
+    assert api.active_cxn == {}
+    api.handle_system_message(0, GATEWAY_STARTUP, market)
+    assert api.initialized and api.connection_status == 'Up'
+    assert api.queries == ['market']
+
+    # losing the order session resets initialization
+    api.gateway_connect(None, main)
+    assert not api.initialized and api.accounts is None
+    assert not api.order_cache_ready(False)
+    assert api.connection_status == 'Disconnected'
+    api.handle_system_message(0, GATEWAY_STARTUP, main)
+    assert api.connection_status == 'Initializing'
+    assert api.queries == ['market', 'main']
+
+
+@pytest.mark.parametrize(
+    'rtx_api', [dict(GATEWAY_CONFIG, API_STANDBY_HOST='standby', SEND_RATE_LIMITS='status=1')], indirect=True
+)
+def test_session_failover(rtx_api, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(rtx.time, 'time', lambda: clock[0])
+    api = rtx_api
+    initialize(api, monkeypatch)
+    api.send_scheduler.refilled = clock[0]
+    advised = []
+
+    def advise_order_streams():
+        cxn = api.cxn_get('ACCOUNT_GATEWAY', 'ORDER')
+        cxn.request('ORDERS', '*', "TYPE='UserSubmitOrder'", Results())
+        cxn.advise('ORDERS', '*', '', advised.append)
+
+    monkeypatch.setattr(api, 'advise_order_streams', advise_order_streams)
+    main, standby = api.sessions['main'], api.sessions['main-standby']
+    assert api.session_for('ACCOUNT_GATEWAY', 'ORDER') is main
+    key = ('ACCOUNT_GATEWAY', 'ORDER', 'ORDERS', '*', '')
+    pending = API_CoalescedRequest(api, key)
+    api.pending_requests[key] = pending
+    api.cxn_submit('ACCOUNT_GATEWAY', 'ORDER', 'request', 'ORDERS', '*', '', pending)
+    assert len(written(api)) == 1
+
+    # the serving session drops; its partner takes over, and the resubmitted commands aren't rate limited
+    api.gateway_connect(None, main)
+    assert standby.serving and not main.serving
+    assert api.session_for('ACCOUNT_GATEWAY', 'ORDER') is standby
+    assert api.pending_requests == {}
+    assert api.initialized and len(api.reconciled) == 1
+    cxn, = api.active_cxn.values()
+    assert cxn.session is standby and api.failover.pending == set([(cxn.id, 1), (cxn.id, 2)])
+    cxn_ready(cxn)
+    assert written(api, 'main-standby') == [
+        f"connect {cxn.id} ACCOUNT_GATEWAY;ORDER", f"request {cxn.id} ORDERS;*;TYPE='UserSubmitOrder'"
+    ]
+
+    # each resubmitted command on the connection must be acknowledged
+    cxn_respond(cxn, [{}])
+    assert api.failover.pending == set([(cxn.id, 2)])
+    assert written(api, 'main-standby') == [f"advise {cxn.id} ORDERS;*;"]
+    cxn.receive('ack', 'ADVISE_OK')
+    assert api.failover is None and standby.failovers == 1
+    assert api.broadcast[-1] == 'gateway-failover: main main-standby 0'
+
+    # the primary returns as the standby; traffic stays on the serving partner
+    api.gateway_connect(GatewayProtocol(api.lines['main']), main)
+    api.handle_system_message(0, GATEWAY_STARTUP, main)
+    assert not main.serving and api.session_for('ACCOUNT_GATEWAY', 'ORDER') is standby
+    api.gateway_send('request 1', 'status', standby)
+    assert written(api, 'main-standby') == []
+
+    # a failover whose advises are never acknowledged times out
+    api.gateway_connect(None, standby)
+    assert main.serving and api.failover
+    clock[0] += api.failover_timeout
+    api.failover.check_timeout()
+    assert api.failover
+    clock[0] += 1
+    api.failover.check_timeout()
+    assert api.failover is None
+    assert api.broadcast[-1] == 'gateway-failover-timeout: main-standby main 2'
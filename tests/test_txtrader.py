@@ -446,6 +446,73 @@ def _position(api, account):
     return p
 
 
+def test_cached_positions_match_gateway(api):
+    account = api.account
+    before = _position(api, account).get('AAPL', 0)
+    _market_order(api, 'AAPL', 1)
+    cached = api.query_positions()
+    refreshed = api.query_positions(True)
+    if WAIT_FOR_FILL:
+        assert cached[account].get('AAPL', 0) == before + 1
+    assert cached[account].get('AAPL', 0) == refreshed[account].get('AAPL', 0)
+
+
+def test_query_account_cached(api):
+    account = api.account
+    first = api.query_account(account)
+    assert first == api.query_account(account)
+    _market_order(api, 'AAPL', 1)
+    # the execution expires the cached response, so this one comes from the gateway
+    assert api.query_account(account)
+
+
+def test_query_request_metrics(api):
+    api.query_positions(True)
+    metrics = api.query_request_metrics()
+    assert metrics['POSITION']['sent'] >= 1
+    assert metrics['POSITION']['saved'] >= 0
+    assert set(metrics['account_data']) == set(['hit', 'coalesced', 'miss'])
+
+
+def test_query_connection_stats(api):
+    api.query_positions(True)
+    stats = api.query_connection_stats()
+    pool = [pools['ACCOUNT_GATEWAY;ORDER'] for pools in stats.values() if 'ACCOUNT_GATEWAY;ORDER' in pools][0]
+    assert pool['size'] >= pool['idle']
+    assert pool['created'] >= 1
+    assert pool['max_wait'] >= pool['avg_wait'] >= 0
+
+
+def test_query_send_metrics(api):
+    api.query_positions(True)
+    metrics = api.query_send_metrics()
+    assert list(metrics) == ['order', 'status', 'market', 'bars', 'housekeeping']
+    assert metrics['status']['sent'] >= 1
+    assert metrics['status']['max_wait'] >= metrics['status']['avg_wait']
+
+
+def test_query_gateway_sessions(api):
+    sessions = api.query_gateway_sessions()
+    assert 'main' in sessions
+    for session in sessions.values():
+        if session['serving']:
+            assert session['status'] == 'Up'
+
+
+def test_query_pnl(api):
+    account = api.account
+    _market_order(api, 'AAPL', 1)
+    pnl = api.query_pnl(account)
+    if pnl is None:
+        # P&L is disabled on this server
+        return
+    assert account in pnl
+    totals = pnl[account]
+    assert totals['total'] == pytest.approx(totals['realized'] + totals['unrealized'])
+    if WAIT_FOR_FILL:
+        assert totals['symbols']['AAPL']['position'] == _position(api, account).get('AAPL', 0)
+
+
 def _market_order(api, symbol, quantity, return_on_error=False):
     print('Sending market_order(%s, %d)...' % (symbol, quantity))
     account = api.account
@@ -611,6 +678,59 @@ def test_query_executions(api):
     assert execs != None
 
 
+def test_query_orders_filters(api):
+    oid = _market_order(api, 'AAPL', 1)
+    account = api.query_orders()[oid]['account']
+    orders = api.query_orders(symbol='AAPL', account=account)
+    assert oid in orders
+    assert set(o['symbol'] for o in orders.values()) == {'AAPL'}
+    assert set(o['account'] for o in orders.values()) == {account}
+    orders = api.query_orders(symbol='AAPL', fields=['status', 'symbol'])
+    assert set(orders[oid].keys()) == {'status', 'symbol'}
+    status = orders[oid]['status']
+    assert oid in api.query_orders(status=status)
+    assert not api.query_orders(status='NoSuchStatus')
+    assert not api.query_orders(symbol='NOSUCHSYMBOL')
+
+
+def test_query_order_history(api):
+    oid = _market_order(api, 'AAPL', 1)
+    order = api.query_order(oid)
+    history = api.query_order_history(oid)
+    assert type(history) == list
+    assert len(history) == order['update_count']
+    assert history[0] == order['updates'][0]
+    assert history[-1] == order['updates'][-1]
+    assert api.query_order_history('NOSUCHORDER') == None
+
+
+def test_query_orders_since(api):
+    changes = api.query_orders_since(0)
+    assert set(changes.keys()) == {'seq', 'epoch', 'resync', 'orders', 'removed'}
+    assert changes['resync']
+    seq, epoch = changes['seq'], changes['epoch']
+    oid = _market_order(api, 'AAPL', 1)
+    changes = api.query_orders_since(seq, epoch)
+    assert changes['seq'] > seq
+    assert not changes['resync']
+    assert oid in changes['orders']
+    assert api.query_orders_since(changes['seq'], epoch)['orders'] == {}
+    assert api.query_orders_since(changes['seq'], 'other')['resync']
+    changes = api.query_executions_since(0)
+    assert set(changes.keys()) == {'seq', 'epoch', 'resync', 'executions', 'removed'}
+
+
+def test_query_orders_refresh(api):
+    cached = api.query_orders()
+    refreshed = api.query_orders(True)
+    assert type(refreshed) == dict
+    assert set(cached.keys()) <= set(refreshed.keys())
+    cached = api.query_executions()
+    refreshed = api.query_executions(True)
+    assert type(refreshed) == dict
+    assert set(cached.keys()) <= set(refreshed.keys())
+
+
 def test_trade_and_query_executions_and_query_order(api):
     oid = _market_order(api, 'AAPL', 10)
     oid = str(oid)
@@ -761,6 +881,42 @@ def test_bars(api):
         print('bars=%s' % repr(bars))
 
 
+@pytest.mark.bars
+def test_bars_columns(api):
+    assert api.add_symbol('SPY')
+    args = {'symbol': 'SPY', 'period': 1, 'start': '2017-08-29 09:30:00', 'end': '2017-08-29 09:40:00'}
+    rows = api.call_txtrader_get('query_bars', args)
+    args['format'] = 'columns'
+    columns = api.call_txtrader_get('query_bars', args)
+    if _verify_barchart_enabled(api, 'BARCHART'):
+        assert type(columns) == dict
+        assert list(columns.keys()) == ['date', 'time', 'open', 'high', 'low', 'close', 'volume']
+        for i, column in enumerate(columns.values()):
+            assert column == [row[i] for row in rows]
+    else:
+        assert not columns
+
+
+@pytest.mark.bars
+def test_bar_cache_intervals(api):
+    assert api.add_symbol('SPY')
+    sbar = '2017-08-29 09:30:00'
+    ebar = '2017-08-29 10:29:00'
+    minute_bars = api.query_bars('SPY', 1, sbar, ebar)
+    if _verify_barchart_enabled(api, 'BAR_CACHE'):
+        assert minute_bars
+        before = api.call_txtrader_get('query_bar_cache_metrics', {})
+        for interval in [5, 15, 60]:
+            bars = api.query_bars('SPY', interval, sbar, ebar)
+            assert bars
+            assert len(bars) <= len(minute_bars)
+            assert sum([bar[6] for bar in bars]) == sum([bar[6] for bar in minute_bars])
+        after = api.call_txtrader_get('query_bar_cache_metrics', {})
+        pprint(after)
+        for interval in ['5', '15', '60']:
+            assert after[interval]['hit'] == before.get(interval, {'hit': 0})['hit'] + 1
+
+
 def test_cancel_order(api):
     ret = api.cancel_order('000')
     assert ret
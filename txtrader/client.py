@@ -69,6 +69,11 @@ class API(object):
             'shutdown': (self.shutdown, False, ('message')),
             'uptime': (self.uptime, False, ()),
             'query_bars': (self.query_bars, True, ('symbol', 'interval', 'start_time', 'end_time')),
+            'query_bar_cache_metrics': (self.query_bar_cache_metrics, False, ()),
+            'query_request_metrics': (self.query_request_metrics, False, ()),
+            'query_connection_stats': (self.query_connection_stats, False, ()),
+            'query_send_metrics': (self.query_send_metrics, False, ()),
+            'query_gateway_sessions': (self.query_gateway_sessions, False, ()),
             'add_symbol': (self.add_symbol, True, ('symbol', )),
             'del_symbol': (self.del_symbol, True, ('symbol', )),
             'query_symbol': (self.query_symbol, True, ('symbol', )),
@@ -81,12 +86,16 @@ class API(object):
             'query_accounts': (self.query_accounts, False, ()),
             'query_account': (self.query_account, True, ('account', 'fields')),
             'query_positions': (self.query_positions, True, ()),
+            'query_pnl': (self.query_pnl, True, ()),
             'query_orders': (self.query_orders, True, ()),
+            'query_orders_since': (self.query_orders_since, True, ('seq', 'epoch')),
             'query_tickets': (self.query_tickets, True, ()),
             'query_order': (self.query_order, True, ('order_id', )),
+            'query_order_history': (self.query_order_history, True, ('order_id', )),
             'cancel_order': (self.cancel_order, True, ('order_id', )),
             'query_executions': (self.query_executions, True, ()),
             'query_order_executions': (self.query_order_executions, True, ('order_id', )),
+            'query_executions_since': (self.query_executions_since, True, ('seq', 'epoch')),
             'market_order': (self.market_order, True, ('symbol', 'quantity')),
             'create_staged_order_ticket': (self.create_staged_order_ticket, True, ()),
             'stage_market_order': (self.stage_market_order, True, ('tag', 'symbol', 'quantity')),
@@ -159,9 +168,27 @@ class API(object):
         return self.call_txtrader_get('time', {})
 
     def query_bars(self, *args):
+        bar_format = args[4] if len(args) > 4 else None
         args = {'symbol': args[0], 'period': args[1], 'start': args[2], 'end': args[3]}
+        if bar_format:
+            args['format'] = bar_format
         return self.call_txtrader_get('query_bars', args)
 
+    def query_bar_cache_metrics(self, *args):
+        return self.call_txtrader_get('query_bar_cache_metrics', {})
+
+    def query_request_metrics(self, *args):
+        return self.call_txtrader_get('query_request_metrics', {})
+
+    def query_connection_stats(self, *args):
+        return self.call_txtrader_get('query_connection_stats', {})
+
+    def query_send_metrics(self, *args):
+        return self.call_txtrader_get('query_send_metrics', {})
+
+    def query_gateway_sessions(self, *args):
+        return self.call_txtrader_get('query_gateway_sessions', {})
+
     def add_symbol(self, *args):
         return self.call_txtrader_post('add_symbol', {'symbol': args[0]})
 
@@ -203,23 +230,42 @@ class API(object):
             self.account = account
         return ret
 
+    def query_pnl(self, *args):
+        return self.call_txtrader_get('query_pnl', {'account': args[0]} if args else {})
+
     def query_positions(self, *args):
-        return self.call_txtrader_get('query_positions', {})
+        return self.call_txtrader_get('query_positions', {'refresh': args[0]} if args else {})
 
-    def query_orders(self, *args):
-        return self.call_txtrader_get('query_orders', {})
+    def _order_query_args(self, args, kwargs):
+        """build query_orders/query_tickets/query_executions arguments: ([refresh], status=, account=, symbol=, fields=)"""
+        ret = {'refresh': args[0]} if args else {}
+        for key, value in kwargs.items():
+            ret[key] = value if isinstance(value, str) else ','.join(value)
+        return ret
+
+    def query_orders(self, *args, **kwargs):
+        return self.call_txtrader_get('query_orders', self._order_query_args(args, kwargs))
+
+    def query_orders_since(self, *args):
+        return self.call_txtrader_get('query_orders_since', {'seq': args[0], 'epoch': args[1] if len(args) > 1 else ''})
 
-    def query_tickets(self, *args):
-        return self.call_txtrader_get('query_tickets', {})
+    def query_tickets(self, *args, **kwargs):
+        return self.call_txtrader_get('query_tickets', self._order_query_args(args, kwargs))
 
     def query_order(self, *args):
         return self.call_txtrader_get('query_order', {'id': args[0]})
 
+    def query_order_history(self, *args):
+        return self.call_txtrader_get('query_order_history', {'id': args[0]})
+
     def cancel_order(self, *args):
         return self.call_txtrader_post('cancel_order', {'id': args[0]})
 
-    def query_executions(self, *args):
-        return self.call_txtrader_get('query_executions', {})
+    def query_executions(self, *args, **kwargs):
+        return self.call_txtrader_get('query_executions', self._order_query_args(args, kwargs))
+
+    def query_executions_since(self, *args):
+        return self.call_txtrader_get('query_executions_since', {'seq': args[0], 'epoch': args[1] if len(args) > 1 else ''})
 
     def query_order_executions(self, *args):
         return self.call_txtrader_get('query_order_executions', {'id': args[0]})
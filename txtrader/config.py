@@ -25,7 +25,35 @@ defaults = {
     "GATEWAY_DISCONNECT_SHUTDOWN": 1,
     "ENABLE_BARCHART": 1,
     "ENABLE_SYMBOL_BARCHART": 0,
+    "BARCHART_RECONCILE_INTERVAL": 300,
+    "ENABLE_BAR_CACHE": 1,
+    "BAR_CACHE_DAYS": 5,
+    "BAR_ARCHIVE_DIR": '',
+    "BAR_ARCHIVE_MAX_MB": 1024,
+    "BAR_ARCHIVE_MAX_DAYS": 0,
     "ENABLE_EXECUTION_ACCOUNT_FORMAT": 1,
+    "ENABLE_ORDER_CACHE": 1,
+    "ORDER_CACHE_RECONCILE_INTERVAL": 300,
+    "CHANGE_LOG_SIZE": 10000,
+    "ORDER_HISTORY_SIZE": 50,
+    "ORDER_HISTORY_DIR": '~/.txtrader/order-history',
+    "ORDER_ARCHIVE_DIR": '',
+    "ORDER_ARCHIVE_AGE": 3600,
+    "ORDER_JOURNAL_DIR": '',
+    "ENABLE_POSITION_CACHE": 1,
+    "POSITION_RECONCILE_INTERVAL": 60,
+    "ENABLE_PNL": 0,
+    "PNL_UPDATE_INTERVAL": 1,
+    "ACCOUNT_DATA_CACHE_TTL": 5,
+    "ENABLE_REQUEST_COALESCING": 1,
+    "CXN_POOL_MIN": 2,
+    "CXN_POOL_MAX": 32,
+    "CXN_POOL_IDLE_TIMEOUT": 300,
+    "API_SESSION_ROUTES": '',
+    "API_STANDBY_HOST": '',
+    "API_STANDBY_PORT": 0,
+    "FAILOVER_TIMEOUT": 30,
+    "SEND_RATE_LIMITS": 'order=0,status=200,market=100,bars=20,housekeeping=20',
     "ENABLE_HIGH_LOW": 1,
     "ENABLE_SECONDS_TICK": 1,
     "ENABLE_TICKER": 0,
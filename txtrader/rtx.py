@@ -16,7 +16,7 @@ import types
 from uuid import uuid1
 import ujson as json
 import time
-from collections import OrderedDict
+from collections import OrderedDict, deque
 from hexdump import hexdump
 import pytz
 import tzlocal
@@ -24,6 +24,10 @@ import datetime
 import re
 from pprint import pprint
 from copy import deepcopy
+from array import array
+import mmap
+import struct
+import zlib
 
 from txtrader.config import Config
 from txtrader.tcpserver import tcpserver
@@ -36,6 +40,21 @@ CALLBACK_METRIC_HISTORY_LIMIT = 1024
 
 TIMEOUT_TYPES = ['DEFAULT', 'ACCOUNT', 'ADDSYMBOL', 'ORDER', 'ORDERSTATUS', 'POSITION', 'TIMER', 'BARCHART']
 
+# outbound gateway message classes in priority order, and the TQL tables that determine a command's class
+SEND_CLASSES = ['order', 'status', 'market', 'bars', 'housekeeping']
+SEND_CLASS_TABLES = {
+    'ORDERS': 'status',
+    'POSITION': 'status',
+    'DEPOSIT': 'status',
+    'ACCOUNT': 'status',
+    'LIVEQUOTE': 'market',
+    'INTRADAY': 'bars',
+    'DAILY': 'bars',
+}
+
+# connection pools opened to CXN_POOL_MIN connections as soon as the gateway reports startup
+CXN_POOL_PREWARM = [('ACCOUNT_GATEWAY', 'ORDER'), ('TA_SRV', 'LIVEQUOTE')]
+
 # default RealTick orders to NYSE and Stock type
 RTX_EXCHANGE = 'NYS'
 RTX_STYPE = 1
@@ -43,10 +62,63 @@ RTX_STYPE = 1
 BARCHART_FIELDS = 'DISP_NAME,TRD_DATE,TRDTIM_1,OPEN_PRC,HIGH_1,LOW_1,SETTLE,ACVOL_1'
 BARCHART_TOPIC = 'LIVEQUOTE'
 
+# LIVEQUOTE advise fields; each advise requests the union of the fields its clients need
+QUOTES_ADVISE_FIELDS = 'TRD_DATE,TRDTIM_1,TRDPRC_1,TRDVOL_1,ACVOL_1,OPEN_PRC,HST_CLOSE,VWAP'
+QUOTES_ADVISE_TICKER_FIELDS = 'BID,BIDSIZE,ASK,ASKSIZE'
+QUOTES_ADVISE_HIGH_LOW_FIELDS = 'HIGH_1,LOW_1'
+QUOTES_ADVISE_TRADE_FIELDS = 'TRD_DATE,TRDTIM_1,TRDPRC_1,TRDVOL_1,ACVOL_1'
+QUOTES_ADVISE_MIN_FIELDS = 'TRD_DATE,TRDTIM_1,TRDPRC_1'
+PNL_ADVISE_FIELDS = 'TRD_DATE,TRDTIM_1,TRDPRC_1,HST_CLOSE,BID,ASK'
+QUOTES_ADVISE_DEPENDENCIES = {'TRDPRC_1': ['TRD_DATE', 'TRDTIM_1'], 'BID': ['BIDSIZE'], 'ASK': ['ASKSIZE']}
+QUOTES_EXPORT_FIELDS = {
+    'last': 'TRDPRC_1',
+    'tradetime': 'TRDTIM_1',
+    'size': 'TRDVOL_1',
+    'volume': 'ACVOL_1',
+    'open': 'OPEN_PRC',
+    'close': 'HST_CLOSE',
+    'vwap': 'VWAP',
+    'high': 'HIGH_1',
+    'low': 'LOW_1',
+    'bid': 'BID',
+    'bidsize': 'BIDSIZE',
+    'ask': 'ASK',
+    'asksize': 'ASKSIZE',
+}
+
 DEFAULT_EXECUTION_FIELDS = 'ORDER_ID,ORIGINAL_ORDER_ID,BANK,BRANCH,CUSTOMER,DEPOSIT,AVG_PRICE,BUYORSELL,CURRENCY,CURRENT_STATUS,DISP_NAME,EXCHANGE,EXIT_VEHICLE,FILL_ID,ORDER_RESIDUAL,ORIGINAL_PRICE,ORIGINAL_VOLUME,PRICE,PRICE_TYPE,TIME_STAMP,TIME_ZONE,MARKET_TRD_DATE,TRD_TIME,VOLUME,VOLUME_TRADED,CUSIP'
 
 DEBUG_TRUNCATE_RESULTS = 32
 
+# on-disk bar archive file header: magic, bar count; followed by stamp, open, high, low, close, volume columns
+BAR_ARCHIVE_MAGIC = b'TXTBARS1'
+BAR_ARCHIVE_HEADER = struct.Struct('<8sQ')
+BAR_ARCHIVE_COLUMNS = 'qddddq'
+NAIVE_EPOCH = datetime.datetime(1970, 1, 1)
+NAIVE_EPOCH_ORDINAL = NAIVE_EPOCH.toordinal()
+
+BARCHART_COLUMNS = ['date', 'time', 'open', 'high', 'low', 'close', 'volume']
+
+# order journal segments: records are a (length, crc32) header followed by the JSON [table, row] payload
+ORDER_JOURNAL_RECORD = struct.Struct('<II')
+ORDER_JOURNAL_SEGMENT_SIZE = 64 * 0x100000
+
+# terminal order states eligible for the order archive, and the number of archived records kept in memory
+ORDER_ARCHIVE_STATUS = ['Filled', 'Cancelled', 'Error']
+ORDER_ARCHIVE_CACHE_SIZE = 100
+
+# callback labels whose gateway rows are applied to the order and execution stores before formatting
+ORDER_ROW_LABELS = ['orders', 'order_status', 'tickets']
+EXECUTION_ROW_LABELS = ['executions', 'order_executions', 'execution']
+
+# filter and projection arguments accepted by query_orders, query_tickets and query_executions
+ORDER_QUERY_KEYS = ['status', 'account', 'symbol', 'fields']
+
+# symbol barchart slots; one 1-minute bar per minute of the session date
+BARCHART_CAPACITY = 1440
+BARCHART_TIME_LABELS = ['%02d:%02d:00' % divmod(m, 60) for m in range(BARCHART_CAPACITY)]
+BARCHART_LABEL = re.compile(r'^\d{4}-\d{2}-\d{2} ([01]\d|2[0-3]):[0-5]\d')
+
 from twisted.python import log
 from twisted.python.failure import Failure
 from twisted.internet.protocol import Protocol, ReconnectingClientFactory
@@ -60,24 +132,89 @@ from socket import gethostname
 LINE_BUFFER_LENGTH = 0x10000000
 
 
+def float_2(value):
+    return round(float(value), 2)
+
+
+def join_serialized(items):
+    """return JSON object text for (key, object) pairs, using each object's cached serialize() output"""
+    return '{' + ','.join(f"{json.dumps(k)}:{v.serialize()}" for k, v in items) + '}'
+
+
+class API_TimeConverter(object):
+    """convert naive times between two timezones using UTC offset differences cached per date"""
+
+    def __init__(self, fromzone, tozone):
+        self.fromzone = fromzone
+        self.tozone = tozone
+        self.days = {}
+
+    def __repr__(self):
+        return f"{__class__.__name__}<{hex(id(self))} {self.fromzone} {self.tozone}>"
+
+    def offset(self, t):
+        """return the conversion offset in seconds for naive time t, computed with pytz"""
+        return int((self.fromzone.localize(t).astimezone(self.tozone).replace(tzinfo=None) - t).total_seconds())
+
+    def offsets(self, day):
+        """return [(second_of_day, offset), ...] for a day number since 1970-01-01; more than one entry on DST dates"""
+        segments = self.days.get(day)
+        if segments is None:
+            start = NAIVE_EPOCH + datetime.timedelta(days=day)
+            samples = [self.offset(start + datetime.timedelta(hours=hour)) for hour in range(25)]
+            segments = [(0, samples[0])]
+            for hour in range(24):
+                if samples[hour + 1] != samples[hour]:
+                    # find the second within the hour where the offset changes
+                    low, high = hour * 3600, (hour + 1) * 3600
+                    while high - low > 1:
+                        mid = (low + high) // 2
+                        if self.offset(start + datetime.timedelta(seconds=mid)) == samples[hour]:
+                            low = mid
+                        else:
+                            high = mid
+                    segments.append((high, samples[hour + 1]))
+            self.days[day] = segments
+        return segments
+
+    def day_offset(self, day, second):
+        segments = self.offsets(day)
+        offset = segments[0][1]
+        for start, value in segments[1:]:
+            if second >= start:
+                offset = value
+        return offset
+
+    def convert_seconds(self, seconds):
+        """convert naive epoch seconds"""
+        day, second = divmod(seconds, 86400)
+        return seconds + self.day_offset(day, second)
+
+    def convert(self, t):
+        """convert a naive datetime"""
+        offset = self.day_offset(t.toordinal() - NAIVE_EPOCH_ORDINAL, t.hour * 3600 + t.minute * 60 + t.second)
+        return t + datetime.timedelta(seconds=offset)
+
+
 class RtxClient(LineReceiver):
     delimiter = b'\n'
     MAX_LENGTH = LINE_BUFFER_LENGTH
 
-    def __init__(self, rtx):
+    def __init__(self, rtx, session):
         self.rtx = rtx
+        self.session = session
 
     def lineReceived(self, data):
 
         try:
-            self.rtx.gateway_receive(data)
+            self.rtx.gateway_receive(data, self.session)
         except Exception as exc:
             self.rtx.error_handler(repr(self), repr(exc))
             traceback.print_exc()
             self.rtx.check_exception_halt(exc, self)
 
     def connectionMade(self):
-        self.rtx.gateway_connect(self)
+        self.rtx.gateway_connect(self, self.session)
 
     def lineLengthExceeded(self, line):
         self.rtx.force_disconnect(f"RtxClient: Line length exceeded: line={repr(line)}")
@@ -87,26 +224,600 @@ class RtxClientFactory(ReconnectingClientFactory):
     initialDelay = 15
     maxDelay = 60
 
-    def __init__(self, rtx):
+    def __init__(self, rtx, session):
         self.rtx = rtx
+        self.session = session
 
     def startedConnecting(self, connector):
-        self.rtx.info('RTGW: Started to connect.')
+        self.rtx.info(f"RTGW {self.session.name}: Started to connect.")
 
     def buildProtocol(self, addr):
-        self.rtx.info('RTGW: Connected.')
+        self.rtx.info(f"RTGW {self.session.name}: Connected.")
         self.resetDelay()
-        return RtxClient(self.rtx)
+        return RtxClient(self.rtx, self.session)
 
     def clientConnectionLost(self, connector, reason):
-        self.rtx.error(f"{self} Lost Connection: {reason}")
+        self.rtx.error(f"{self} {self.session.name} Lost Connection: {reason}")
         ReconnectingClientFactory.clientConnectionLost(self, connector, reason)
-        self.rtx.gateway_connect(None)
+        self.rtx.gateway_connect(None, self.session)
 
     def clientConnectionFailed(self, connector, reason):
-        self.rtx.error(f"{self} Connection failed: {reason}")
+        self.rtx.error(f"{self} {self.session.name} Connection failed: {reason}")
         ReconnectingClientFactory.clientConnectionFailed(self, connector, reason)
-        self.rtx.gateway_connect(None)
+        self.rtx.gateway_connect(None, self.session)
+
+
+class RTX_Session(object):
+    """one RTGW TCP session; each (service, topic) is routed to a session by API_SESSION_ROUTES
+
+    with API_STANDBY_HOST set, each routed session has a standby partner connected to the standby gateway; the
+    partners form a group, and whichever member is serving carries the group's advises and initial queries
+    """
+
+    def __init__(self, api, name, host, port, group=None):
+        self.api = api
+        self.name = name
+        self.host = host
+        self.port = port
+        self.group = group or self
+        self.partner = None
+        self.routes = []
+        self.protocol = None
+        self.sender = None
+        self.transport = None
+        self.connected = False
+        self.serving = False
+        self.status = 'Startup'
+        self.seconds_disconnected = 0
+        self.failovers = 0
+        self.last_failover = None
+
+    def __repr__(self):
+        return f"{__class__.__name__}<{hex(id(self))} {self.name} {self.status}>"
+
+    def connect(self):
+        reactor.connectTCP(self.host, self.port, RtxClientFactory(self.api, self))
+
+    def carries(self, service, topic):
+        return self.api.route_session(service, topic) is self.group
+
+    def group_connected(self):
+        return self.connected or bool(self.partner and self.partner.connected)
+
+    def set_status(self, status):
+        if status != self.status:
+            self.status = status
+            self.api.output(f"gateway session {self.name}: {status}")
+
+    def query(self):
+        return {
+            'host': self.host,
+            'port': self.port,
+            'routes': self.routes,
+            'status': self.status,
+            'serving': self.serving,
+            'standby_for': self.group.name if self.group is not self else None,
+            'seconds_disconnected': self.seconds_disconnected,
+            'failovers': self.failovers,
+            'last_failover_ms': self.last_failover,
+        }
+
+
+class API_Failover(object):
+    """timing of a switch from a lost serving session to its connected partner
+
+    complete once the partner has acknowledged every advise and request resubmitted to it; the commands submitted
+    to the target from creation until watch() are tracked as (connection id, command number) pairs
+    """
+
+    def __init__(self, api, source, target):
+        self.api = api
+        self.source = source
+        self.target = target
+        self.started = time.time()
+        self.pending = set()
+        self.tracking = True
+
+    def __repr__(self):
+        return f"{__class__.__name__}<{hex(id(self))} {self.source.name}->{self.target.name} {len(self.pending)}>"
+
+    def track(self, cxn, number):
+        if self.tracking and cxn.session is self.target:
+            self.pending.add((cxn.id, number))
+
+    def watch(self):
+        """stop tracking new commands, and wait for the acks of the commands resubmitted to the target session"""
+        self.tracking = False
+        self.check()
+
+    def acknowledged(self, cxn, number):
+        self.pending.discard((cxn.id, number))
+        self.check()
+
+    def check_timeout(self):
+        """stop waiting once FAILOVER_TIMEOUT has passed; the commands still unacknowledged are reported"""
+        elapsed = time.time() - self.started
+        if self.api.failover is self and elapsed > self.api.failover_timeout:
+            self.api.failover = None
+            self.api.error_handler(
+                self.api.id,
+                f"gateway failover from {self.source.name} to {self.target.name} timed out after {int(elapsed)} seconds with {len(self.pending)} commands unacknowledged"
+            )
+            self.api.WriteAllClients(f"gateway-failover-timeout: {self.source.name} {self.target.name} {len(self.pending)}")
+
+    def check(self):
+        if not self.pending and self.api.failover is self:
+            elapsed = int((time.time() - self.started) * 1000)
+            self.target.failovers += 1
+            self.target.last_failover = elapsed
+            self.api.failover = None
+            self.api.output(f"gateway failover from {self.source.name} to {self.target.name} complete in {elapsed} ms")
+            self.api.WriteAllClients(f"gateway-failover: {self.source.name} {self.target.name} {elapsed}")
+
+
+class API_Barchart(object):
+    """fixed-capacity 1-minute bar store for a single session date, indexed by minute since the start of the date"""
+
+    def __init__(self, capacity=BARCHART_CAPACITY):
+        self.capacity = capacity
+        self.clear()
+
+    def __repr__(self):
+        return f"{__class__.__name__}<{hex(id(self))} {self.date} {len(self)}>"
+
+    def __len__(self):
+        return self.count
+
+    def clear(self, bar_date=''):
+        self.date = bar_date
+        self.count = 0
+        self.first = self.capacity
+        self.last = -1
+        self.present = bytearray(self.capacity)
+        self.open = array('d', bytes(8 * self.capacity))
+        self.high = array('d', bytes(8 * self.capacity))
+        self.low = array('d', bytes(8 * self.capacity))
+        self.close = array('d', bytes(8 * self.capacity))
+        self.volume = array('q', bytes(8 * self.capacity))
+
+    def slot(self, bar_date, bar_time):
+        """return (index, created) for the bar at bar_date, bar_time; index is None if the bar can't be stored"""
+        if not (isinstance(bar_date, str) and isinstance(bar_time, str)
+                and BARCHART_LABEL.match(f"{bar_date} {bar_time}")):
+            # empty or malformed labels (gateway error values) would fail to parse, or start a bogus session date
+            return None, False
+        if bar_date != self.date:
+            if bar_date < self.date:
+                return None, False
+            # a new session date has started
+            self.clear(bar_date)
+        index = (int(bar_time[0:2]) * 60 + int(bar_time[3:5])) % self.capacity
+        created = not self.present[index]
+        if created:
+            self.present[index] = 1
+            self.count += 1
+            self.first = min(self.first, index)
+            self.last = max(self.last, index)
+        return index, created
+
+    def upsert(self, bar_date, bar_time, _open, high, low, close, volume):
+        index, created = self.slot(bar_date, bar_time)
+        if index is not None:
+            self.open[index] = _open
+            self.high[index] = high
+            self.low[index] = low
+            self.close[index] = close
+            self.volume[index] = volume
+        return index
+
+    def resample(self, start, stop, interval, origin=0):
+        """return the bars in slots start..stop aggregated into interval-minute bars aligned to the origin slot"""
+        bars = []
+        bucket = None
+        for i in range(max(start, self.first), min(stop, self.last) + 1):
+            if self.present[i]:
+                b = origin + ((i - origin) // interval) * interval
+                if b != bucket:
+                    bucket = b
+                    bar = [
+                        self.date, BARCHART_TIME_LABELS[b % self.capacity], self.open[i], self.high[i], self.low[i],
+                        self.close[i], self.volume[i]
+                    ]
+                    bars.append(bar)
+                else:
+                    bar[3] = max(bar[3], self.high[i])
+                    bar[4] = min(bar[4], self.low[i])
+                    bar[5] = self.close[i]
+                    bar[6] += self.volume[i]
+        return bars
+
+    def render(self):
+        """return bars in time order as [[date, time, open, high, low, close, volume], ...]"""
+        return [
+            [
+                self.date, BARCHART_TIME_LABELS[i], self.open[i], self.high[i], self.low[i], self.close[i],
+                self.volume[i]
+            ] for i in range(self.first, self.last + 1) if self.present[i]
+        ]
+
+
+class API_BarCache(object):
+    """per-symbol cache of 1-minute INTRADAY bars for recent session dates, with the local minutes fetched"""
+
+    def __init__(self, api):
+        self.api = api
+        self.days = OrderedDict()
+
+    def __repr__(self):
+        return f"{__class__.__name__}<{hex(id(self))} {list(self.days.keys())}>"
+
+    def day(self, bar_date):
+        if not bar_date in self.days:
+            self.days[bar_date] = (API_Barchart(), [])
+            while len(self.days) > self.api.bar_cache_days:
+                self.days.popitem(last=False)
+        return self.days[bar_date]
+
+    def missing(self, bar_date, start, stop):
+        """return the first minute in start..stop not yet fetched from the gateway, or None if all are cached"""
+        if bar_date in self.days:
+            for first, last in self.days[bar_date][1]:
+                if first <= start <= last:
+                    start = last + 1
+        return start if start <= stop else None
+
+    def store(self, bar_date, start, stop, bars):
+        bars_store, coverage = self.day(bar_date)
+        for bar in bars:
+            bars_store.upsert(*bar[:7])
+        if start <= stop:
+            coverage.append([start, stop])
+            coverage.sort()
+            merged = [coverage[0]]
+            for first, last in coverage[1:]:
+                if first <= merged[-1][1] + 1:
+                    merged[-1][1] = max(merged[-1][1], last)
+                else:
+                    merged.append([first, last])
+            coverage[:] = merged
+
+    def resample(self, bar_date, start, stop, interval, origin):
+        return self.day(bar_date)[0].resample(start, stop, interval, origin)
+
+
+class API_BarCacheRequest(object):
+    """answer an INTRADAY query_bars request from the symbol bar cache, fetching uncached minutes from the gateway"""
+
+    def __init__(self, api, symbol, interval, bar_start, bar_end, session_start, callback, structured):
+        self.api = api
+        self.symbol = symbol
+        self.interval = interval
+        self.bar_start = bar_start
+        self.bar_end = bar_end
+        self.callback = callback
+        self.structured = structured
+        # the cached bars are stored by local date and minute, so the cache keys and coverage use the local clock
+        local_start = api.localize_time(bar_start)
+        self.local_date = local_start.date()
+        self.date = self.local_date.isoformat()
+        self.start = api.local_minute(bar_start)
+        self.stop = api.local_minute(bar_end)
+        # only completed minutes of the current session are considered cached
+        self.closed = self.stop
+        local_now = api.localize_time(api.feed_now)
+        if self.local_date == local_now.date():
+            self.closed = min(self.stop, local_now.hour * 60 + local_now.minute - 1)
+        self.origin = api.local_minute(datetime.datetime.combine(bar_start.date(), session_start.time()))
+        self.api.debug(f"{self}.__init__(...)")
+
+    def __repr__(self):
+        return f"{__class__.__name__}<{hex(id(self))} {self.symbol} {self.interval} {self.date}>"
+
+    def query(self):
+        cache = self.api.symbols[self.symbol].bar_cache
+        fetch_start = cache.missing(self.date, self.start, self.closed)
+        self.api.record_bar_cache_metrics(self.interval, fetch_start is None)
+        if fetch_start is None:
+            self.complete(min(self.bar_end, self.minute_time(self.closed)))
+        else:
+            self.fetch_start = fetch_start
+            cb = RTX_LocalCallback(self.api, self.handle_response, self.handle_failure)
+            self.api.request_bars(self.symbol, 'INTRADAY', 1, self.minute_time(fetch_start), self.bar_end, 'barchart_data', cb)
+
+    def handle_response(self, bars):
+        if bars is None:
+            API_Callback(self.api, 0, self.label(), self.callback).complete(None)
+        else:
+            symbol = self.api.symbols.get(self.symbol)
+            if symbol:
+                symbol.bar_cache.store(self.date, self.fetch_start, self.closed, bars)
+            self.complete(self.bar_end)
+
+    def handle_failure(self, error):
+        self.api.error_handler(self.symbol, f"bar cache fetch failed: {error}")
+        API_Callback(self.api, 0, self.label(), self.callback).complete(None)
+
+    def label(self):
+        return 'cached_barchart_data' if self.structured else 'cached_barchart'
+
+    def minute_time(self, minute):
+        """return the API time of a local minute of the requested date"""
+        return self.api.unlocalize_time(datetime.datetime.combine(self.local_date, datetime.time(*divmod(minute, 60))))
+
+    def complete(self, bar_end):
+        symbol = self.api.symbols.get(self.symbol)
+        bars = None
+        if symbol:
+            stop = self.api.local_minute(bar_end)
+            bars = symbol.bar_cache.resample(self.date, self.start, stop, self.interval, self.origin)
+        API_Callback(self.api, 0, self.label(), self.callback).complete(bars)
+
+
+class API_BarArchive(object):
+    """persistent columnar store of bars for closed sessions, keyed by (symbol, table, interval, date)"""
+
+    def __init__(self, api, path, max_bytes, max_age_days):
+        self.api = api
+        self.path = os.path.expanduser(path)
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.files = OrderedDict()
+        self.size = 0
+        self.metrics = {'hit': 0, 'miss': 0, 'write': 0, 'evict': 0}
+        os.makedirs(self.path, exist_ok=True)
+        self.scan()
+        self.evict()
+
+    def __repr__(self):
+        return f"{__class__.__name__}<{hex(id(self))} {self.path} {len(self.files)} {self.size}>"
+
+    def scan(self):
+        """index existing files in least-recently-used order"""
+        found = []
+        for dirpath, dirnames, filenames in os.walk(self.path):
+            for filename in filenames:
+                if filename.endswith('.bars'):
+                    pathname = os.path.join(dirpath, filename)
+                    stat = os.stat(pathname)
+                    found.append((stat.st_mtime, pathname, stat.st_size))
+        for mtime, pathname, size in sorted(found):
+            self.files[pathname] = size
+            self.size += size
+
+    def filename(self, symbol, table, interval, bar_date):
+        return os.path.join(self.path, symbol, f"{table}-{interval}", f"{bar_date.isoformat()}.bars")
+
+    def read(self, symbol, table, interval, bar_date):
+        """return the archived bars for a date as [[date, time, open, high, low, close, volume], ...] or None"""
+        pathname = self.filename(symbol, table, interval, bar_date)
+        if not pathname in self.files:
+            self.metrics['miss'] += 1
+            return None
+        with open(pathname, 'rb') as ifp:
+            with mmap.mmap(ifp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                magic, count = BAR_ARCHIVE_HEADER.unpack_from(mm)
+                if magic != BAR_ARCHIVE_MAGIC:
+                    self.api.error_handler(self.api.id, f"bar archive: bad file header: {pathname}")
+                    return None
+                view = memoryview(mm)
+                columns = []
+                offset = BAR_ARCHIVE_HEADER.size
+                for code in BAR_ARCHIVE_COLUMNS:
+                    column = view[offset:offset + 8 * count]
+                    columns.append(column.cast(code).tolist())
+                    column.release()
+                    offset += 8 * count
+                view.release()
+        self.files.move_to_end(pathname)
+        os.utime(pathname)
+        self.metrics['hit'] += 1
+        stamps = columns[0]
+        labels = [(NAIVE_EPOCH + datetime.timedelta(seconds=s)).isoformat(' ') for s in stamps]
+        return [[label[:10], label[11:19]] + list(bar) for label, bar in zip(labels, zip(*columns[1:]))]
+
+    def write(self, symbol, table, interval, bar_date, bars):
+        """store the bars for a closed session date"""
+        pathname = self.filename(symbol, table, interval, bar_date)
+        stamps = [
+            int((datetime.datetime.strptime(f"{b[0]} {b[1]}", '%Y-%m-%d %H:%M:%S') - NAIVE_EPOCH).total_seconds())
+            for b in bars
+        ]
+        columns = [array('q', stamps)]
+        for i, code in enumerate(BAR_ARCHIVE_COLUMNS[1:]):
+            columns.append(array(code, [b[i + 2] for b in bars]))
+        os.makedirs(os.path.dirname(pathname), exist_ok=True)
+        tempname = pathname + '.tmp'
+        with open(tempname, 'wb') as ofp:
+            ofp.write(BAR_ARCHIVE_HEADER.pack(BAR_ARCHIVE_MAGIC, len(bars)))
+            for column in columns:
+                column.tofile(ofp)
+        os.replace(tempname, pathname)
+        self.size -= self.files.pop(pathname, 0)
+        self.files[pathname] = os.path.getsize(pathname)
+        self.size += self.files[pathname]
+        self.metrics['write'] += 1
+        self.evict()
+
+    def evict(self):
+        """remove least recently used files over the size limit and files for dates older than the age limit"""
+        expired = set()
+        if self.max_age_days:
+            today = self.api.feed_now.date() if self.api.feed_now else datetime.date.today()
+            oldest = (today - datetime.timedelta(days=self.max_age_days)).isoformat()
+            expired = set([p for p in self.files if os.path.basename(p)[:10] < oldest])
+        size = self.size - sum([self.files[p] for p in expired])
+        if self.max_bytes and size > self.max_bytes:
+            for pathname in self.files:
+                if size <= self.max_bytes:
+                    break
+                if not pathname in expired:
+                    expired.add(pathname)
+                    size -= self.files[pathname]
+        for pathname in expired:
+            self.size -= self.files.pop(pathname)
+            try:
+                os.remove(pathname)
+            except OSError as ex:
+                self.api.error_handler(self.api.id, f"bar archive: eviction failed: {ex}")
+            self.metrics['evict'] += 1
+
+    def query_metrics(self):
+        return dict(self.metrics, files=len(self.files), bytes=self.size)
+
+
+class API_BarArchiveRequest(object):
+    """answer a bar request from the bar archive for closed dates, fetching the remainder from the gateway"""
+
+    def __init__(self, api, symbol, table, interval, bar_start, bar_end, label, callback):
+        self.api = api
+        self.symbol = symbol
+        self.table = table
+        self.interval = interval
+        self.bar_start = bar_start
+        self.bar_end = bar_end
+        self.label = label
+        self.callback = callback
+        self.session_start, self.session_stop = api.session_times(symbol)
+        self.today = api.feed_now.date()
+        self.cached = []
+        self.api.debug(f"{self}.__init__(...)")
+
+    def __repr__(self):
+        return f"{__class__.__name__}<{hex(id(self))} {self.symbol} {self.table} {self.interval}>"
+
+    def query(self):
+        archive = self.api.bar_archive
+        # collect archived dates, and the runs of consecutive dates that must be fetched from the gateway
+        runs = []
+        bar_date = self.bar_start.date()
+        while bar_date <= self.bar_end.date():
+            bars = archive.read(self.symbol, self.table, self.interval, bar_date) if bar_date < self.today else None
+            if bars is not None:
+                self.cached.extend(bars)
+            elif runs and runs[-1][1] == bar_date - datetime.timedelta(days=1):
+                runs[-1][1] = bar_date
+            else:
+                runs.append([bar_date, bar_date])
+            bar_date += datetime.timedelta(days=1)
+
+        if not runs:
+            self.complete(self.select(self.cached))
+        else:
+            self.fetches = [API_BarArchiveFetch(self, *self.fetch_range(first, last)) for first, last in runs]
+            for fetch in self.fetches:
+                cb = RTX_LocalCallback(self.api, fetch.handle_response, fetch.handle_failure)
+                self.api.request_gateway_bars(
+                    self.symbol, self.table, self.interval, fetch.start, fetch.end, 'barchart_data', cb
+                )
+
+    def fetch_range(self, first, last):
+        """return the gateway request range covering the dates first..last"""
+        if first == self.bar_start.date():
+            start = self.bar_start
+        else:
+            start = datetime.datetime.combine(first, self.session_start.time())
+        if last == self.bar_end.date():
+            end = self.bar_end
+        else:
+            end = datetime.datetime.combine(last, self.session_stop.time())
+        return start, end
+
+    def handle_fetch(self, fetch, bars):
+        if bars is not None:
+            bar_date = fetch.start.date()
+            while bar_date <= fetch.end.date() and bar_date < self.today:
+                if self.is_complete(fetch, bar_date):
+                    session_bars = self.session_bars(bars, bar_date)
+                    # a date without bars is a closed date if the gateway returned bars for a later date;
+                    # at the end of the response it may be a gateway gap, so leave it to be requested again
+                    if session_bars or self.has_later_bars(bars, bar_date):
+                        self.api.bar_archive.write(self.symbol, self.table, self.interval, bar_date, session_bars)
+                bar_date += datetime.timedelta(days=1)
+        if [f for f in self.fetches if f.bars is False]:
+            return
+        if [f for f in self.fetches if f.bars is None]:
+            self.complete(self.select(self.cached) if self.cached else None)
+        else:
+            fetched = [bar for f in self.fetches for bar in f.bars]
+            self.complete(self.select(sorted(self.cached + fetched, key=lambda bar: (bar[0], bar[1]))))
+
+    def handle_failure(self, error):
+        self.api.error_handler(self.symbol, f"bar archive fetch failed: {error}")
+
+    def is_complete(self, fetch, bar_date):
+        """return True if the gateway request covered the whole session on bar_date"""
+        if self.table == 'DAILY':
+            return True
+        if bar_date == fetch.start.date() and fetch.start.time() > self.session_start.time():
+            return False
+        if bar_date == fetch.end.date() and fetch.end.time() < self.session_stop.time():
+            return False
+        return True
+
+    def has_later_bars(self, bars, bar_date):
+        after = self.api.localize_time(datetime.datetime.combine(bar_date, self.session_stop.time()))
+        after = after.isoformat(' ')[:19]
+        return bool(bars) and f"{bars[-1][0]} {bars[-1][1]}" > after
+
+    def session_bars(self, bars, bar_date):
+        """return the bars of the session on API date bar_date; bar labels are in local time"""
+        start = datetime.datetime.combine(bar_date, self.session_start.time())
+        stop = datetime.datetime.combine(bar_date, self.session_stop.time())
+        return self.select_range(bars, start, stop)
+
+    def select(self, bars):
+        """return the archived bars within the requested time range"""
+        return self.select_range(bars, self.bar_start, self.bar_end)
+
+    def select_range(self, bars, bar_start, bar_end):
+        start = self.api.localize_time(bar_start).isoformat(' ')[:19]
+        end = self.api.localize_time(bar_end).isoformat(' ')[:19]
+        return [bar for bar in bars if start <= f"{bar[0]} {bar[1]}" <= end]
+
+    def complete(self, bars):
+        label = 'cached_barchart_data' if self.label == 'barchart_data' else 'cached_barchart'
+        API_Callback(self.api, 0, label, self.callback).complete(bars)
+
+
+class API_BarArchiveFetch(object):
+    """one gateway request for a run of unarchived dates of an API_BarArchiveRequest"""
+
+    def __init__(self, request, start, end):
+        self.request = request
+        self.start = start
+        self.end = end
+        # False until the response arrives; None if the request failed
+        self.bars = False
+
+    def __repr__(self):
+        return f"{__class__.__name__}<{hex(id(self))} {self.start} {self.end}>"
+
+    def handle_response(self, bars):
+        self.bars = bars
+        self.request.handle_fetch(self, bars)
+
+    def handle_failure(self, error):
+        self.bars = None
+        self.request.handle_failure(error)
+        self.request.handle_fetch(self, None)
+
+
+class API_BarColumns(object):
+    """deliver query_bars results in columnar format"""
+
+    def __init__(self, api, callback):
+        self.api = api
+        self.callback = callback
+
+    def __repr__(self):
+        return f"{__class__.__name__}<{hex(id(self))}>"
+
+    def handle_response(self, bars):
+        API_Callback(self.api, 0, 'barchart_columns', self.callback).complete(bars)
+
+    def handle_failure(self, error):
+        self.api.error_handler(self.api.id, f"query_bars failed: {error}")
+        API_Callback(self.api, 0, 'barchart_columns', self.callback).complete(None)
 
 
 class API_Symbol(object):
@@ -117,6 +828,8 @@ class API_Symbol(object):
         self.symbol = symbol
         self.clients = set([client_id]) if client_id else set()
         self.callback = init_callback
+        self.cxn_updates = None
+        self.advise_what = None
         self.clear()
         self.register()
         self.api.debug(f"{repr(self)}.__init__(..., {client_id}, {init_callback})")
@@ -163,7 +876,9 @@ class API_Symbol(object):
         self.rawdata = {}
         self.last_quote = None
         self.last_trade = None
-        self.barchart = {}
+        self.barchart = API_Barchart()
+        self.bar_volume_base = None
+        self.bar_cache = API_BarCache(self.api)
 
     def api_initial_request(self):
         # request initial data
@@ -180,16 +895,32 @@ class API_Symbol(object):
         service, topic, table, what, where = self.quotes_advise_fields()
         self.cxn_updates = self.api.cxn_get(service, topic)
         self.cxn_updates.advise(table, what, where, self.parse_fields)
+        self.advise_what = what
 
     def api_cancel_updates(self):
         # disable live price updates
         self.api.info(f"Removing {self.symbol} from API watchlist")
         if self.cxn_updates:
-            service, topic, table, what, where = self.quotes_advise_fields()
-            cancel_callback = RTX_LocalCallback(self.api, self.cancel_handler, self.cancel_failed)
-            cb = API_Callback(self.api, self.cxn_updates.id, 'unadvise', cancel_callback)
-            self.cxn_updates.unadvise(table, what, where, cb)
+            self.api_unadvise(self.cxn_updates, self.advise_what)
             self.cxn_updates = None
+            self.advise_what = None
+
+    def api_unadvise(self, cxn, what):
+        service, topic, table, _, where = self.quotes_advise_fields()
+        cancel_callback = RTX_LocalCallback(self.api, self.cancel_handler, self.cancel_failed)
+        cb = API_Callback(self.api, cxn.id, 'unadvise', cancel_callback)
+        cxn.unadvise(table, what, where, cb)
+
+    def api_update_advise(self):
+        """upgrade or downgrade the active advise when the union of client field requests has changed"""
+        if self.cxn_updates:
+            what = self.quotes_advise_fields()[3]
+            if what != self.advise_what:
+                self.api.info(f"{self} changing advise fields from {self.advise_what} to {what}")
+                # start the new advise before terminating the old one so no updates are missed
+                cxn, old_what = self.cxn_updates, self.advise_what
+                self.api_request_updates()
+                self.api_unadvise(cxn, old_what)
 
     def cancel_handler(self, data):
         self.api.debug(f"{self} advise terminated: {data}")
@@ -231,11 +962,20 @@ class API_Symbol(object):
                 ret['asksize'] = self.ask_size
             if self.api.enable_symbol_barchart:
                 ret['bars'] = self.barchart_render()
+            # fields left out of a narrowed advise hold the initial request values; don't export them as current
+            for key, field in QUOTES_EXPORT_FIELDS.items():
+                if key in ret and not self.advised(field):
+                    del ret[key]
         return ret
 
+    def advised(self, fields):
+        """return True if the comma separated fields are current; all fields are current until updates are advised"""
+        return not self.advise_what or set(fields.split(',')).issubset(self.advise_what.split(','))
+
     def add_client(self, client):
         self.api.info(f"{self} adding client {client}")
         self.clients.add(client)
+        self.api_update_advise()
 
     def del_client(self, client):
         self.api.info(f"{self} deleting client {client}")
@@ -243,6 +983,8 @@ class API_Symbol(object):
         if not len(self.clients):
             self.api_cancel_updates()
             self.deregister()
+        else:
+            self.api_update_advise()
 
     def update_quote(self):
         quote = f"quote.{self.symbol}:{self.bid} {self.bid_size} {self.ask} {self.ask_size}"
@@ -283,7 +1025,7 @@ class API_Symbol(object):
 
     def barchart_query(self, start, callback, errback):
         self.api.debug(f"{self} barchart_query({repr((start, callback, errback))})")
-        self.api.query_bars(self.symbol, 1, start, '.', RTX_LocalCallback(self.api, callback, errback))
+        self.api.query_bars(self.symbol, 1, start, '.', RTX_LocalCallback(self.api, callback, errback), structured=True)
 
     def barchart_init_failed(self, error):
         self.api.error(f"{self} barchart_init_failed({error})")
@@ -294,7 +1036,7 @@ class API_Symbol(object):
         self.api.error_handler(f"{self}", 'BARCHART query failed for symbol %s: %s' % (self.symbol, repr(error)))
 
     def complete_barchart_init(self, bars):
-        self.api.debug(f"{self} complete_barchart_init([{len(bars)} bars])")
+        self.api.debug(f"{self} complete_barchart_init([{len(bars or [])} bars])")
         self.barchart_update(bars)
         self.complete_symbol_init()
 
@@ -309,14 +1051,29 @@ class API_Symbol(object):
         service = 'TA_SRV'
         topic = 'LIVEQUOTE'
         table = 'LIVEQUOTE'
-        what = 'TRD_DATE,TRDTIM_1,TRDPRC_1,TRDVOL_1,ACVOL_1,OPEN_PRC,HST_CLOSE,VWAP'
-        if self.api.enable_ticker:
-            what += ',BID,BIDSIZE,ASK,ASKSIZE'
-        if self.api.enable_high_low:
-            what += ',HIGH_1,LOW_1'
+        what = ','.join(self.quotes_advise_what())
         where = "DISP_NAME='%s'" % self.symbol
         return (service, topic, table, what, where)
 
+    def quotes_advise_what(self):
+        """return the ordered list of advise fields required by the current set of clients"""
+        available = self.api.quotes_advise_available_fields()
+        if self.clients:
+            fields = set()
+            for client in self.clients:
+                fields.update(self.api.symbol_client_fields(client, available))
+        else:
+            # symbols added without a client (HTTP query_symbol) are exported with the full field set
+            fields = set(available)
+        if not fields:
+            fields = set(QUOTES_ADVISE_MIN_FIELDS.split(','))
+        if self.api.enable_symbol_barchart:
+            fields.update(QUOTES_ADVISE_TRADE_FIELDS.split(','))
+        for field, dependencies in QUOTES_ADVISE_DEPENDENCIES.items():
+            if field in fields:
+                fields.update(dependencies)
+        return [f for f in available if f in fields]
+
     def parse_fields(self, cxn, data):
         """handle ADVISE updates received from the API"""
         trade_flag = False
@@ -329,20 +1086,18 @@ class API_Symbol(object):
 
         self.update_rawdata(data)
 
+        trade_tick = False
+        volume_base = self.volume
+
         if 'TRDPRC_1' in data:
             self.last = self.api.parse_tql_float(data['TRDPRC_1'], pid, 'TRDPRC_1')
             trade_flag = True
             if 'TRDTIM_1' in data and 'TRD_DATE' in data:
                 self.last_trade_time = ' '.join(self.api.format_barchart_date(data['TRD_DATE'], data['TRDTIM_1'], pid))
+                trade_tick = bool(self.last_trade_time.strip())
             else:
                 self.api.error_handler(f"{self}", 'TRDPRC_1 without TRD_DATE, TRDTIM_1')
 
-            # don't request a barchart update during the symbol init processing
-            if self.api.enable_symbol_barchart and (not self.cxn_init):
-                # query a barchart update after each trade
-                # TODO: revisit this: can a barchart use ADVISE instead?
-                self.barchart_query('-5', self.barchart_update, self.barchart_query_failed)
-
         if 'HIGH_1' in data:
             self.high = self.api.parse_tql_float(data['HIGH_1'], pid, 'HIGH_1')
             trade_flag = True
@@ -380,25 +1135,744 @@ class API_Symbol(object):
         if 'VWAP' in data:
             self.vwap = self.api.parse_tql_float(data['VWAP'], pid, 'VWAP')
 
+        # don't update the barchart during the symbol init processing
+        if trade_tick and self.api.enable_symbol_barchart and (not self.cxn_init):
+            self.barchart_add_trade(volume_base, 'ACVOL_1' in data, 'TRDVOL_1' in data)
+
         if self.api.enable_ticker:
-            if quote_flag:
+            if quote_flag and self.advised(QUOTES_ADVISE_TICKER_FIELDS):
                 self.update_quote()
-            if trade_flag:
+            if trade_flag and self.advised(QUOTES_ADVISE_TRADE_FIELDS):
                 self.update_trade()
 
+        if (trade_flag or quote_flag) and self.api.enable_pnl and self.symbol in self.api.pnl.holders:
+            self.api.pnl.mark(self.symbol)
+
     def barchart_render(self):
-        return [key.split(' ') + self.barchart[key] for key in sorted(list(self.barchart.keys()))]
+        return self.barchart.render()
+
+    def barchart_add_trade(self, volume_base, has_volume, has_size):
+        """apply a trade update to the current 1-minute bar"""
+        bars = self.barchart
+        price = self.last
+        i, created = bars.slot(self.last_trade_time[:10], self.last_trade_time[11:19])
+        if i is None:
+            return
+        if created:
+            bars.open[i] = bars.high[i] = bars.low[i] = bars.close[i] = price
+            bars.volume[i] = 0
+            self.bar_volume_base = volume_base
+        else:
+            if self.bar_volume_base is None:
+                # the bar was seeded from a barchart query; derive the volume base from its volume
+                self.bar_volume_base = volume_base - bars.volume[i]
+            bars.high[i] = max(bars.high[i], price)
+            bars.low[i] = min(bars.low[i], price)
+            bars.close[i] = price
+        if has_volume:
+            bars.volume[i] = max(self.volume - self.bar_volume_base, 0)
+        elif has_size:
+            bars.volume[i] += self.size
+
+    def barchart_reconcile(self):
+        """replace recent locally built bars with the bars reported by the gateway"""
+        self.barchart_query(
+            '-%d' % self.api.barchart_reconcile_minutes, self.barchart_update, self.barchart_query_failed
+        )
+
+    def barchart_update(self, bars):
+        """store a list of [date, time, open, high, low, close, volume] bars"""
+        if bars:
+            for bar in bars:
+                self.barchart.upsert(*bar[:7])
+            # the queried volume replaces the local count; rederive the volume base on the next trade
+            self.bar_volume_base = None
+        else:
+            self.api.error_handler(self.symbol, 'barchart_update: no bars found in %s' % repr(bars))
 
-    def barchart_update(self, bardata):
-        bars_found = False
-        if bardata:
-            bars = json.loads(bardata)
-            if bars:
-                for bar in bars:
-                    self.barchart['%s %s' % (bar[0], bar[1])] = bar[2:]
-                    bars_found = True
-        if not bars_found:
-            self.api.error_handler(self.symbol, 'barchart_update: no bars found in %s' % repr(bardata))
+
+class API_OrderHistory(object):
+    """append-only store of order update entries trimmed from API_Order.updates, kept as JSON lines on disk
+
+    entries are appended to an order-history-{date}.jsonl file in path, indexed in memory by (pathname, offset,
+    length); a new file is started each date, and earlier files are removed once no order in memory refers to them
+    orders are rebuilt from the gateway or the order journal at startup, so files left by a previous run are removed
+    """
+
+    def __init__(self, api, path):
+        self.api = api
+        self.path = os.path.expanduser(path)
+        self.entries = {}
+        self.files = {}
+        self.file = None
+        self.pathname = None
+        os.makedirs(self.path, exist_ok=True)
+        for filename in os.listdir(self.path):
+            if filename.startswith('order-history-') and filename.endswith('.jsonl'):
+                os.remove(os.path.join(self.path, filename))
+
+    def __repr__(self):
+        return f"{__class__.__name__}<{hex(id(self))} {len(self.entries)} {len(self.files)}>"
+
+    def rotate(self):
+        """start the current date's file if it isn't open"""
+        pathname = os.path.join(self.path, f"order-history-{datetime.date.today().isoformat()}.jsonl")
+        if pathname != self.pathname:
+            if self.file:
+                self.file.close()
+            self.file = open(pathname, 'ab+')
+            self.pathname = pathname
+            self.files.setdefault(pathname, 0)
+            self.prune()
+
+    def prune(self):
+        """remove earlier files without entries for orders in memory"""
+        for pathname in [p for p, count in self.files.items() if not count and p != self.pathname]:
+            del self.files[pathname]
+            try:
+                os.remove(pathname)
+            except OSError as ex:
+                self.api.error_handler(self.api.id, f"order history: remove failed: {ex}")
+
+    def append(self, oid, update):
+        self.rotate()
+        line = json.dumps(update).encode() + b'\n'
+        self.file.seek(0, os.SEEK_END)
+        self.entries.setdefault(oid, []).append((self.pathname, self.file.tell(), len(line)))
+        self.file.write(line)
+        self.file.flush()
+        self.files[self.pathname] += 1
+
+    def count(self, oid):
+        return len(self.entries.get(oid, []))
+
+    def discard(self, oid):
+        for pathname, offset, length in self.entries.pop(oid, []):
+            self.files[pathname] -= 1
+        self.prune()
+
+    def read(self, oid):
+        """return the stored update entries for an order, oldest first"""
+        lines = []
+        for pathname, offset, length in self.entries.get(oid, []):
+            if pathname == self.pathname:
+                self.file.seek(offset)
+                lines.append(self.file.read(length))
+            else:
+                with open(pathname, 'rb') as ifp:
+                    ifp.seek(offset)
+                    lines.append(ifp.read(length))
+        return [json.loads(line) for line in lines]
+
+
+class API_Positions(object):
+    """account -> symbol -> quantity positions from a gateway POSITION baseline plus the execution fills since"""
+
+    def __init__(self, api):
+        self.api = api
+        self.positions = {}
+        self.applied = {}
+        self.ready = False
+        self.fills = 0
+        self.mismatches = 0
+
+    def __repr__(self):
+        return f"{__class__.__name__}<{hex(id(self))} {len(self.positions)} {self.ready}>"
+
+    @staticmethod
+    def parse(api, rows):
+        """return {account: {symbol: quantity}} for gateway POSITION rows"""
+        positions = {a: {} for a in api.accounts or []}
+        for pos in rows or []:
+            if pos:
+                account = api.make_account(pos)
+                symbol = pos['DISP_NAME']
+                positions.setdefault(account, {}).setdefault(symbol, 0)
+                # if LONG positions exist, add them, if SHORT positions exist, subtract them
+                for m, f in [(1, 'LONGPOS'), (1, 'LONGPOS0'), (-1, 'SHORTPOS'), (-1, 'SHORTPOS0')]:
+                    if f in pos:
+                        positions[account][symbol] += m * int(pos[f])
+        return positions
+
+    @staticmethod
+    def fill_quantity(fields):
+        quantity = int(fields.get('VOLUME') or 0)
+        return quantity if str(fields.get('BUYORSELL', '')).startswith('Buy') else -quantity
+
+    def set_baseline(self, rows):
+        """replace positions with a gateway snapshot; known executions are assumed to be included in it"""
+        self.positions = self.parse(self.api, rows)
+        self.applied = {
+            xid: (self.api.make_account(e.fields), e.fields['DISP_NAME'], self.fill_quantity(e.fields))
+            for xid, e in self.api.executions.items()
+        }
+        self.ready = True
+
+    def apply_execution(self, execution):
+        """add the quantity of a new or changed fill to its account and symbol position"""
+        if not self.ready:
+            return
+        quantity = self.fill_quantity(execution.fields)
+        applied = self.applied.get(execution.oid)
+        change = quantity - (applied[2] if applied else 0)
+        if change:
+            account = self.api.make_account(execution.fields)
+            symbol = execution.fields['DISP_NAME']
+            self.applied[execution.oid] = (account, symbol, quantity)
+            symbols = self.positions.setdefault(account, {})
+            symbols[symbol] = symbols.get(symbol, 0) + change
+            self.fills += 1
+            self.api.send_position_update(account, symbol, symbols[symbol])
+            if self.api.enable_pnl:
+                self.api.pnl.add_fill(account, symbol, change, float(execution.fields.get('PRICE') or 0))
+
+    def reconcile(self, rows, applied):
+        """compare with a gateway snapshot requested when self.applied was applied; on mismatch, alarm and resync
+
+        positions changed by fills applied while the snapshot was pending may or may not be included in it, so they
+        are left out of the comparison and keep their current values on a resync
+        """
+        pending = set([entry[:2] for xid, entry in self.applied.items() if applied.get(xid) != entry])
+        gateway = self.parse(self.api, rows)
+        mismatched = []
+        for account in set(gateway) | set(self.positions):
+            ours = self.positions.get(account, {})
+            theirs = gateway.get(account, {})
+            for symbol in set(ours) | set(theirs):
+                if (account, symbol) not in pending and ours.get(symbol, 0) != theirs.get(symbol, 0):
+                    mismatched.append(f"{account} {symbol} {ours.get(symbol, 0)}!={theirs.get(symbol, 0)}")
+        if mismatched:
+            self.mismatches += 1
+            self.api.error_handler(self.api.id, f"position mismatch; resetting to gateway positions: {mismatched}")
+            kept = {(account, symbol): self.positions.get(account, {}).get(symbol, 0) for account, symbol in pending}
+            self.set_baseline(rows)
+            for (account, symbol), quantity in kept.items():
+                self.positions.setdefault(account, {})[symbol] = quantity
+            for account, symbols in self.positions.items():
+                for symbol, quantity in symbols.items():
+                    self.api.send_position_update(account, symbol, quantity)
+
+    def render(self):
+        return json.dumps(self.positions)
+
+
+class API_AccountData(object):
+    """account data responses cached by (account, fields) for a TTL; identical concurrent requests share one gateway query"""
+
+    def __init__(self, api, ttl):
+        self.api = api
+        self.ttl = ttl
+        self.cache = {}
+        self.pending = {}
+        self.generation = {}
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return f"{__class__.__name__}<{hex(id(self))} {len(self.cache)}>"
+
+    def request(self, account, fields, callback):
+        key = (account, ','.join(sorted(fields)) if fields else '*')
+        cached = self.cache.get(key)
+        if cached and cached[0] > time.time():
+            self.hits += 1
+            API_Callback(self.api, 0, 'cached_account_data', callback).complete(cached[1])
+        elif key in self.pending:
+            self.coalesced += 1
+            self.pending[key].append(callback)
+        else:
+            self.misses += 1
+            self.pending[key] = [callback]
+            self.api.request_account_data_query(account, fields, API_AccountDataRequest(self, key))
+
+    def invalidate(self, account):
+        """drop cached data for account, and keep responses already in flight from being cached"""
+        self.generation[account] = self.generation.get(account, 0) + 1
+        for key in [key for key in self.cache if key[0] == account]:
+            del self.cache[key]
+
+    def complete(self, request, data):
+        """pass a formatted response to the waiting callbacks; only non-empty data is cached"""
+        empty = data in [None, 'null', '{}', '[]']
+        if self.ttl and not empty and request.generation == self.generation.get(request.key[0], 0):
+            self.cache[request.key] = (time.time() + self.ttl, data)
+        for callback in self.pending.pop(request.key, []):
+            API_Callback(self.api, 0, 'cached_account_data', callback).complete(data)
+
+    def fail(self, request, failure):
+        for callback in self.pending.pop(request.key, []):
+            callback.errback(failure)
+
+
+class API_AccountDataRequest(object):
+
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.key = key
+        self.generation = cache.generation.get(key[0], 0)
+
+    def callback(self, data):
+        self.cache.complete(self, data)
+
+    def errback(self, failure):
+        self.cache.fail(self, failure)
+
+
+class API_PnL(object):
+    """per-account, per-symbol P&L from position fills at average cost, marked to the live API_Symbol prices
+
+    positions present in the gateway baseline are costed at the symbol's prior close (HST_CLOSE)
+    """
+
+    def __init__(self, api):
+        self.api = api
+        self.entries = {}
+        self.holders = {}
+        self.accounts = {}
+        self.dirty = set()
+        self.subscribing = set()
+
+    def __repr__(self):
+        return f"{__class__.__name__}<{hex(id(self))} {len(self.entries)}>"
+
+    def entry(self, account, symbol):
+        key = (account, symbol)
+        if key not in self.entries:
+            self.entries[key] = {'position': 0, 'cost': None, 'mark': None, 'realized': 0.0, 'unrealized': 0.0}
+            self.accounts.setdefault(account, set()).add(symbol)
+        self.holders.setdefault(symbol, set()).add(account)
+        return self.entries[key]
+
+    def sync(self, positions):
+        """set position quantities from an {account: {symbol: quantity}} map, keeping cost and realized P&L"""
+        for (account, symbol), entry in self.entries.items():
+            entry['position'] = positions.get(account, {}).get(symbol, 0)
+        for account, symbols in positions.items():
+            for symbol, quantity in symbols.items():
+                self.entry(account, symbol)['position'] = quantity
+        for symbol in list(self.holders):
+            self.watch(symbol)
+            self.mark(symbol)
+
+    def add_fill(self, account, symbol, quantity, price):
+        """apply a signed fill quantity at price using average cost"""
+        entry = self.entry(account, symbol)
+        position = entry['position']
+        cost = entry['cost']
+        if cost is None:
+            cost = self.prior_close(symbol) or price
+        if position == 0 or (position > 0) == (quantity > 0):
+            entry['cost'] = (cost * abs(position) + price * abs(quantity)) / (abs(position) + abs(quantity))
+        else:
+            closed = min(abs(quantity), abs(position))
+            entry['realized'] += (price - cost) * closed * (1 if position > 0 else -1)
+            entry['cost'] = price if abs(quantity) > abs(position) else cost
+        entry['position'] = position + quantity
+        self.mark(symbol)
+        self.watch(symbol)
+
+    def prior_close(self, symbol):
+        s = self.api.symbols.get(symbol)
+        return s.close if s else None
+
+    def watch(self, symbol):
+        """subscribe to prices for a held symbol as a symbol client, so its advise includes PNL_ADVISE_FIELDS
+
+        once every account is flat in the symbol it is no longer marked, and the subscription is released
+        """
+        s = self.api.symbols.get(symbol)
+        accounts = self.holders.get(symbol, ())
+        if not [a for a in accounts if self.entries[(a, symbol)]['position']]:
+            for account in accounts:
+                self.entries[(account, symbol)]['unrealized'] = 0.0
+                self.dirty.add(account)
+            self.holders.pop(symbol, None)
+            if s and self in s.clients:
+                self.api.symbol_disable(symbol, self)
+        elif (s is None or self not in s.clients) and symbol not in self.subscribing and self.api.initialized:
+            self.subscribing.add(symbol)
+            handler = API_PnLSymbol(self, symbol)
+            self.api.symbol_enable(symbol, self, RTX_LocalCallback(self.api, handler.handle_symbol, handler.handle_failure))
+
+    def mark(self, symbol):
+        """recompute unrealized P&L for the positions held in symbol"""
+        s = self.api.symbols.get(symbol)
+        if s:
+            price = s.last or ((s.bid + s.ask) / 2 if s.bid and s.ask else s.close)
+        else:
+            price = None
+        for account in self.holders.get(symbol, ()):
+            entry = self.entries[(account, symbol)]
+            if entry['cost'] is None and entry['position'] and s and s.close:
+                entry['cost'] = s.close
+            entry['mark'] = price or None
+            if price and entry['cost'] is not None:
+                entry['unrealized'] = (price - entry['cost']) * entry['position']
+            self.dirty.add(account)
+
+    def render_account(self, account):
+        symbols = {symbol: dict(self.entries[(account, symbol)]) for symbol in sorted(self.accounts.get(account, ()))}
+        realized = sum(e['realized'] for e in symbols.values())
+        unrealized = sum(e['unrealized'] for e in symbols.values())
+        return {'realized': realized, 'unrealized': unrealized, 'total': realized + unrealized, 'symbols': symbols}
+
+    def render(self, account=None):
+        accounts = [account] if account else sorted(self.accounts)
+        return {a: self.render_account(a) for a in accounts}
+
+    def send_updates(self):
+        """send pnl messages for accounts changed since the last call"""
+        dirty, self.dirty = self.dirty, set()
+        for account in sorted(dirty):
+            self.api.WriteAllClients(f"pnl.{account} {json.dumps(self.render_account(account))}", option_flag='pnl')
+
+
+class API_PnLSymbol(object):
+
+    def __init__(self, pnl, symbol):
+        self.pnl = pnl
+        self.symbol = symbol
+
+    def handle_symbol(self, data):
+        self.pnl.subscribing.discard(self.symbol)
+        # the position may have closed while the subscription was pending
+        self.pnl.watch(self.symbol)
+        self.pnl.mark(self.symbol)
+
+    def handle_failure(self, error):
+        self.pnl.subscribing.discard(self.symbol)
+        self.pnl.api.error_handler(repr(self.pnl), f"P&L price subscription failed: {self.symbol} {error}")
+
+
+class API_PositionSnapshot(object):
+
+    def __init__(self, api, applied):
+        self.api = api
+        self.applied = applied
+
+    def handle_snapshot(self, rows):
+        positions = self.api.positions
+        if positions.ready:
+            positions.reconcile(rows, self.applied)
+        else:
+            positions.set_baseline(rows)
+            self.api.output(f"Position baseline set. ({len(positions.positions)} accounts)")
+        if self.api.enable_pnl:
+            self.api.pnl.sync(positions.positions)
+
+
+class API_OrderJournal(object):
+    """append-only journal of gateway order and execution rows for the current date, in checksummed segment files
+
+    each process start appends to a new segment; replay() reads today's segments and stops a segment at the first
+    truncated or corrupt record, so a partially written tail after a crash is ignored
+    the first append after midnight starts the new date's segments and removes the previous date's
+    """
+
+    def __init__(self, api, path):
+        self.api = api
+        self.path = os.path.expanduser(path)
+        self.date = datetime.date.today().isoformat()
+        self.file = None
+        self.segment = 0
+        self.replaying = False
+        self.replayed = 0
+        os.makedirs(self.path, exist_ok=True)
+        self.prune()
+
+    def prune(self):
+        """remove the segments of dates other than the journal date"""
+        for filename in os.listdir(self.path):
+            if filename.startswith('journal-') and not filename.startswith(f"journal-{self.date}-"):
+                os.unlink(os.path.join(self.path, filename))
+
+    def __repr__(self):
+        return f"{__class__.__name__}<{hex(id(self))} {self.path} {self.segment}>"
+
+    def segments(self):
+        prefix = f"journal-{self.date}-"
+        return sorted(os.path.join(self.path, f) for f in os.listdir(self.path) if f.startswith(prefix))
+
+    def replay(self, handlers):
+        """pass each journaled row to handlers[table]; return the number of rows replayed"""
+        self.replaying = True
+        try:
+            for pathname in self.segments():
+                self.segment = max(self.segment, int(pathname[-8:-4]))
+                if os.path.getsize(pathname):
+                    with open(pathname, 'rb') as ifp:
+                        with mmap.mmap(ifp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                            self.replay_segment(pathname, mm, handlers)
+        finally:
+            self.replaying = False
+        return self.replayed
+
+    def replay_segment(self, pathname, mm, handlers):
+        offset = 0
+        while offset + ORDER_JOURNAL_RECORD.size <= len(mm):
+            length, crc = ORDER_JOURNAL_RECORD.unpack_from(mm, offset)
+            start = offset + ORDER_JOURNAL_RECORD.size
+            payload = mm[start:start + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                self.api.error_handler(self.api.id, f"order journal: bad record at {pathname}:{offset}; skipping remainder")
+                return
+            table, row = json.loads(payload)
+            handlers[table](row)
+            self.replayed += 1
+            offset = start + length
+
+    def append(self, table, row):
+        if self.replaying:
+            return
+        payload = json.dumps([table, row]).encode()
+        today = datetime.date.today().isoformat()
+        if today != self.date:
+            self.rollover(today)
+        if not self.file or self.file.tell() > ORDER_JOURNAL_SEGMENT_SIZE:
+            self.open_segment()
+        self.file.write(ORDER_JOURNAL_RECORD.pack(len(payload), zlib.crc32(payload)) + payload)
+
+    def rollover(self, date):
+        if self.file:
+            self.file.close()
+            self.file = None
+        self.date = date
+        self.segment = 0
+        self.prune()
+
+    def open_segment(self):
+        if self.file:
+            self.file.close()
+        self.segment += 1
+        self.file = open(os.path.join(self.path, f"journal-{self.date}-{self.segment:04d}.seg"), 'ab')
+
+    def flush(self):
+        if self.file:
+            self.file.flush()
+
+
+class API_OrderArchive(object):
+    """on-disk archive of terminal orders with their executions and update history, one JSON line per order
+
+    archive files are named orders-{date}.jsonl; executions received after an order was archived are appended as
+    {'oid', 'executions'} supplement lines; each archive file has an orders-{date}.idx file of
+    [oid, offset, length, [xid, ...]] lines, read at startup instead of the records
+    """
+
+    def __init__(self, api, path):
+        self.api = api
+        self.path = os.path.expanduser(path)
+        self.orders = {}
+        self.executions = {}
+        self.cache = OrderedDict()
+        os.makedirs(self.path, exist_ok=True)
+        self.scan()
+
+    def __repr__(self):
+        return f"{__class__.__name__}<{hex(id(self))} {self.path} {len(self.orders)}>"
+
+    def scan(self):
+        for filename in sorted(os.listdir(self.path)):
+            if filename.startswith('orders-') and filename.endswith('.jsonl'):
+                pathname = os.path.join(self.path, filename)
+                entries = self.read_index(pathname)
+                if entries is None:
+                    entries = self.rebuild_index(pathname)
+                for oid, offset, length, xids in entries:
+                    self.index(oid, xids, pathname, offset, length)
+
+    def index_pathname(self, pathname):
+        return pathname[:-len('.jsonl')] + '.idx'
+
+    def read_index(self, pathname):
+        """return the index entries for an archive file, or None if the index is missing or doesn't cover the file"""
+        try:
+            with open(self.index_pathname(pathname), 'rb') as ifp:
+                entries = [json.loads(line) for line in ifp]
+        except (OSError, ValueError):
+            return None
+        end = entries[-1][1] + entries[-1][2] if entries else 0
+        return entries if end == os.path.getsize(pathname) else None
+
+    def rebuild_index(self, pathname):
+        """index an archive file from its records, truncating a partially written last record"""
+        entries = []
+        offset = 0
+        with open(pathname, 'rb+') as fp:
+            for line in fp:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    self.api.error_handler(self.api.id, f"order archive: truncating bad record at {pathname}:{offset}")
+                    fp.truncate(offset)
+                    break
+                entries.append([record['oid'], offset, len(line), list(record['executions'])])
+                offset += len(line)
+        with open(self.index_pathname(pathname), 'wb') as ofp:
+            ofp.write(b''.join([json.dumps(entry).encode() + b'\n' for entry in entries]))
+        return entries
+
+    def index(self, oid, xids, pathname, offset, length):
+        self.orders.setdefault(oid, []).append((pathname, offset, length))
+        for xid in xids:
+            self.executions[xid] = oid
+
+    def append(self, record):
+        line = json.dumps(record).encode() + b'\n'
+        pathname = os.path.join(self.path, f"orders-{datetime.date.today().isoformat()}.jsonl")
+        with open(pathname, 'ab') as ofp:
+            offset = ofp.tell()
+            ofp.write(line)
+        xids = list(record['executions'])
+        with open(self.index_pathname(pathname), 'ab') as ofp:
+            ofp.write(json.dumps([record['oid'], offset, len(line), xids]).encode() + b'\n')
+        self.index(record['oid'], xids, pathname, offset, len(line))
+        self.cache.pop(record['oid'], None)
+
+    def write(self, oid, order, history, executions):
+        """append an order record; order and executions are rendered dicts"""
+        self.append({'oid': oid, 'order': order, 'history': history, 'executions': executions})
+
+    def write_execution(self, oid, xid, execution):
+        """append a rendered execution received after its order was archived"""
+        self.append({'oid': oid, 'executions': {xid: execution}})
+
+    def read(self, oid):
+        """return the archived record {'oid', 'order', 'history', 'executions'} for an order id, or None"""
+        if oid not in self.orders:
+            return None
+        record = self.cache.get(oid)
+        if record is None:
+            for pathname, offset, length in self.orders[oid]:
+                with open(pathname, 'rb') as ifp:
+                    ifp.seek(offset)
+                    part = json.loads(ifp.read(length))
+                if record is None:
+                    record = part
+                else:
+                    record['executions'].update(part['executions'])
+            self.cache[oid] = record
+            if len(self.cache) > ORDER_ARCHIVE_CACHE_SIZE:
+                self.cache.popitem(last=False)
+        self.cache.move_to_end(oid)
+        return record
+
+    def read_execution(self, xid):
+        """return the archived rendered execution for an execution id, or None"""
+        oid = self.executions.get(xid)
+        return self.read(oid)['executions'][xid] if oid else None
+
+
+class API_ChangeLog(object):
+    """bounded log of (seq, table, key) entries stamped with a global, monotonically increasing sequence number
+
+    seq restarts with the process; epoch identifies this process's sequence, so a client's seq is only compared
+    against the log it came from
+    """
+
+    def __init__(self, size):
+        self.entries = deque(maxlen=size)
+        self.seq = 0
+        self.dropped = 0
+        self.epoch = str(uuid1())
+
+    def __repr__(self):
+        return f"{__class__.__name__}<{hex(id(self))} {self.seq} {len(self.entries)}>"
+
+    def record(self, table, key):
+        if len(self.entries) == self.entries.maxlen:
+            self.dropped = self.entries[0][0]
+        self.seq += 1
+        self.entries.append((self.seq, table, key))
+        return self.seq
+
+    def since(self, table, seq, epoch):
+        """return ([key, ...], resync) for table changes after seq; resync is True if some were dropped from the log,
+        or if epoch isn't this log's epoch, as it is for a client that last polled before a restart"""
+        if epoch != self.epoch or seq < self.dropped or seq > self.seq:
+            return [], True
+        keys = []
+        for entry_seq, entry_table, key in reversed(self.entries):
+            if entry_seq <= seq:
+                break
+            if entry_table == table:
+                keys.append(key)
+        return list(dict.fromkeys(reversed(keys))), False
+
+
+class API_IndexedStore(dict):
+    """dict of orders or executions keyed by id, with secondary indexes on the values returned by obj.index_keys()
+
+    reindex(key) must be called after the object's fields change; it is a no-op unless obj.version has changed
+    each reindexed change and each deletion is recorded in changelog under table, and the object's seq is set to
+    the change sequence
+    """
+
+    def __init__(self, changelog=None, table=None):
+        super().__init__()
+        self.changelog = changelog
+        self.table = table
+        self.indexes = {}
+        self.indexed = {}
+
+    def __setitem__(self, key, obj):
+        super().__setitem__(key, obj)
+        self.reindex(key)
+
+    def __delitem__(self, key):
+        self.unindex(key)
+        super().__delitem__(key)
+        if self.changelog:
+            self.changelog.record(self.table, key)
+
+    def reindex(self, key):
+        obj = self.get(key)
+        if obj is None or self.indexed.get(key, (None, ))[0] == obj.version:
+            return
+        self.unindex(key)
+        keys = obj.index_keys()
+        self.indexed[key] = (obj.version, keys)
+        for name, values in keys.items():
+            index = self.indexes.setdefault(name, {})
+            for value in values:
+                index.setdefault(value, set()).add(key)
+        if self.changelog:
+            obj.seq = self.changelog.record(self.table, key)
+
+    def unindex(self, key):
+        _, keys = self.indexed.pop(key, (None, {}))
+        for name, values in keys.items():
+            index = self.indexes[name]
+            for value in values:
+                index[value].discard(key)
+                if not index[value]:
+                    del index[value]
+
+    def lookup(self, name, value):
+        """return the set of keys whose index 'name' contains value"""
+        return self.indexes.get(name, {}).get(value, set())
+
+    def select(self, filters):
+        """return [(key, obj), ...] matching every filter; filters maps an index name to a list of accepted values"""
+        matched = None
+        for name, values in filters.items():
+            keys = set().union(*[self.lookup(name, value) for value in values])
+            matched = keys if matched is None else matched & keys
+        if matched is None:
+            return list(self.items())
+        return [(key, self[key]) for key in matched]
+
+    def render_json(self, filters, fields=None):
+        """return the selected objects as JSON object text, optionally projected to the listed rendered fields"""
+        items = self.select(filters)
+        if fields:
+            results = {}
+            for key, obj in items:
+                rendered = obj.render()
+                results[key] = {f: rendered[f] for f in fields if f in rendered}
+            return json.dumps(results)
+        return join_serialized(items)
 
 
 class API_Execution(object):
@@ -410,6 +1884,9 @@ class API_Execution(object):
         self.api.debug(f"{self}.__init__(..., {self.callback})")
         self.fids = DEFAULT_EXECUTION_FIELDS.split(',')
         self.fields = {}
+        self.version = 0
+        self.rendered = None
+        self.serialized = None
 
     def __del__(self):
         self.api.debug(f"__del__({self})")
@@ -450,12 +1927,22 @@ class API_Execution(object):
                     self.fields[k] = v
                     added.add(k)
 
-            if (changed or added) and (not init):
-                self.api.send_execution_update(self.render())
+            if changed or added:
+                previous = self.rendered[1] if self.rendered else {}
+                self.version += 1
+                if not init:
+                    rendered = self.render()
+                    delta = {k: v for k, v in rendered.items() if previous.get(k) != v}
+                    delta['ORDER_ID'] = self.oid
+                    delta['version'] = self.version
+                    self.api.send_execution_update(rendered, self.serialize(), delta)
         else:
             self.api.error_handler(self.oid, f"Execution Update ORDER_ID mismatch: {repr(data)}")
 
     def render(self):
+        """return the rendered execution dict, reusing the cached result until the next change"""
+        if self.rendered and self.rendered[0] == self.version:
+            return self.rendered[1]
         self.api.debug(f"{self} render")
         result = {f: self.fields.get(f) for f in self.fids}
         if self.api.enable_execution_account_format:
@@ -465,8 +1952,24 @@ class API_Execution(object):
             result.pop('CUSTOMER')
             result.pop('DEPOSIT')
 
+        self.rendered = (self.version, result)
         return result
 
+    def index_keys(self):
+        """return secondary index values for API_IndexedStore; status is the raw CURRENT_STATUS"""
+        return {
+            'status': [self.fields.get('CURRENT_STATUS')],
+            'account': [self.api.make_account(self.fields)],
+            'symbol': [self.fields.get('DISP_NAME')],
+            'order': [self.api.execution_order_id(self.fields)],
+        }
+
+    def serialize(self):
+        """return the rendered execution as a JSON string, cached per version"""
+        if not (self.serialized and self.serialized[0] == self.version):
+            self.serialized = (self.version, json.dumps(self.render()))
+        return self.serialized[1]
+
 
 class API_Update():
 
@@ -593,6 +2096,11 @@ class API_Order(object):
         self.updates = []
         self.suborders = {}
         self.fields = {}
+        self.version = 0
+        self.rendered = None
+        self.serialized = None
+        self.has_fill = False
+        self.changed = time.time()
         self.identified = False
         self.ticket = 'undefined'
         data['status'] = 'Initialized'
@@ -606,6 +2114,7 @@ class API_Order(object):
         return f"{__class__.__name__}<{hex(id(self))}>"
 
     def identify_order_type(self, data):
+        """set the order type from the first TYPE encountered; return True if the type was set by this call"""
         if not self.identified:
             if 'TYPE' in data:
                 otype = data['TYPE']
@@ -613,6 +2122,8 @@ class API_Order(object):
                 self.ticket = 'ticket' if otype.startswith('UserSubmitStaged') else 'order'
                 self.fields['type'] = otype
                 self.identified = True
+                return True
+        return False
 
     def initial_update(self, data):
         self.update(data)
@@ -622,9 +2133,8 @@ class API_Order(object):
 
     def update(self, data, init=False):
 
-        field_state = json.dumps(self.fields)
-
-        self.identify_order_type(data)
+        modified = self.identify_order_type(data)
+        changes = {}
 
         if 'ORDER_ID' in data:
             order_id = data['ORDER_ID']
@@ -663,12 +2173,14 @@ class API_Order(object):
         # only apply new or changed messages to the base order; (don't move order status back in time when refresh happens)
 
         if change in ['new', 'changed']:
-            changes = {}
             for k, v in data.items():
+                if not k in self.fields:
+                    modified = True
                 ov = self.fields.setdefault(k, None)
                 self.fields[k] = v
                 if v != ov:
                     changes[k] = v
+            modified = modified or bool(changes)
 
             if changes:
                 update_type = data['TYPE'] if 'TYPE' in data else 'Undefined'
@@ -677,11 +2189,37 @@ class API_Order(object):
 
                     unchanged_fields = {k: v for k, v in data.items() if not k in changes}
                     self.api.debug(f"UNCHANGED_FIELDS: {unchanged_fields}")
-                self.updates.append({'id': order_id, 'type': update_type, 'fields': changes, 'time': time.time()})
-
-        if not init:
-            if json.dumps(self.fields) != field_state:
-                self.api.send_order_update(self.render())
+                self.add_history(update_type, {'id': order_id, 'type': update_type, 'fields': changes, 'time': time.time()})
+
+        if modified:
+            previous = self.rendered[1] if self.rendered else {}
+            self.version += 1
+            self.changed = time.time()
+            if not init:
+                rendered = self.render()
+                self.api.send_order_update(rendered, self.serialize(), self.delta(previous, rendered, changes))
+
+    def add_history(self, update_type, update):
+        """append an update entry; beyond the configured size, the oldest entries after the first are moved to api.order_history"""
+        if update_type == 'ExchangeTradeOrder':
+            self.has_fill = True
+        self.updates.append(update)
+        limit = self.api.order_history_size
+        if limit and len(self.updates) > limit + 1:
+            self.api.order_history.append(self.oid, self.updates.pop(1))
+
+    def history(self):
+        """return the complete update history, including entries moved to api.order_history"""
+        return self.updates[:1] + self.api.order_history.read(self.oid) + self.updates[1:]
+
+    def delta(self, previous, rendered, changes):
+        """return the order-delta message: changed rendered fields, the raw field changes, and the new update entry"""
+        ret = {k: v for k, v in rendered.items() if k not in ['raw', 'updates'] and previous.get(k) != v}
+        ret['permid'] = rendered.get('permid', self.oid)
+        ret['version'] = self.version
+        ret['raw'] = changes
+        ret['update'] = self.updates[-1] if changes else None
+        return ret
 
     def update_fill_fields(self):
         if self.fields['TYPE'] in ['UserSubmitOrder', 'ExchangeTradeOrder']:
@@ -693,6 +2231,10 @@ class API_Order(object):
                 self.fields['avgfillprice'] = self.fields['AVG_PRICE']
 
     def render(self):
+        """return the rendered order dict, reusing the cached result until the next change"""
+        if self.rendered and self.rendered[0] == self.version:
+            return self.rendered[1]
+
         # customize fields for standard txTrader order status
         if 'ORIGINAL_ORDER_ID' in self.fields:
             self.fields['permid'] = self.fields['ORIGINAL_ORDER_ID']
@@ -741,6 +2283,8 @@ class API_Order(object):
             self.fields['status'] = 'Error'
 
         self.fields['updates'] = self.updates
+        self.fields['update_count'] = len(self.updates) + self.api.order_history.count(self.oid)
+        self.fields['version'] = self.version
         f = self.fields
         self.fields['text'] = '%s %d %s (%s)' % (f['BUYORSELL'], int(f['quantity']), f['symbol'], f['status'])
 
@@ -750,8 +2294,26 @@ class API_Order(object):
                 ret[k] = v
             else:
                 ret['raw'][k] = v
+        self.rendered = (self.version, ret)
         return ret
 
+    def index_keys(self):
+        """return secondary index values for API_IndexedStore; order_id maps each ORDER_ID to its parent order"""
+        rendered = self.render()
+        return {
+            'status': [rendered['status']],
+            'account': [rendered['account']],
+            'symbol': [rendered['symbol']],
+            'class': [self.ticket],
+            'order_id': list(self.suborders),
+        }
+
+    def serialize(self):
+        """return the rendered order as a JSON string, cached per version"""
+        if not (self.serialized and self.serialized[0] == self.version):
+            self.serialized = (self.version, json.dumps(self.render()))
+        return self.serialized[1]
+
     def is_filled(self):
         return bool(
             self.fields['CURRENT_STATUS'] == 'COMPLETED' and self.has_fill_type() and 'ORIGINAL_VOLUME' in self.fields
@@ -765,22 +2327,18 @@ class API_Order(object):
         )
 
     def has_fill_type(self):
-        if self.fields['TYPE'] == 'ExchangeTradeOrder':
-            return True
-        for update_type in [update['type'] for update in self.updates]:
-            if update_type == 'ExchangeTradeOrder':
-                return True
-        return False
+        return self.fields['TYPE'] == 'ExchangeTradeOrder' or self.has_fill
 
 
 class API_Callback(object):
 
-    def __init__(self, api, id, label, callable, timeout=0):
-        """callable is stored and used to return results later"""
+    def __init__(self, api, id, label, callable, timeout=0, query=None):
+        """callable is stored and used to return results later; query holds filters for order and execution results"""
         self.api = api
         self.id = id
         self.label = label
         self.callable = callable
+        self.query = query or {}
         self.started = time.time()
         self.timeout = timeout or api.callback_timeout['DEFAULT']
         self.api.debug(f"{self}.__init__(..., {self.id}, {self.label}, {self.callable}, {self.timeout})")
@@ -855,11 +2413,20 @@ class API_Callback(object):
             results = self.format_executions(results, xid=self.id)
         elif self.label == 'barchart':
             results = self.api.format_barchart(results)
+        elif self.label == 'barchart_data':
+            results = self.api.format_barchart(results, serialize=False)
+        elif self.label == 'cached_barchart':
+            results = json.dumps(results)
+        elif self.label == 'barchart_columns':
+            results = json.dumps(self.api.format_barchart_columns(results))
         elif self.label in ['new_symbol', 'order', 'ticket', 'unadvise', 'add_symbol', 'submit_order', 'request_accounts',
                             'get_order_route', 'set_account', 'create_staged_order_ticket', 'query_bars_failed', 'cancel_order',
                             'global_cancel']:
             results = json.dumps(results)
-        elif self.label in ['init_symbol', 'tick', 'accounts', 'order-ack', 'ticket-ack']:
+        elif self.label == 'cached_positions':
+            results = self.api.positions.render()
+        elif self.label in ['init_symbol', 'tick', 'accounts', 'order-ack', 'ticket-ack', 'query_bars_data_failed',
+                            'cached_barchart_data', 'position_data', 'cached_account_data']:
             # no local formatting for these labels
             pass
         else:
@@ -878,20 +2445,7 @@ class API_Callback(object):
 
     def format_positions(self, rows):
         # Positions should return {'ACCOUNT': {'SYMBOL': QUANTITY, ...}, ...}
-        positions = {}
-        [positions.setdefault(a, {}) for a in self.api.accounts]
-        #print('format_positions: rows=%s' % repr(rows))
-        for pos in rows or []:
-            if pos:
-                #print('format_positions: pos=%s' % repr(pos))
-                account = self.api.make_account(pos)
-                symbol = pos['DISP_NAME']
-                positions[account].setdefault(symbol, 0)
-                # if LONG positions exist, add them, if SHORT positions exist, subtract them
-                for m, f in [(1, 'LONGPOS'), (1, 'LONGPOS0'), (-1, 'SHORTPOS'), (-1, 'SHORTPOS0')]:
-                    if f in pos:
-                        positions[account][symbol] += m * int(pos[f])
-        return json.dumps(positions)
+        return json.dumps(API_Positions.parse(self.api, rows))
 
     def format_orders(self, rows, oid=None):
         return self._format_orders(rows, oid, 'order')
@@ -906,41 +2460,292 @@ class API_Callback(object):
             if row:
                 self.api.handle_order_response(row)
         if oid:
-            results = self.api.orders[oid].render() if oid in self.api.orders else None
-        else:
-            results = {}
-            for k, v in self.api.orders.items():
-                # return either tickets or orders based on _filter value
-                if v.ticket == _filter:
-                    results[k] = v.render()
-        return json.dumps(results)
+            if oid in self.api.orders:
+                return self.api.orders[oid].serialize()
+            archived = self.api.order_archive and self.api.order_archive.read(oid)
+            return json.dumps(archived['order'] if archived else None)
+        filters = dict(self.query)
+        fields = filters.pop('fields', None)
+        # return either tickets or orders based on _filter value
+        filters['class'] = [_filter]
+        return self.api.orders.render_json(filters, fields)
 
     def format_executions(self, rows, xid=None, oid=None):
         for row in rows or []:
             if row:
                 self.api.handle_execution_response(row)
+        archive = self.api.order_archive
         if xid:
-            results = self.api.executions[xid].render() if xid in self.api.executions else None
-        elif oid:
-            results = {k: v.render() for k, v in self.api.executions.items() if v.fields['ORIGINAL_ORDER_ID'] == oid}
+            if xid in self.api.executions:
+                return self.api.executions[xid].serialize()
+            return json.dumps(archive.read_execution(xid) if archive else None)
+        filters = dict(self.query)
+        fields = filters.pop('fields', None)
+        if oid:
+            if archive and oid in archive.orders and oid not in self.api.orders:
+                return json.dumps(archive.read(oid)['executions'])
+            filters['order'] = [oid]
+        return self.api.executions.render_json(filters, fields)
+
+
+class API_CoalescedRequest(object):
+    """a gateway request shared by every caller that asked for the same (service, topic, table, what, where) while it was pending"""
+
+    def __init__(self, api, key):
+        self.api = api
+        self.key = key
+        self.callbacks = []
+
+    def __repr__(self):
+        return f"{__class__.__name__}<{hex(id(self))} {self.key[2]} {len(self.callbacks)}>"
+
+    def expired(self):
+        return all(cb.done for cb in self.callbacks)
+
+    def complete(self, rows):
+        """apply order and execution rows to the stores once, then have each caller's callback format its response
+
+        the callbacks for order and execution labels render from the stores, so they are completed without the rows
+        """
+        if self.api.pending_requests.get(self.key) is self:
+            del self.api.pending_requests[self.key]
+        labels = set([cb.label for cb in self.callbacks])
+        if labels & set(EXECUTION_ROW_LABELS):
+            handler = self.api.handle_execution_response
+        elif labels & set(ORDER_ROW_LABELS):
+            handler = self.api.handle_order_response
+        else:
+            handler = None
+        if handler:
+            for row in rows or []:
+                if row:
+                    handler(row)
+        for cb in self.callbacks:
+            cb.complete(None if cb.label in ORDER_ROW_LABELS or cb.label in EXECUTION_ROW_LABELS else rows)
+
+
+class API_SendScheduler(object):
+    """outbound gateway messages, sent in SEND_CLASSES priority order as each class's token bucket allows
+
+    rates are messages per second by class; a class with no rate is unlimited.  Each bucket holds up to one
+    second of tokens, so a class may burst to its rate before messages queue.
+    """
+
+    def __init__(self, api, rates):
+        self.api = api
+        self.rates = rates
+        self.tokens = {c: float(rates.get(c, 0)) for c in SEND_CLASSES}
+        self.refilled = time.time()
+        self.queues = {c: deque() for c in SEND_CLASSES}
+        self.metrics = {c: {'sent': 0, 'delayed': 0, 'max_depth': 0, 'total_wait': 0, 'max_wait': 0} for c in SEND_CLASSES}
+        self.timer = None
+
+    def __repr__(self):
+        return f"{__class__.__name__}<{hex(id(self))} {sum(len(q) for q in self.queues.values())}>"
+
+    def send(self, msg, send_class, session, exempt=False):
+        """queue msg behind its class; an exempt message is written at once without taking a token"""
+        if exempt:
+            self.metrics[send_class]['sent'] += 1
+            self.api.gateway_write(msg, session)
+            return
+        queue = self.queues[send_class]
+        queue.append((msg, time.time(), session))
+        m = self.metrics[send_class]
+        m['max_depth'] = max(m['max_depth'], len(queue))
+        self.drain()
+
+    def refill(self):
+        now = time.time()
+        elapsed = now - self.refilled
+        self.refilled = now
+        for c, rate in self.rates.items():
+            if rate:
+                self.tokens[c] = min(float(rate), self.tokens[c] + elapsed * rate)
+
+    def drain(self):
+        """send every queued message its class has tokens for, highest priority class first"""
+        self.refill()
+        now = time.time()
+        for c in SEND_CLASSES:
+            queue = self.queues[c]
+            rate = self.rates.get(c)
+            m = self.metrics[c]
+            while queue and (not rate or self.tokens[c] >= 1):
+                if rate:
+                    self.tokens[c] -= 1
+                msg, queued, session = queue.popleft()
+                wait = int((now - queued) * 1000)
+                m['sent'] += 1
+                if wait:
+                    m['delayed'] += 1
+                    m['total_wait'] += wait
+                    m['max_wait'] = max(m['max_wait'], wait)
+                self.api.gateway_write(msg, session)
+        self.schedule()
+
+    def schedule(self):
+        if self.timer and self.timer.active():
+            return
+        delays = [(1 - self.tokens[c]) / self.rates[c] for c in SEND_CLASSES if self.queues[c] and self.rates.get(c)]
+        if delays:
+            self.timer = reactor.callLater(max(min(delays), 0.001), self.drain)
+
+    def clear(self, session):
+        """drop the messages queued for a disconnected session"""
+        for c, queue in self.queues.items():
+            self.queues[c] = deque(entry for entry in queue if entry[2] is not session)
+
+    def query_metrics(self):
+        ret = {}
+        for c in SEND_CLASSES:
+            m = self.metrics[c]
+            ret[c] = {
+                'rate': self.rates.get(c, 0),
+                'depth': len(self.queues[c]),
+                'max_depth': m['max_depth'],
+                'sent': m['sent'],
+                'delayed': m['delayed'],
+                'avg_wait': round(m['total_wait'] / m['delayed'], 1) if m['delayed'] else 0,
+                'max_wait': m['max_wait'],
+            }
+        return ret
+
+
+class RTX_ConnectionPool(object):
+    """gateway connections for one (service, topic)
+
+    submit() runs a query on an idle connection, opens a new one while the pool is below maximum, and otherwise
+    queues the query on the pooled connection with the fewest commands pending.  get() hands out a connection for long-lived use (advise,
+    symbol init); it rejoins the pool when it becomes ready again.  Idle connections above minimum are terminated
+    after idle_timeout seconds.
+    """
+
+    def __init__(self, api, session, service, topic, minimum, maximum, idle_timeout):
+        self.api = api
+        self.session = session
+        self.service = service
+        self.topic = topic
+        self.minimum = minimum
+        self.maximum = maximum
+        self.idle_timeout = idle_timeout
+        self.connections = {}
+        self.idle = OrderedDict()
+        self.created = 0
+        self.reused = 0
+        self.queued = 0
+        self.reaped = 0
+        self.failed = 0
+        self.waits = 0
+        self.total_wait = 0
+        self.max_wait = 0
+
+    def __repr__(self):
+        return f"{__class__.__name__}<{hex(id(self))} {self.session.name} {self.service};{self.topic} {len(self.idle)}/{len(self.connections)}>"
+
+    def create(self):
+        cxn = RTX_Connection(self.api, self.service, self.topic, self.session)
+        self.created += 1
+        return cxn
+
+    def get(self):
+        """return a connection for the caller's exclusive use; it is not counted against maximum while detached"""
+        if self.idle:
+            cxn = self.idle.popitem()[0]
+            self.reused += 1
+        else:
+            cxn = self.create()
+        self.connections.pop(cxn.id, None)
+        return cxn
+
+    def submit(self, method, args):
+        """call RTX_Connection.method(*args) on a pooled connection, queueing if the pool is exhausted"""
+        if self.idle:
+            cxn = self.idle.popitem()[0]
+            self.reused += 1
+        elif not self.maximum or len(self.connections) < self.maximum:
+            cxn = self.create()
+            self.connections[cxn.id] = cxn
         else:
-            results = {k: v.render() for k, v in self.api.executions.items()}
-        return json.dumps(results)
+            cxn = min(self.connections.values(), key=lambda c: len(c.pending))
+            self.queued += 1
+        getattr(cxn, method)(*args)
+
+    def record_wait(self, elapsed):
+        """record the milliseconds a command spent queued on one of this pool's connections"""
+        self.waits += 1
+        self.total_wait += elapsed
+        self.max_wait = max(self.max_wait, elapsed)
+
+    def activate(self, cxn):
+        """called when cxn becomes ready with nothing queued; mark it idle"""
+        if cxn.terminated:
+            self.connections.pop(cxn.id, None)
+            self.idle.pop(cxn, None)
+            self.api.cxn_unregister(cxn)
+            return
+        if cxn.id not in self.connections:
+            if self.maximum and len(self.connections) >= self.maximum:
+                self.terminate(cxn)
+                return
+            self.connections[cxn.id] = cxn
+        if cxn not in self.idle:
+            self.idle[cxn] = time.time()
+
+    def prewarm(self):
+        while len(self.connections) < self.minimum:
+            cxn = self.create()
+            self.connections[cxn.id] = cxn
+
+    def terminate(self, cxn):
+        self.connections.pop(cxn.id, None)
+        self.idle.pop(cxn, None)
+        self.reaped += 1
+        cxn.terminate(0, None)
+
+    def drop(self, cxn):
+        """remove a failed connection so no further commands are routed to it"""
+        pooled = self.connections.pop(cxn.id, None)
+        if self.idle.pop(cxn, None) or pooled:
+            self.failed += 1
+
+    def reap(self):
+        """terminate connections idle longer than idle_timeout while the pool is above minimum"""
+        expire = time.time() - self.idle_timeout
+        for cxn, since in list(self.idle.items()):
+            if len(self.connections) <= self.minimum or since > expire:
+                break
+            self.terminate(cxn)
+
+    def stats(self):
+        return {
+            'size': len(self.connections),
+            'idle': len(self.idle),
+            'waiting': sum(len(cxn.pending) for cxn in self.connections.values()),
+            'created': self.created,
+            'reused': self.reused,
+            'queued': self.queued,
+            'reaped': self.reaped,
+            'failed': self.failed,
+            'avg_wait': round(self.total_wait / self.waits, 1) if self.waits else 0,
+            'max_wait': self.max_wait,
+        }
 
 
 class RTX_Connection(object):
 
-    def __init__(self, api, service, topic):
+    def __init__(self, api, service, topic, session=None):
         self.api = api
         self.id = str(uuid1())
         self.service = service
         self.topic = topic
         self.log_events = api.log_cxn_events
         self.key = '%s;%s' % (service, topic)
+        self.session = session or api.session_for(service, topic)
         self.api.debug(f"{self}.__init__(...)")
         self.last_query = ''
         self.api.cxn_register(self)
-        self.api.gateway_send('connect %s %s' % (self.id, self.key))
+        self.api.gateway_send('connect %s %s' % (self.id, self.key), 'status', self.session)
         self.ack_pending = 'CONNECTION PENDING'
         self.ack_callback = None
         self.response_pending = None
@@ -951,7 +2756,11 @@ class RTX_Connection(object):
         self.update_callback = None
         self.update_handler = None
         self.connected = False
-        self.on_connect_action = None
+        self.terminated = False
+        self.pending = deque()
+        # commands are transmitted in the order submitted, so these numbers match an ack to its command
+        self.submitted = 0
+        self.transmitted = 0
         self.update_ready()
 
     def __del__(self):
@@ -969,7 +2778,12 @@ class RTX_Connection(object):
             or self.update_handler
         )
         if self.ready:
-            self.api.cxn_activate(self)
+            if self.pending:
+                command, queued = self.pending.popleft()
+                self.api.cxn_record_wait(self, int((time.time() - queued) * 1000))
+                self.transmit(*command)
+            else:
+                self.api.cxn_activate(self)
 
     def receive(self, _type, data):
         if _type == 'ack':
@@ -988,14 +2802,18 @@ class RTX_Connection(object):
         if self.log_events:
             self.api.info(f"{self} Ack Received: {data}")
         if self.ack_pending:
-            if data == self.ack_pending:
+            matched = data == self.ack_pending
+            if matched:
                 self.ack_pending = None
+                if self.api.failover and data in ['ADVISE_OK', 'REQUEST_OK', 'ADVISE_REQUEST_OK']:
+                    self.api.failover.acknowledged(self, self.transmitted)
             else:
                 self.api.error_handler(self.id, 'Ack Mismatch: expected %s, got %s' % (self.ack_pending, data))
-                self.handle_response_failure()
             if self.ack_callback:
                 self.ack_callback.complete(data)
                 self.ack_callback = None
+            if not matched:
+                self.handle_response_failure()
         else:
             self.api.error_handler(self.id, 'Ack Unexpected: %s' % data)
 
@@ -1014,9 +2832,31 @@ class RTX_Connection(object):
             self.api.error(f"{self} Response Unexpected: {data}")
 
     def handle_response_failure(self):
+        """fail the outstanding command and every command queued behind it, then terminate the connection
+
+        after an ack mismatch or an unexpected status the connection's command state can't be trusted, so it is
+        dropped from its pool rather than left waiting for a response that won't come
+        """
         self.api.error(f"{self} Connection Response_Failure")
-        if self.response_callback:
-            self.response_callback.complete(None)
+        callbacks = [self.ack_callback, self.response_callback, self.status_callback, self.update_callback]
+        for command, queued in self.pending:
+            callbacks.extend([command[3], command[4], command[6], command[7]])
+        self.pending.clear()
+        self.ack_pending = None
+        self.ack_callback = None
+        self.response_pending = None
+        self.response_callback = None
+        self.response_rows = None
+        self.status_pending = None
+        self.status_callback = None
+        self.update_callback = None
+        self.update_handler = None
+        for callback in callbacks:
+            if callback:
+                callback.complete(None)
+        self.api.cxn_drop(self)
+        if not self.terminated:
+            self.terminate(0, None)
 
     def handle_status(self, data):
         if self.log_events:
@@ -1029,16 +2869,9 @@ class RTX_Connection(object):
                 self.status_pending = None
 
             if data['status'] == '1':
-                # special case for the first status ack of a new connection; we may need to do on_connect_action
+                # the first status ack of a new connection; commands queued while connecting are sent by update_ready
                 if data['msg'] == 'OnInitAck':
                     self.connected = True
-                    if self.on_connect_action:
-                        self.ready = True
-                        cmd, arg, exa, cba, cbr, exs, cbs, cbu, uhr = self.on_connect_action
-                        self.api.debug(f"{self} sending on_connect_action: {self.on_connect_action}")
-                        self.send(cmd, arg, exa, cba, cbr, exs, cbs, cbu, uhr)
-                        self.on_connect_action = None
-                        self.api.debug(f"{self} after on_connect_action send: self.status_pending={self.status_pending}")
 
                 if self.status_callback:
                     self.status_callback.complete(data)
@@ -1047,9 +2880,15 @@ class RTX_Connection(object):
                 self.api.error_handler(self.id, 'Status Error: %s' % data)
         else:
             self.api.error_handler(self.id, 'Status Unexpected: %s' % data)
-            # if ADVISE is active; call handler function with None to notify caller the advise has been terminated
-            if self.update_handler and data['msg'] == 'OnTerminate':
+            if self.update_handler:
+                if data['msg'] != 'OnTerminate':
+                    # a stray status on an active ADVISE; the advise continues
+                    return
+                # call handler function with None to notify caller the advise has been terminated
                 self.update_handler(self, None)
+            if data['msg'] == 'OnTerminate':
+                # the gateway has already closed the connection
+                self.terminated = True
             self.handle_response_failure()
 
     def handle_update(self, data):
@@ -1124,6 +2963,7 @@ class RTX_Connection(object):
         return self.send('execute', command, expect_ack="EXECUTE_OK", ack_callback=callback)
 
     def terminate(self, code, callback):
+        self.terminated = True
         self.last_query = 'terminate: %s' % str(code)
         return self.send('terminate', str(code), expect_ack="TERMINATE_OK", ack_callback=callback)
 
@@ -1139,34 +2979,42 @@ class RTX_Connection(object):
         update_callback=None,
         update_handler=None
     ):
-        if self.ready:
-            self.cmd = cmd
-            if 'request' in cmd:
-                self.response_rows = []
-            msg = f"{cmd} {self.id} {args}"
-            if self.log_events:
-                self.api.info(f"{self} send: {msg}")
-            ret = self.api.gateway_send(msg)
-            self.ack_pending = expect_ack
-            self.ack_callback = ack_callback
-            self.response_pending = bool(response_callback)
-            self.response_callback = response_callback
-            self.status_pending = expect_status
-            self.status_callback = status_callback
-            self.update_callback = update_callback
-            self.update_handler = update_handler
-        else:
-            if self.on_connect_action:
-                self.api.error_handler(self.id, f"Failure: on_connect_action already exists: {self.on_connect_action}")
-                ret = False
-            else:
-                if self.log_events:
-                    self.api.info(f"{self} storing on_connect_action {cmd}")
-                self.on_connect_action = (
-                    cmd, args, expect_ack, ack_callback, response_callback, expect_status, status_callback, update_callback,
-                    update_handler
-                )
-                ret = True
+        """send a command now if the connection is ready, otherwise queue it behind the commands already waiting"""
+        command = (
+            cmd, args, expect_ack, ack_callback, response_callback, expect_status, status_callback, update_callback,
+            update_handler
+        )
+        self.submitted += 1
+        if self.api.failover:
+            self.api.failover.track(self, self.submitted)
+        if self.ready and not self.pending:
+            return self.transmit(*command)
+        if self.log_events:
+            self.api.info(f"{self} queueing {cmd} behind {len(self.pending)} pending")
+        self.pending.append((command, time.time()))
+        return True
+
+    def transmit(
+        self, cmd, args, expect_ack, ack_callback, response_callback, expect_status, status_callback, update_callback,
+        update_handler
+    ):
+        self.cmd = cmd
+        self.transmitted += 1
+        if 'request' in cmd:
+            self.response_rows = []
+        msg = f"{cmd} {self.id} {args}"
+        if self.log_events:
+            self.api.info(f"{self} send: {msg}")
+        ret = self.api.gateway_send(msg, self.api.send_class(cmd, args), self.session)
+        self.ack_pending = expect_ack
+        self.ack_callback = ack_callback
+        self.response_pending = bool(response_callback)
+        self.response_callback = response_callback
+        self.status_pending = expect_status
+        self.status_callback = status_callback
+        self.update_callback = update_callback
+        self.update_handler = update_handler
+        self.update_ready()
         return ret
 
 
@@ -1216,18 +3064,20 @@ class RTX(object):
         self.trade_minute = -1
         self.feedzone = pytz.timezone(self.config.get('API_TIMEZONE'))
         self.localzone = tzlocal.get_localzone()
+        self.feed_converter = API_TimeConverter(self.feedzone, self.localzone)
+        self.local_converter = API_TimeConverter(self.localzone, self.feedzone)
         self.current_account = ''
-        self.orders = {}
+        self.changes = API_ChangeLog(self.change_log_size)
+        self.orders = API_IndexedStore(self.changes, 'orders')
         self.pending_orders = {}
         self.tickets = {}
         self.pending_tickets = {}
         self.openorder_callbacks = []
         self.accounts = None
-        self.account_data = {}
-        self.pending_account_data_requests = set([])
-        self.positions = {}
+        self.positions = API_Positions(self)
+        self.pnl = API_PnL(self)
         self.position_callbacks = []
-        self.executions = {}
+        self.executions = API_IndexedStore(self.changes, 'executions')
         self.pending_mapper_lookups = {}
         self.execution_callbacks = []
         self.execution_status_callbacks = []
@@ -1253,16 +3103,39 @@ class RTX(object):
         self.symbols = {}
         self.barchart = None
         self.primary_exchange_map = {}
-        self.gateway_sender = None
-        self.gateway_protocol = None
-        self.gateway_transport = None
+        self.sessions = OrderedDict()
+        self.session_routes = {}
+        self.failover = None
+        self.init_sessions()
         self.active_cxn = {}
-        self.idle_cxn = {}
+        self.cxn_pools = {}
+        self.send_scheduler = API_SendScheduler(self, self.send_rate_limits)
         self.cx_time = None
-        self.seconds_disconnected = 0
         self.callback_metrics = {}
+        self.bar_cache_metrics = {}
+        self.request_metrics = {}
+        self.pending_requests = {}
+        self.order_history = API_OrderHistory(self, self.order_history_dir)
+        self.order_archive = API_OrderArchive(self, self.order_archive_dir) if self.order_archive_dir else None
+        self.bar_archive = None
+        if self.bar_archive_dir:
+            self.bar_archive = API_BarArchive(
+                self, self.bar_archive_dir, self.bar_archive_max_mb * 0x100000, self.bar_archive_max_days
+            )
+        self.order_journal = None
+        if self.order_journal_dir:
+            self.order_journal = API_OrderJournal(self, self.order_journal_dir)
+            started = time.time()
+            count = self.order_journal.replay({
+                'orders': self.handle_order_response,
+                'executions': self.handle_execution_response
+            })
+            self.output(
+                f"Order journal replayed {count} rows in {time.time() - started:.3f} seconds. ({len(self.orders)} orders, {len(self.executions)} executions)"
+            )
         self.set_order_route(self.config.get('API_ROUTE'), None)
-        reactor.connectTCP(self.api_hostname, self.api_port, RtxClientFactory(self))
+        for session in self.sessions.values():
+            session.connect()
         self.repeater = LoopingCall(self.EverySecond)
         self.repeater.start(1)
 
@@ -1274,6 +3147,9 @@ class RTX(object):
         self.host = self.config.get('HOST')
         self.api_hostname = self.config.get('API_HOST')
         self.api_port = int(self.config.get('API_PORT'))
+        self.api_standby_hostname = self.config.get('API_STANDBY_HOST')
+        self.api_standby_port = int(self.config.get('API_STANDBY_PORT')) or self.api_port
+        self.failover_timeout = int(self.config.get('FAILOVER_TIMEOUT'))
         self.username = self.config.get('USERNAME')
         self.password = self.config.get('PASSWORD')
         self.http_port = int(self.config.get('HTTP_PORT'))
@@ -1282,8 +3158,39 @@ class RTX(object):
         self.enable_high_low = bool(int(self.config.get('ENABLE_HIGH_LOW')))
         self.enable_barchart = bool(int(self.config.get('ENABLE_BARCHART')))
         self.enable_symbol_barchart = bool(int(self.config.get('ENABLE_SYMBOL_BARCHART')))
+        self.enable_bar_cache = bool(int(self.config.get('ENABLE_BAR_CACHE')))
+        self.bar_cache_days = int(self.config.get('BAR_CACHE_DAYS'))
+        self.bar_archive_dir = self.config.get('BAR_ARCHIVE_DIR')
+        self.bar_archive_max_mb = int(self.config.get('BAR_ARCHIVE_MAX_MB'))
+        self.bar_archive_max_days = int(self.config.get('BAR_ARCHIVE_MAX_DAYS'))
+        self.barchart_reconcile_interval = int(self.config.get('BARCHART_RECONCILE_INTERVAL'))
+        self.barchart_reconcile_minutes = int(self.barchart_reconcile_interval / 60) + 2
         self.enable_seconds_tick = bool(int(self.config.get('ENABLE_SECONDS_TICK')))
         self.enable_execution_account_format = bool(int(self.config.get('ENABLE_EXECUTION_ACCOUNT_FORMAT')))
+        self.enable_order_cache = bool(int(self.config.get('ENABLE_ORDER_CACHE')))
+        self.change_log_size = int(self.config.get('CHANGE_LOG_SIZE'))
+        self.order_history_size = int(self.config.get('ORDER_HISTORY_SIZE'))
+        self.order_history_dir = self.config.get('ORDER_HISTORY_DIR')
+        self.order_archive_dir = self.config.get('ORDER_ARCHIVE_DIR')
+        self.order_archive_age = int(self.config.get('ORDER_ARCHIVE_AGE'))
+        self.order_journal_dir = self.config.get('ORDER_JOURNAL_DIR')
+        self.enable_position_cache = bool(int(self.config.get('ENABLE_POSITION_CACHE')))
+        self.position_reconcile_interval = int(self.config.get('POSITION_RECONCILE_INTERVAL'))
+        self.enable_pnl = self.enable_position_cache and bool(int(self.config.get('ENABLE_PNL')))
+        self.pnl_update_interval = max(int(self.config.get('PNL_UPDATE_INTERVAL')), 1)
+        self.account_data = API_AccountData(self, float(self.config.get('ACCOUNT_DATA_CACHE_TTL')))
+        self.enable_request_coalescing = bool(int(self.config.get('ENABLE_REQUEST_COALESCING')))
+        self.cxn_pool_min = int(self.config.get('CXN_POOL_MIN'))
+        self.cxn_pool_max = int(self.config.get('CXN_POOL_MAX'))
+        self.cxn_pool_idle_timeout = int(self.config.get('CXN_POOL_IDLE_TIMEOUT'))
+        self.send_rate_limits = {}
+        for item in str(self.config.get('SEND_RATE_LIMITS')).split(','):
+            if '=' in item:
+                send_class, rate = item.split('=', 1)
+                if send_class.strip() not in SEND_CLASSES:
+                    raise ValueError(f"unknown SEND_RATE_LIMITS class: {send_class}")
+                self.send_rate_limits[send_class.strip()] = int(rate)
+        self.order_cache_reconcile_interval = int(self.config.get('ORDER_CACHE_RECONCILE_INTERVAL'))
         self.halt_on_exception = bool(int(self.config.get('ENABLE_EXCEPTION_HALT')))
         self.gateway_disconnect_timeout = int(self.config.get('GATEWAY_DISCONNECT_TIMEOUT'))
         self.enable_gateway_disconnect_shutdown = bool(int(self.config.get('GATEWAY_DISCONNECT_SHUTDOWN')))
@@ -1325,10 +3232,45 @@ class RTX(object):
             'HIGH_LOW': self.enable_high_low,
             'BARCHART': self.enable_barchart,
             'SYMBOL_BARCHART': self.enable_symbol_barchart,
+            'BAR_CACHE': self.enable_bar_cache,
+            'BAR_ARCHIVE': bool(self.bar_archive_dir),
+            'ORDER_CACHE': self.enable_order_cache,
+            'ORDER_ARCHIVE': bool(self.order_archive_dir),
+            'ORDER_JOURNAL': bool(self.order_journal_dir),
+            'POSITION_CACHE': self.enable_position_cache,
+            'PNL': self.enable_pnl,
+            'REQUEST_COALESCING': self.enable_request_coalescing,
             'SECONDS_TICK': self.enable_seconds_tick,
             'TIME_OFFSET': self.time_offset,
         }
 
+    def quotes_advise_available_fields(self):
+        """return the ordered list of every LIVEQUOTE field that may be advised under the current flags"""
+        what = QUOTES_ADVISE_FIELDS
+        if self.enable_ticker:
+            what += ',' + QUOTES_ADVISE_TICKER_FIELDS
+        if self.enable_high_low:
+            what += ',' + QUOTES_ADVISE_HIGH_LOW_FIELDS
+        return what.split(',')
+
+    def symbol_client_fields(self, client, available):
+        """return the set of advise fields a symbol client has asked for"""
+        if client is self:
+            # internal lookups (CUSIP mapping) use only the initial request data
+            fields = set()
+        elif client is self.pnl:
+            fields = set(PNL_ADVISE_FIELDS.split(',')) & set(available)
+        elif isinstance(client, tcpserver) and client.options.get('SYMBOL_FIELDS'):
+            fields = set(client.options['SYMBOL_FIELDS']) & set(available)
+            if self.enable_ticker:
+                if client.options.get('quotes'):
+                    fields.update(QUOTES_ADVISE_TICKER_FIELDS.split(','))
+                if client.options.get('trades'):
+                    fields.update(QUOTES_ADVISE_TRADE_FIELDS.split(','))
+        else:
+            fields = set(available)
+        return fields
+
     def record_callback_metrics(self, label, elapsed, expired):
         m = self.callback_metrics.setdefault(label, {'tot': 0, 'min': 9999, 'max': 0, 'avg': 0, 'exp': 0, 'hst': []})
         total = m['tot']
@@ -1346,70 +3288,192 @@ class RTX(object):
             self.info('cxn_register: %s' % repr(cxn))
         self.active_cxn[cxn.id] = cxn
 
+    def cxn_unregister(self, cxn):
+        if self.log_cxn_events:
+            self.info('cxn_unregister: %s' % repr(cxn))
+        self.active_cxn.pop(cxn.id, None)
+
     def cxn_activate(self, cxn):
         if self.log_cxn_events:
             self.info('cxn_activate: %s' % repr(cxn))
-        if not cxn.key in self.idle_cxn:
-            self.idle_cxn[cxn.key] = []
-        self.idle_cxn[cxn.key].append(cxn)
+        self.cxn_pool(cxn.service, cxn.topic, cxn.session).activate(cxn)
+
+    def cxn_drop(self, cxn):
+        pool = self.cxn_pools.get((cxn.session.name, cxn.key))
+        if pool:
+            pool.drop(cxn)
+
+    def cxn_record_wait(self, cxn, elapsed):
+        self.cxn_pool(cxn.service, cxn.topic, cxn.session).record_wait(elapsed)
+
+    def cxn_pool(self, service, topic, session=None):
+        session = session or self.session_for(service, topic)
+        key = (session.name, '%s;%s' % (service, topic))
+        pool = self.cxn_pools.get(key)
+        if not pool:
+            pool = RTX_ConnectionPool(
+                self, session, service, topic, self.cxn_pool_min, self.cxn_pool_max, self.cxn_pool_idle_timeout
+            )
+            self.cxn_pools[key] = pool
+        return pool
 
     def cxn_get(self, service, topic):
-        key = '%s;%s' % (service, topic)
-        if key in self.idle_cxn and len(self.idle_cxn[key]):
-            cxn = self.idle_cxn[key].pop()
-        else:
-            cxn = RTX_Connection(self, service, topic)
+        cxn = self.cxn_pool(service, topic).get()
         if self.log_cxn_events:
             self.info('cxn_get() returning: %s' % repr(cxn))
         return cxn
 
-    def cxn_clear(self):
+    def cxn_submit(self, service, topic, method, *args):
+        """call an RTX_Connection query method on a pooled connection, queued until one is ready if the pool is full"""
+        self.cxn_pool(service, topic).submit(method, args)
+
+    def query_connection_stats(self):
+        ret = {}
+        for (session, key), pool in self.cxn_pools.items():
+            ret.setdefault(session, {})[key] = pool.stats()
+        return ret
+
+    def cxn_clear(self, session):
+        """drop the connections, pools and pending requests carried by a disconnected session"""
         if self.log_cxn_events:
-            self.debug('{self} cxn_clear')
-        self.idle_cxn.clear()
-        for cxn in self.active_cxn.values():
+            self.debug(f'{self} cxn_clear {session.name}')
+        for key, pool in list(self.cxn_pools.items()):
+            if pool.session is session:
+                del self.cxn_pools[key]
+        for cxn in [cxn for cxn in self.active_cxn.values() if cxn.session is session]:
             self.warning(f'clearing active {cxn} {cxn.last_query}')
-        self.active_cxn.clear()
+            del self.active_cxn[cxn.id]
+            # a coalesced request waiting on this connection will never complete; later callers send a new one
+            for cb in [cxn.response_callback] + [command[4] for command, queued in cxn.pending]:
+                if isinstance(cb, API_CoalescedRequest) and self.pending_requests.get(cb.key) is cb:
+                    del self.pending_requests[cb.key]
         for symbol in self.symbols.values():
-            if symbol.cxn_init:
-                self.warning(f"clearing {symbol.symbol} init {cxn}")
+            if symbol.cxn_init and symbol.cxn_init.session is session:
+                self.warning(f"clearing {symbol.symbol} init {symbol.cxn_init}")
                 symbol.cxn_init = None
-            if symbol.cxn_updates:
-                self.warning(f"clearing {symbol.symbol} updates {cxn}")
+            if symbol.cxn_updates and symbol.cxn_updates.session is session:
+                self.warning(f"clearing {symbol.symbol} updates {symbol.cxn_updates}")
                 symbol.cxn_updates = None
 
-    def gateway_connect(self, protocol):
+    def init_sessions(self):
+        """create the gateway sessions named in API_SESSION_ROUTES, and their standby partners if configured;
+        unrouted services use the 'main' session"""
+        self.sessions['main'] = RTX_Session(self, 'main', self.api_hostname, self.api_port)
+        for item in str(self.config.get('API_SESSION_ROUTES')).split(','):
+            if '=' in item:
+                route, name = [s.strip() for s in item.split('=', 1)]
+                if name not in self.sessions:
+                    self.sessions[name] = RTX_Session(self, name, self.api_hostname, self.api_port)
+                self.session_routes[route.replace('/', ';')] = self.sessions[name]
+                self.sessions[name].routes.append(route)
+        if self.api_standby_hostname:
+            for session in list(self.sessions.values()):
+                standby = RTX_Session(self, f"{session.name}-standby", self.api_standby_hostname, self.api_standby_port, session)
+                standby.partner, session.partner = session, standby
+                self.sessions[standby.name] = standby
+
+    def route_session(self, service, topic):
+        """return the configured session for (service, topic); a 'SERVICE/TOPIC' route takes precedence over 'SERVICE'"""
+        return self.session_routes.get(f"{service};{topic}") or self.session_routes.get(service) or self.sessions['main']
+
+    def session_for(self, service, topic):
+        """return the session new connections for (service, topic) should use; the partner while it is serving"""
+        session = self.route_session(service, topic)
+        return session.partner if session.partner and session.partner.serving else session
+
+    def session_available(self, service, topic):
+        """return True while a session carrying (service, topic) is up and serving it"""
+        session = self.route_session(service, topic)
+        return session.serving or bool(session.partner and session.partner.serving)
+
+    def gateway_groups_connected(self):
+        return all(s.group_connected() for s in self.sessions.values() if s.group is s)
+
+    def query_gateway_sessions(self):
+        return {name: session.query() for name, session in self.sessions.items()}
+
+    def gateway_connect(self, protocol, session):
         if protocol:
-            self.gateway_protocol = protocol
-            self.gateway_sender = protocol.sendLine
-            self.gateway_transport = protocol.transport
+            session.protocol = protocol
+            session.sender = protocol.sendLine
+            session.transport = protocol.transport
+            session.set_status('Pending')
             self.update_connection_status('Pending')
-            self.output('Awaiting startup response from RTX gateway at %s:%d...' % (self.api_hostname, self.api_port))
+            self.output(f"Awaiting startup response from RTX gateway at {session.host}:{session.port} ({session.name})...")
         else:
-            self.gateway_sender = None
-            self.gateway_protocol = None
-            self.gateway_transport = None
+            session.sender = None
+            session.protocol = None
+            session.transport = None
+            session.connected = False
+            session.seconds_disconnected = 0
+            session.set_status('Disconnected')
+            self.send_scheduler.clear(session)
+            self.cxn_clear(session)
+            serving, session.serving = session.serving, False
+            if session.partner and session.partner.connected:
+                if serving:
+                    self.failover_session(session, session.partner)
+                else:
+                    self.error_handler(self.id, f"API standby disconnected ({session.name})")
+                return self.gateway_receive
             self.connected = False
-            self.initialized = False
-            self.seconds_disconnected = 0
-            self.initial_account_request_pending = False
-            self.initial_order_request_pending = False
-            self.initial_execution_request_pending = False
-            self.initial_update_mapper_pending = False
-            self.accounts = None
-            self.update_connection_status('Disconnected')
-            self.error_handler(self.id, 'API Disconnected')
-            self.cxn_clear()
+            if session.carries('ACCOUNT_GATEWAY', 'ORDER'):
+                self.initialized = False
+                self.initial_account_request_pending = False
+                self.initial_order_request_pending = False
+                self.initial_execution_request_pending = False
+                self.initial_update_mapper_pending = False
+                self.accounts = None
+                self.update_connection_status('Disconnected')
+            else:
+                # orders are unaffected; only the services routed to this session are unavailable until it reconnects
+                self.update_connection_status('Degraded')
+            self.error_handler(self.id, f"API Disconnected ({session.name})")
         return self.gateway_receive
 
-    def gateway_send(self, msg):
+    def failover_session(self, source, target):
+        """move the advises and streams of a lost serving session to its connected partner without a re-init"""
+        self.error_handler(self.id, f"API Disconnected ({source.name}); failing over to {target.name}")
+        self.failover = API_Failover(self, source, target)
+        target.serving = True
+        orders = target.carries('ACCOUNT_GATEWAY', 'ORDER')
+        if orders:
+            self.advise_order_streams()
+        if target.carries('TA_SRV', 'LIVEQUOTE'):
+            for symbol in self.symbols.values():
+                symbol.api_initial_request()
+        self.failover.watch()
+        if orders and self.initialized:
+            # catch up on anything missed between the drop and the new advises
+            self.reconcile_order_cache()
+            if self.enable_position_cache and self.positions.ready:
+                self.request_position_snapshot()
+
+    def send_class(self, cmd, args):
+        """return the SEND_CLASSES priority class of a gateway command"""
+        if cmd == 'poke':
+            return 'order'
+        if cmd in ['terminate', 'execute'] or "DISP_NAME='$TIME'" in args:
+            return 'housekeeping'
+        return SEND_CLASS_TABLES.get(args.split(';', 1)[0], 'status')
+
+    def gateway_send(self, msg, send_class, session):
+        if session.sender:
+            # the advises resubmitted by a failover aren't held back by the rate limits
+            exempt = bool(self.failover and self.failover.target is session)
+            self.send_scheduler.send(msg, send_class, session, exempt)
+
+    def query_send_metrics(self):
+        return self.send_scheduler.query_metrics()
+
+    def gateway_write(self, msg, session):
         if self.debug_api_messages:
             self.output('<--TX[%d]--' % (len(msg)))
             hexdump(msg.encode())
         if self.log_api_messages:
             self.info(f"<-- {msg}")
-        if self.gateway_sender:
-            self.gateway_sender(('%s\n' % str(msg)).encode())
+        if session.sender:
+            session.sender(('%s\n' % str(msg)).encode())
 
     def dump_input_message(self, msg):
         self.output('--RX[%d]-->' % (len(msg)))
@@ -1423,7 +3487,7 @@ class RTX(object):
             reactor.callLater(0, reactor.stop)
         return None
 
-    def gateway_receive(self, msg):
+    def gateway_receive(self, msg, session):
         """handle input from rtgw """
 
         if self.debug_api_messages:
@@ -1442,7 +3506,7 @@ class RTX(object):
             self.output(f"--> {msg_type} {msg_id} {msg_data}")
 
         if msg_type == 'system':
-            self.handle_system_message(msg_id, msg_data)
+            self.handle_system_message(msg_id, msg_data, session)
         else:
             if msg_id in self.active_cxn:
                 c = self.active_cxn[msg_id].receive(msg_type, msg_data)
@@ -1451,20 +3515,46 @@ class RTX(object):
 
         return True
 
-    def handle_system_message(self, id, data):
+    def handle_system_message(self, id, data, session):
         if data['msg'] == 'startup':
-            self.connected = True
-            self.initialized = False
-            self.accounts = None
-            self.output(f"Received RTX Gateway startup response: {data['item']}")
-            self.update_connection_status('Initializing')
-            self.setup_local_queries()
+            session.connected = True
+            session.set_status('Up')
+            self.output(f"Received RTX Gateway startup response: {data['item']} ({session.name})")
+            for service, topic in CXN_POOL_PREWARM:
+                if session.carries(service, topic):
+                    self.cxn_pool(service, topic, session).prewarm()
+            if session.partner and session.partner.serving:
+                # the partner is carrying this group; stay connected and prewarmed as its standby
+                self.output(f"gateway session {session.name} ready as standby for {session.partner.name}")
+                return
+            session.serving = True
+            self.connected = self.gateway_groups_connected()
+            if session.carries('ACCOUNT_GATEWAY', 'ORDER'):
+                self.initialized = False
+            if self.connected:
+                self.update_connection_status('Up' if self.initialized else 'Initializing')
+            else:
+                self.update_connection_status('Degraded' if self.initialized else 'Pending')
+            self.setup_local_queries(session)
         else:
             self.error_handler(self.id, 'Unknown system message: %s' % repr(data))
 
-    def setup_local_queries(self):
-        """Upon connection to rtgw, start automatic queries"""
+    def setup_local_queries(self, session):
+        """Upon connection to rtgw, start the automatic queries carried by session"""
+        if session.carries('ACCOUNT_GATEWAY', 'ORDER'):
+            self.setup_order_queries()
+        if session.carries('TA_SRV', 'LIVEQUOTE'):
+            # on a reconnect, there may be symbols that need an advise
+            for symbol in self.symbols.values():
+                symbol.api_initial_request()
+
+    def advise_order_streams(self):
+        self.cxn_get('ACCOUNT_GATEWAY', 'ORDER').advise('ORDERS', '*', '', self.handle_order_update)
+        self.cxn_get('ACCOUNT_GATEWAY', 'ORDER').advise('ORDERS', '*', "TYPE='ExchangeTradeOrder'", self.handle_execution_update)
+
+    def setup_order_queries(self):
         #what='BANK,BRANCH,CUSTOMER,DEPOSIT'
+        self.accounts = None
         self.output("Sending initial Accounts query...")
         what = '*'
         self.rtx_request(
@@ -1472,29 +3562,24 @@ class RTX(object):
             self.callback_timeout['ACCOUNT'], self.handle_initial_account_failure
         )
 
-        self.output("Sending initial Orders query...")
-        self.cxn_get('ACCOUNT_GATEWAY', 'ORDER').advise('ORDERS', '*', '', self.handle_order_update)
-
+        self.output("Sending initial Orders and Executions queries...")
+        self.advise_order_streams()
         self.rtx_request(
             'ACCOUNT_GATEWAY', 'ORDER', 'ORDERS', '*', '', 'orders', self.handle_initial_orders_response,
             self.openorder_callbacks, self.callback_timeout['ORDERSTATUS'], self.handle_initial_orders_failure
         )
-
-        self.output("Sending initial Executions query...")
         execution_where = "TYPE='ExchangeTradeOrder'"
-        self.cxn_get('ACCOUNT_GATEWAY', 'ORDER').advise('ORDERS', '*', execution_where, self.handle_execution_update)
         self.rtx_request(
             'ACCOUNT_GATEWAY', 'ORDER', 'ORDERS', '*', execution_where, 'executions', self.handle_initial_executions_response,
             self.execution_callbacks, self.callback_timeout['ORDERSTATUS'], self.handle_initial_executions_failure
         )
 
-        # on a reconnect, there may be symbols that need an advise
-        for symbol in self.symbols.values():
-            symbol.api_initial_request()
-
         self.initial_account_request_pending = True
-        self.initial_order_request_pending = True
-        self.initial_execution_request_pending = True
+        # with the order journal, orders and executions were restored locally; the initial queries then only
+        # reconcile in the background instead of holding startup
+        warm = bool(self.order_journal and (self.orders or self.executions))
+        self.initial_order_request_pending = not warm
+        self.initial_execution_request_pending = not warm
         self.initial_update_mapper_pending = True
         self.initialized = False
 
@@ -1544,6 +3629,19 @@ class RTX(object):
 
     def open_client(self, client):
         self.clients.add(client)
+        if self.initialized:
+            self.send_delta_snapshots([client])
+
+    def send_delta_snapshots(self, clients):
+        """send the full order-data, ticket-data and execution-data state to clients subscribed to delta updates"""
+        for client in clients:
+            if isinstance(client, tcpserver):
+                for order in list(self.orders.values()):
+                    if client.options.get(f"{order.ticket}-delta"):
+                        client.send(f"{self.channel}.{order.ticket}-data {order.serialize()}")
+                if client.options.get('execution-delta'):
+                    for execution in list(self.executions.values()):
+                        client.send(f"{self.channel}.execution-data {execution.serialize()}")
 
     def close_client(self, client):
         self.clients.discard(client)
@@ -1572,6 +3670,9 @@ class RTX(object):
             # delete any callbacks that are done
             for cb in dlist:
                 cblist.remove(cb)
+        # drop coalesced requests whose callbacks have all expired, so a lost response doesn't hold the entry
+        for key in [key for key, pending in self.pending_requests.items() if pending.expired()]:
+            del self.pending_requests[key]
 
     def handle_order_update(self, cxn, msg):
         if msg:
@@ -1582,7 +3683,13 @@ class RTX(object):
     def handle_order_response(self, msg):
         #print('---handle_order_response: %s' % repr(msg))
         oid = msg.get('ORIGINAL_ORDER_ID')
-        if oid:
+        # the order objects add fields to msg; journal the row as received from the gateway
+        raw = dict(msg) if self.order_journal else msg
+        if oid and self.order_archive and oid in self.order_archive.orders and oid not in self.orders:
+            # terminal orders don't change; gateway refreshes must not reload archived orders into memory
+            self.debug(f"handle_order_response: ignoring archived order {oid}")
+        elif oid:
+            version = self.orders[oid].version if oid in self.orders else None
             if self.pending_orders and 'CLIENT_ORDER_ID' in msg:
                 # this is a newly created order, it has a CLIENT_ORDER_ID
                 coid = msg['CLIENT_ORDER_ID']
@@ -1602,6 +3709,8 @@ class RTX(object):
                 o = API_Order(self, oid, msg, 'realtick')
                 self.orders[oid] = o
                 o.update(msg)
+            self.orders.reindex(oid)
+            self.journal_row('orders', raw, self.orders.get(oid), version)
         else:
             self.error_handler(self.id, 'handle_order_response: ORIGINAL_ORDER_ID not found in %s' % repr(msg))
 
@@ -1623,18 +3732,44 @@ class RTX(object):
 
     def handle_execution_response(self, msg):
         oid = msg.get('ORDER_ID')
-        if oid:
+        raw = dict(msg) if self.order_journal else msg
+        if oid and self.order_archive and oid in self.order_archive.executions:
+            self.debug(f"handle_execution_response: ignoring archived execution {oid}")
+        elif oid and self.is_archived_order(self.execution_order_id(msg)):
+            # a late fill for an archived order is reported as usual, then filed with the order in the archive
+            e = API_Execution(self, oid)
+            e.update(msg)
+            self.journal_row('executions', raw, e, None)
+            self.account_data.invalidate(self.make_account(e.fields))
+            if self.enable_position_cache:
+                self.positions.apply_execution(e)
+            self.order_archive.write_execution(self.execution_order_id(msg), oid, e.render())
+        elif oid:
             if oid in self.executions:
                 # this is an existing execution
                 e = self.executions[oid]
+                version = e.version
+                e.update(msg)
+                self.executions.reindex(oid)
             else:
-                # we've never seen this execution, so add it to the collection
+                # we've never seen this execution, so add it to the collection once its fields are set
+                version = None
                 e = API_Execution(self, oid)
+                e.update(msg)
                 self.executions[oid] = e
-            e.update(msg)
+            self.journal_row('executions', raw, e, version)
+            if e.version != version:
+                self.account_data.invalidate(self.make_account(e.fields))
+            if self.enable_position_cache:
+                self.positions.apply_execution(e)
         else:
             self.error_handler(self.id, f"handle_execution_response: ORDER_ID not found in {repr(msg)}")
 
+    def journal_row(self, table, msg, obj, version):
+        """append a gateway row to the order journal if it changed the order or execution it was applied to"""
+        if self.order_journal and obj and obj.version != version:
+            self.order_journal.append(table, msg)
+
     def get_cusip(self, symbol):
         ret = ''
         symbol = self.symbols.get(symbol)
@@ -1642,8 +3777,13 @@ class RTX(object):
             ret = symbol.cusip
         return ret
 
-    def send_order_update(self, fields, mapped=False):
-        """send a rendered order out to clients"""
+    def send_order_update(self, fields, serialized=None, delta=None, mapped=False):
+        """send a rendered order out to clients; serialized is the cached JSON text of fields, if available
+
+        delta is the changed subset sent to order-delta clients; updates sent after CUSIP mapping carry the full order
+        """
+        if self.order_journal and self.order_journal.replaying:
+            return
         self.debug(f"{self} send_order_update({fields})")
         symbol = fields['symbol']
         if not fields.get('cusip'):
@@ -1662,10 +3802,15 @@ class RTX(object):
         _type = fields['raw']['TYPE']
         status = fields['status']
         self.WriteAllClients(f"{_class}.{oid} {account} {_type} {status}", option_flag=f"{_class}-notification")
-        self.WriteAllClients(f"{_class}-data {json.dumps(fields)}", option_flag=f"{_class}-data")
+        self.write_update_data(_class, fields, serialized, delta)
+
+    def send_execution_update(self, fields, serialized=None, delta=None, mapped=False):
+        """send a rendered execution out to clients; serialized is the cached JSON text of fields, if available
 
-    def send_execution_update(self, fields, mapped=False):
-        """send a rendered execution out to clients"""
+        delta is the changed subset sent to execution-delta clients; updates sent after CUSIP mapping carry all fields
+        """
+        if self.order_journal and self.order_journal.replaying:
+            return
         self.debug(f"{self} send_execution_update({fields})")
         symbol = fields['DISP_NAME']
         if not fields.get('CUSIP'):
@@ -1693,7 +3838,21 @@ class RTX(object):
             self.output(f"FILL: {xid} {cusip} {symbol} {transaction} {volume} {price} {remaining}")
 
         self.WriteAllClients(f"execution.{xid} {account} {oid} {status}", option_flag='execution-notification')
-        self.WriteAllClients(f"execution-data {json.dumps(fields)}", option_flag='execution-data')
+        self.write_update_data('execution', fields, serialized, delta)
+
+    def write_update_data(self, _class, fields, serialized, delta):
+        """write fields to <_class>-data clients and delta to <_class>-delta clients, serializing only what is sent
+
+        without a delta (updates sent after CUSIP mapping) delta clients get the full fields, serialized once
+        """
+        data_flag = f"{_class}-data"
+        delta_flag = f"{_class}-delta"
+        delta_clients = self.option_clients(delta_flag)
+        if self.option_clients(data_flag) or (delta_clients and not delta):
+            serialized = serialized or json.dumps(fields)
+            self.WriteAllClients(f"{data_flag} {serialized}", option_flag=data_flag)
+        if delta_clients:
+            self.WriteAllClients(f"{delta_flag} {json.dumps(delta) if delta else serialized}", option_flag=delta_flag)
 
     def make_account(self, row):
         return '%s.%s.%s.%s' % (row['BANK'], row['BRANCH'], row['CUSTOMER'], row['DEPOSIT'])
@@ -1745,12 +3904,39 @@ class RTX(object):
         else:
             return ret
 
-    def rtx_request(self, service, topic, table, what, where, label, handler, cb_list, timeout, error_handler=None):
-        cxn = self.cxn_get(service, topic)
-        cb = API_Callback(self, cxn.id, label, RTX_LocalCallback(self, handler, error_handler), timeout)
-        cxn.request(table, what, where, cb)
+    def rtx_request(
+        self, service, topic, table, what, where, label, handler, cb_list, timeout, error_handler=None, coalesce=True
+    ):
+        cb = API_Callback(self, 0, label, RTX_LocalCallback(self, handler, error_handler), timeout)
+        self.gateway_request(service, topic, table, what, where, cb, coalesce)
         cb_list.append(cb)
 
+    def gateway_request(self, service, topic, table, what, where, cb, coalesce=True):
+        """send a TQL request, or attach cb to an identical request that is still awaiting its response
+
+        requests whose handler depends on the state at the time of the request are sent with coalesce=False
+        """
+        m = self.request_metrics.setdefault(table, {'sent': 0, 'saved': 0})
+        if self.enable_request_coalescing and coalesce:
+            key = (service, topic, table, what, where)
+            pending = self.pending_requests.get(key)
+            if pending and not pending.expired():
+                pending.callbacks.append(cb)
+                m['saved'] += 1
+                return
+            pending = API_CoalescedRequest(self, key)
+            pending.callbacks.append(cb)
+            self.pending_requests[key] = pending
+            cb = pending
+        m['sent'] += 1
+        self.cxn_submit(service, topic, 'request', table, what, where, cb)
+
+    def query_request_metrics(self):
+        ret = dict(self.request_metrics)
+        a = self.account_data
+        ret['account_data'] = {'hit': a.hits, 'coalesced': a.coalesced, 'miss': a.misses}
+        return ret
+
     def is_startup_complete(self):
         startup_complete = False
         if self.initial_account_request_pending:
@@ -1777,28 +3963,89 @@ class RTX(object):
                     self.initialized = True
                     self.output('Initialization complete.')
                     self.update_connection_status('Up')
+                    self.send_delta_snapshots(list(self.clients))
+                    if self.enable_position_cache and not self.positions.ready:
+                        self.request_position_snapshot()
 
-            if self.enable_seconds_tick:
+            if self.enable_seconds_tick and self.session_available('TA_SRV', 'LIVEQUOTE'):
                 self.rtx_request(
                     'TA_SRV', 'LIVEQUOTE', 'LIVEQUOTE', 'DISP_NAME,TRDTIM_1,TRD_DATE', "DISP_NAME='$TIME'", 'tick',
                     self.handle_time, self.timer_callbacks, self.callback_timeout['TIMER'], self.handle_time_error
                 )
-        else:
-            self.seconds_disconnected += 1
-            if self.seconds_disconnected > self.gateway_disconnect_timeout:
-                if self.enable_gateway_disconnect_shutdown:
-                    self.force_disconnect('Realtick Gateway connection timed out after %d seconds' % self.seconds_disconnected)
+        for session in self.sessions.values():
+            if session.group is session and not session.group_connected():
+                session.seconds_disconnected += 1
+                if session.seconds_disconnected > self.gateway_disconnect_timeout:
+                    if self.enable_gateway_disconnect_shutdown:
+                        self.force_disconnect(
+                            f"Realtick Gateway connection timed out after {session.seconds_disconnected} seconds ({session.name})"
+                        )
         self.CheckPendingResults()
 
+        if self.failover:
+            self.failover.check_timeout()
+
         if self.enable_auto_reset:
             self.check_auto_reset()
 
+        if self.enable_symbol_barchart and self.barchart_reconcile_interval:
+            self.reconcile_barcharts()
+
+        if self.order_journal:
+            self.order_journal.flush()
+
+        if self.enable_pnl and self.pnl.dirty and not int(time.time()) % self.pnl_update_interval:
+            self.pnl.send_updates()
+
+        if self.enable_position_cache and self.position_reconcile_interval and self.positions.ready:
+            if not int(time.time()) % self.position_reconcile_interval:
+                self.request_position_snapshot()
+
+        if self.enable_order_cache and self.order_cache_reconcile_interval:
+            if not int(time.time()) % self.order_cache_reconcile_interval:
+                self.reconcile_order_cache()
+
+        if self.cxn_pool_idle_timeout:
+            for pool in self.cxn_pools.values():
+                pool.reap()
+
         if not int(time.time()) % 60:
             self.EveryMinute()
 
     def EveryMinute(self):
         if self.callback_metrics and self.log_callback_metrics:
             self.output('callback_metrics: %s' % json.dumps(self.callback_metrics))
+        if self.order_archive and self.initialized:
+            self.archive_orders()
+
+    def reconcile_barcharts(self):
+        """reconcile the symbols whose slot in the interval is due, so each is queried once per interval"""
+        if self.initialized and self.feed_now:
+            due = int(time.time()) % self.barchart_reconcile_interval
+            for symbol in list(self.symbols.values()):
+                if zlib.crc32(symbol.symbol.encode()) % self.barchart_reconcile_interval != due:
+                    continue
+                if symbol.cxn_updates and symbol.is_valid():
+                    symbol.barchart_reconcile()
+
+    def reconcile_order_cache(self):
+        """refresh orders and executions from the gateway to catch any updates missed by the advise"""
+        if self.initialized:
+            self.rtx_request(
+                'ACCOUNT_GATEWAY', 'ORDER', 'ORDERS', '*', '', 'orders', self.handle_order_cache_reconcile,
+                self.openorder_callbacks, self.callback_timeout['ORDERSTATUS'], self.handle_order_cache_reconcile_failure
+            )
+            self.rtx_request(
+                'ACCOUNT_GATEWAY', 'ORDER', 'ORDERS', '*', "TYPE='ExchangeTradeOrder'", 'executions',
+                self.handle_order_cache_reconcile, self.execution_callbacks, self.callback_timeout['ORDERSTATUS'],
+                self.handle_order_cache_reconcile_failure
+            )
+
+    def handle_order_cache_reconcile(self, results):
+        self.debug(f"order cache reconciled: {len(self.orders)} orders, {len(self.executions)} executions")
+
+    def handle_order_cache_reconcile_failure(self, message):
+        self.error_handler(self.id, f"order cache reconcile failed: {repr(message)}")
 
     def check_auto_reset(self):
         if time.strftime('%H:%M') == self.local_reset_time:
@@ -1817,17 +4064,18 @@ class RTX(object):
             self.info(f"WriteAllClients: {self.channel}.{msg} option_flag={option_flag}")
         msg = str('%s.%s' % (self.channel, msg))
         self.debug(f"WriteAllClients clients=[{','.join([repr(c) for c in self.clients])}]")
-        if option_flag:
-            # only write to clients with flag set in their options
-            client_set = set([c for c in self.clients if (isinstance(c, tcpserver) and c.options.get(option_flag))])
-        else:
-            # no flag, so write to all tcpserver clients
-            client_set = set([c for c in self.clients if isinstance(c, tcpserver)])
+        client_set = self.option_clients(option_flag)
 
         self.debug(f"WriteAllClients: selected=[{','.join([repr(c) for c in client_set])}]")
         for c in client_set:
             c.sendString(msg.encode())
 
+    def option_clients(self, option_flag=None):
+        """return the set of tcpserver clients with option_flag set in their options, or all of them if no flag"""
+        if option_flag:
+            return set([c for c in self.clients if (isinstance(c, tcpserver) and c.options.get(option_flag))])
+        return set([c for c in self.clients if isinstance(c, tcpserver)])
+
     def error_handler(self, id, msg):
         """report error messages"""
         self.output('ALERT: %s %s' % (id, msg))
@@ -1836,8 +4084,9 @@ class RTX(object):
     def force_disconnect(self, reason):
         self.update_connection_status('Shutdown')
         self.error_handler(self.id, f"Forcing shutdown: {reason}")
-        if self.gateway_transport:
-            self.gateway_transport.loseConnection()
+        for session in self.sessions.values():
+            if session.transport:
+                session.transport.loseConnection()
         for client in self.clients:
             client.transport.loseConnection()
         reactor.callLater(0, reactor.stop)
@@ -1911,13 +4160,18 @@ class RTX(object):
         else:
             self.error_handler(self.id, 'handle_time: unexpected null input')
 
+    def local_minute(self, apitime):
+        """return the local minute of day for an API time"""
+        t = self.localize_time(apitime)
+        return t.hour * 60 + t.minute
+
     def localize_time(self, apitime):
-        """return API time corrected for local timezone"""
-        return self.feedzone.localize(apitime).astimezone(self.localzone)
+        """return naive API time corrected for local timezone"""
+        return self.feed_converter.convert(apitime)
 
     def unlocalize_time(self, apitime):
-        """reverse localize_time to convert local timezone to API time"""
-        return self.localzone.localize(apitime).astimezone(self.feedzone)
+        """reverse localize_time to convert naive local time to API time"""
+        return self.local_converter.convert(apitime)
 
     def handle_time_error(self, error):
         #time timeout error is reported as an expired callback
@@ -1979,7 +4233,7 @@ class RTX(object):
         cb = API_Callback(
             self, tid, 'ticket', RTX_LocalCallback(self, self.ticket_submit_callback), self.callback_timeout['ORDER']
         )
-        self.cxn_get('ACCOUNT_GATEWAY', 'ORDER').poke('ORDERS', '*', '', fields, acb, cb)
+        self.cxn_submit('ACCOUNT_GATEWAY', 'ORDER', 'poke', 'ORDERS', '*', '', fields, acb, cb)
         # TODO: add cb and acb to callback lists so they can be tested for timeout
 
     def ticket_submit_ack_callback(self, data):
@@ -2089,7 +4343,7 @@ class RTX(object):
         cb = API_Callback(
             self, oid, 'order', RTX_LocalCallback(self, self.order_submit_callback), self.callback_timeout['ORDER']
         )
-        self.cxn_get('ACCOUNT_GATEWAY', 'ORDER').poke('ORDERS', '*', '', fields, acb, cb)
+        self.cxn_submit('ACCOUNT_GATEWAY', 'ORDER', 'poke', 'ORDERS', '*', '', fields, acb, cb)
 
     def order_submit_ack_callback(self, data):
         """called when order has been submitted with 'poke' and Ack has returned"""
@@ -2119,7 +4373,7 @@ class RTX(object):
                 msg['TYPE'] = 'UserSubmitCancel'
                 msg['REFERS_TO_ID'] = oid
                 fields = ','.join(['%s=%s' % (i, v) for i, v in msg.items()])
-                self.cxn_get('ACCOUNT_GATEWAY', 'ORDER').poke('ORDERS', '*', '', fields, None, cb)
+                self.cxn_submit('ACCOUNT_GATEWAY', 'ORDER', 'poke', 'ORDERS', '*', '', fields, None, cb)
                 self.cancel_callbacks.append(cb)
         else:
             cb.complete({'status': 'Error', 'errorMsg': 'Order not found', 'id': oid})
@@ -2177,47 +4431,181 @@ class RTX(object):
             self.error(f"{self} request_accounts; no data, but no account_request_pending")
             cb.complete(None)
 
-    def request_positions(self, callback):
-        cxn = self.cxn_get('ACCOUNT_GATEWAY', 'ORDER')
-        cb = API_Callback(self, 0, 'positions', callback, self.callback_timeout['POSITION'])
-        cxn.request('POSITION', '*', '', cb)
-        self.position_callbacks.append(cb)
+    def request_positions(self, callback, refresh=False):
+        if not refresh and self.enable_position_cache and self.positions.ready:
+            API_Callback(self, 0, 'cached_positions', callback).complete(None)
+        else:
+            cb = API_Callback(self, 0, 'positions', callback, self.callback_timeout['POSITION'])
+            self.gateway_request('ACCOUNT_GATEWAY', 'ORDER', 'POSITION', '*', '', cb)
+            self.position_callbacks.append(cb)
+
+    def request_position_snapshot(self):
+        """request gateway positions; the first response sets the positions baseline, later ones reconcile
+
+        the snapshot is compared with the fills applied when it was requested, so it isn't coalesced with an
+        earlier POSITION request
+        """
+        self.rtx_request(
+            'ACCOUNT_GATEWAY', 'ORDER', 'POSITION', '*', '', 'position_data',
+            API_PositionSnapshot(self, dict(self.positions.applied)).handle_snapshot, self.position_callbacks,
+            self.callback_timeout['POSITION'], self.handle_position_snapshot_failure, coalesce=False
+        )
+
+    def handle_position_snapshot_failure(self, message):
+        self.error_handler(self.id, f"position snapshot failed: {repr(message)}")
+
+    def query_pnl(self, account=None):
+        """return {account: {'realized', 'unrealized', 'total', 'symbols': {symbol: {...}}}} or None if P&L is disabled"""
+        return self.pnl.render(account) if self.enable_pnl else None
+
+    def send_position_update(self, account, symbol, quantity):
+        self.WriteAllClients(f"position.{account} {symbol} {quantity}", option_flag='position-notification')
+
+    def order_cache_ready(self, refresh_pending):
+        """return True if order queries may be answered from the advise-maintained state"""
+        return self.enable_order_cache and self.session_available('ACCOUNT_GATEWAY', 'ORDER') and not refresh_pending
+
+    def order_query(self, query):
+        """return order query filters as lists; values may be comma-separated strings or lists"""
+        ret = {}
+        for key, value in query.items():
+            if key not in ORDER_QUERY_KEYS:
+                raise ValueError(f"unknown order query key: {key}")
+            if value:
+                values = value.split(',') if isinstance(value, str) else list(value)
+                ret[key] = [v.upper() for v in values] if key == 'symbol' else values
+        return ret
+
+    def request_tickets(self, callback, refresh=False, **query):
+        self._request_orders(callback, 'tickets', refresh, query)
 
-    def request_tickets(self, callback):
-        self._request_orders(callback, 'tickets')
+    def request_orders(self, callback, refresh=False, **query):
+        self._request_orders(callback, 'orders', refresh, query)
+
+    def _request_orders(self, callback, label, refresh=False, query={}):
+        cb = API_Callback(self, 0, label, callback, self.callback_timeout['ORDERSTATUS'], self.order_query(query))
+        if not refresh and self.order_cache_ready(self.initial_order_request_pending):
+            # the ORDERS advise keeps self.orders current, so no gateway request is needed
+            cb.complete(None)
+        else:
+            self.gateway_request('ACCOUNT_GATEWAY', 'ORDER', 'ORDERS', '*', '', cb)
+            self.openorder_callbacks.append(cb)
 
-    def request_orders(self, callback):
-        self._request_orders(callback, 'orders')
+    def execution_order_id(self, fields):
+        """return the key of the order an execution belongs to; its ORIGINAL_ORDER_ID may name one of the order's ORDER_IDs"""
+        oid = fields.get('ORIGINAL_ORDER_ID')
+        if oid in self.orders:
+            return oid
+        parents = self.orders.lookup('order_id', oid)
+        return next(iter(parents)) if parents else oid
 
-    def _request_orders(self, callback, label):
-        cxn = self.cxn_get('ACCOUNT_GATEWAY', 'ORDER')
-        cb = API_Callback(self, 0, label, callback, self.callback_timeout['ORDERSTATUS'])
-        cxn.request('ORDERS', '*', '', cb)
-        self.openorder_callbacks.append(cb)
+    def is_archived_order(self, oid):
+        return bool(self.order_archive) and oid in self.order_archive.orders and oid not in self.orders
 
     def request_order(self, oid, callback):
         cb = API_Callback(self, oid, 'order_status', callback, self.callback_timeout['ORDERSTATUS'])
-        self.cxn_get('ACCOUNT_GATEWAY', 'ORDER').request('ORDERS', '*', "ORIGINAL_ORDER_ID='%s'" % oid, cb)
-        self.order_status_callbacks.append(cb)
+        if self.is_archived_order(oid):
+            cb.complete(None)
+        else:
+            self.gateway_request('ACCOUNT_GATEWAY', 'ORDER', 'ORDERS', '*', "ORIGINAL_ORDER_ID='%s'" % oid, cb)
+            self.order_status_callbacks.append(cb)
+
+    def query_order_history(self, oid):
+        """return the complete update history of an order, or None if the order is unknown"""
+        order = self.orders.get(oid)
+        if order:
+            return order.history()
+        if self.is_archived_order(oid):
+            return self.order_archive.read(oid)['history']
+        return None
+
+    def archive_orders(self):
+        """move terminal orders unchanged for order_archive_age seconds, with their executions, to the order archive"""
+        cutoff = time.time() - self.order_archive_age
+        oids = set().union(*[self.orders.lookup('status', status) for status in ORDER_ARCHIVE_STATUS])
+        archived = 0
+        for oid in oids:
+            order = self.orders[oid]
+            if order.changed > cutoff or oid in self.pending_orders:
+                continue
+            xids = list(self.executions.lookup('order', oid))
+            executions = {xid: self.executions[xid].render() for xid in xids}
+            self.order_archive.write(oid, order.render(), order.history(), executions)
+            for xid in xids:
+                del self.executions[xid]
+            del self.orders[oid]
+            self.order_history.discard(oid)
+            self.discard_mapper_updates(oid, xids)
+            archived += 1
+        if archived:
+            self.output(f"archived {archived} orders; {len(self.orders)} orders in memory")
+
+    def discard_mapper_updates(self, oid, xids):
+        """drop updates for an archived order and its executions still waiting on a CUSIP mapping"""
+        for mapper in self.pending_mapper_lookups.values():
+            mapper.updates = [
+                update for update in mapper.updates
+                if not (isinstance(update, API_Order_Update) and update.fields['permid'] == oid)
+                and not (isinstance(update, API_Execution_Update) and update.fields['ORDER_ID'] in xids)
+            ]
+
+    def query_changes_since(self, table, seq, epoch):
+        """return JSON text {'seq': N, 'epoch': E, 'resync': bool, table: {key: {'field': data, ...}, ...},
+        'removed': [key, ...]} for changes after seq; removed lists the keys archived or otherwise dropped from
+        memory after seq
+
+        if epoch isn't the change log's epoch from a previous response, or the log no longer covers seq, resync is
+        true and every current object is returned
+        """
+        store = self.orders if table == 'orders' else self.executions
+        filters = {'class': ['order']} if table == 'orders' else {}
+        keys, resync = self.changes.since(table, seq, epoch)
+        removed = []
+        if resync:
+            items = store.select(filters)
+        else:
+            items = [(key, store[key]) for key in keys if key in store]
+            removed = [key for key in keys if key not in store]
+            if filters:
+                items = [(key, obj) for key, obj in items if obj.ticket == 'order']
+        return (
+            f'{{"seq":{self.changes.seq},"epoch":"{self.changes.epoch}","resync":{json.dumps(resync)},'
+            f'"{table}":{join_serialized(items)},"removed":{json.dumps(removed)}}}'
+        )
 
-    def request_executions(self, callback):
-        cb = API_Callback(self, 0, 'executions', callback, self.callback_timeout['ORDERSTATUS'])
-        self.cxn_get('ACCOUNT_GATEWAY', 'ORDER').request('ORDERS', '*', "TYPE='ExchangeTradeOrder'", cb)
-        self.execution_callbacks.append(cb)
+    def request_executions(self, callback, refresh=False, **query):
+        cb = API_Callback(
+            self, 0, 'executions', callback, self.callback_timeout['ORDERSTATUS'], self.order_query(query)
+        )
+        if not refresh and self.order_cache_ready(self.initial_execution_request_pending):
+            # the execution advise keeps self.executions current, so no gateway request is needed
+            cb.complete(None)
+        else:
+            self.gateway_request('ACCOUNT_GATEWAY', 'ORDER', 'ORDERS', '*', "TYPE='ExchangeTradeOrder'", cb)
+            self.execution_callbacks.append(cb)
 
     def request_order_executions(self, oid, callback):
         cb = API_Callback(self, oid, 'order_executions', callback, self.callback_timeout['ORDERSTATUS'])
-        self.cxn_get('ACCOUNT_GATEWAY',
-                     'ORDER').request('ORDERS', '*', f"TYPE='ExchangeTradeOrder',ORIGINAL_ORDER_ID='{oid}'", cb)
-        self.execution_callbacks.append(cb)
+        if self.is_archived_order(oid):
+            cb.complete(None)
+        else:
+            self.gateway_request(
+                'ACCOUNT_GATEWAY', 'ORDER', 'ORDERS', '*', f"TYPE='ExchangeTradeOrder',ORIGINAL_ORDER_ID='{oid}'", cb
+            )
+            self.execution_callbacks.append(cb)
 
     def request_execution(self, xid, callback):
         cb = API_Callback(self, xid, 'execution', callback, self.callback_timeout['ORDERSTATUS'])
-        self.cxn_get('ACCOUNT_GATEWAY', 'ORDER').request('ORDERS', '*', f"TYPE='ExchangeTradeOrder',ORDER_ID='{xid}'", cb)
-        self.execution_status_callbacks.append(cb)
+        if self.order_archive and xid in self.order_archive.executions and xid not in self.executions:
+            cb.complete(None)
+        else:
+            self.gateway_request('ACCOUNT_GATEWAY', 'ORDER', 'ORDERS', '*', f"TYPE='ExchangeTradeOrder',ORDER_ID='{xid}'", cb)
+            self.execution_status_callbacks.append(cb)
 
     def request_account_data(self, account, fields, callback):
-        cxn = self.cxn_get('ACCOUNT_GATEWAY', 'ORDER')
+        self.account_data.request(account, fields, callback)
+
+    def request_account_data_query(self, account, fields, callback):
         cb = API_Callback(self, 0, 'account_data', callback, self.callback_timeout['ACCOUNT'])
         try:
             bank, branch, customer, deposit = account.split('.')[:4]
@@ -2229,7 +4617,7 @@ class RTX(object):
             fields = ','.join(fields)
         else:
             fields = '*'
-        cxn.request('DEPOSIT', fields, tql_where, cb)
+        self.gateway_request('ACCOUNT_GATEWAY', 'ORDER', 'DEPOSIT', fields, tql_where, cb)
         self.accountdata_callbacks.append(cb)
 
     def request_global_cancel(self):
@@ -2249,18 +4637,28 @@ class RTX(object):
         data = json.loads(data)
         self.output('global cancel: %s' % repr(data))
 
-    def _fail_query_bars(self, msg, callback):
+    def _fail_query_bars(self, msg, callback, structured=False):
         self.error_handler(self.id, msg)
-        API_Callback(self, 0, 'query_bars_failed', callback).complete(None)
+        label = 'query_bars_data_failed' if structured else 'query_bars_failed'
+        API_Callback(self, 0, label, callback).complete(None)
         return None
 
-    def query_bars(self, symbol, interval, bar_start, bar_end, callback):
+    def query_bars(self, symbol, interval, bar_start, bar_end, callback, structured=False, columns=False):
+        """request bars; callback receives a JSON string, or a list of bars if structured is set
+
+        if columns is set, the JSON string contains {'date': [...], 'time': [...], 'open': [...], ...}
+        """
+
+        if columns:
+            handler = API_BarColumns(self, callback)
+            callback = RTX_LocalCallback(self, handler.handle_response, handler.handle_failure)
+            structured = True
 
         if not self.enable_barchart:
-            return self._fail_query_bars('ALERT: query_bars unimplemented', callback)
+            return self._fail_query_bars('ALERT: query_bars unimplemented', callback, structured)
 
         if not symbol in self.symbols:
-            return self._fail_query_bars('query_bars failed: symbol %s not active' % symbol, callback)
+            return self._fail_query_bars('query_bars failed: symbol %s not active' % symbol, callback, structured)
 
         # intraday n-minute bars; given stop date, number of days, minutes_per_bar
         if str(interval).startswith('D'):
@@ -2276,8 +4674,7 @@ class RTX(object):
             table = 'INTRADAY'
             interval = int(interval)
 
-        session_start = datetime.datetime.strptime(self.symbols[symbol].rawdata['STARTTIME'], '%H:%M:%S')
-        session_stop = datetime.datetime.strptime(self.symbols[symbol].rawdata['STOPTIME'], '%H:%M:%S')
+        session_start, session_stop = self.session_times(symbol)
         #print('barchart session_start=%s session_stop=%s' % (session_start, session_stop))
 
         # if start time is a negative integer, use it as an offset from the end time
@@ -2309,14 +4706,18 @@ class RTX(object):
                 # bar_start provided with time; adjust timezone
                 bar_start = self.unlocalize_time(datetime.datetime.strptime(bar_start, '%Y-%m-%d %H:%M:%S')).isoformat(' ')[:19]
             elif not re.match('^\d\d\d\d-\d\d-\d\d$', bar_start):
-                return self._fail_query_bars('query_bars: bad parameter format bar_start=%s' % bar_start, callback)
+                return self._fail_query_bars(
+                    'query_bars: bad parameter format bar_start=%s' % bar_start, callback, structured
+                )
 
             if bar_end == '.':
                 bar_end = bar_start[:10]
             elif re.match('^\d\d\d\d-\d\d-\d\d \d\d:\d\d:\d\d$', bar_end):
                 bar_end = self.unlocalize_time(datetime.datetime.strptime(bar_end, '%Y-%m-%d %H:%M:%S')).isoformat(' ')[:19]
             elif not re.match('^\d\d\d\d-\d\d-\d\d$', bar_end):
-                return self._fail_query_bars('query_bars: bad parameter format bar_end=%s' % bar_end, callback)
+                return self._fail_query_bars(
+                    'query_bars: bad parameter format bar_end=%s' % bar_end, callback, structured
+                )
 
             if len(bar_start) == 10:
                 bar_start += session_start.time().strftime(' %H:%M:%S')
@@ -2337,7 +4738,30 @@ class RTX(object):
         if bar_end.time() > session_stop.time() or table == 'DAILY':
             bar_end = datetime.datetime(bar_end.year, bar_end.month, bar_end.day, session_stop.hour, session_stop.minute, 0)
 
-        where = ','.join(
+        if table == 'INTRADAY' and self.enable_bar_cache and self.feed_now and bar_start.date() == bar_end.date():
+            return API_BarCacheRequest(
+                self, symbol, interval, bar_start, bar_end, session_start, callback, structured
+            ).query()
+
+        self.request_bars(symbol, table, interval, bar_start, bar_end, 'barchart_data' if structured else 'barchart', callback)
+
+    def session_times(self, symbol):
+        """return the symbol session (start, stop) times in API time as datetime values"""
+        rawdata = self.symbols[symbol].rawdata
+        return (
+            datetime.datetime.strptime(rawdata['STARTTIME'], '%H:%M:%S'),
+            datetime.datetime.strptime(rawdata['STOPTIME'], '%H:%M:%S')
+        )
+
+    def request_bars(self, symbol, table, interval, bar_start, bar_end, label, callback):
+        """request bars, using the bar archive for closed session dates of INTRADAY and DAILY bars"""
+        if self.bar_archive and self.feed_now and (table == 'INTRADAY' or interval == 0):
+            if bar_start.date() < self.feed_now.date():
+                return API_BarArchiveRequest(self, symbol, table, interval, bar_start, bar_end, label, callback).query()
+        self.request_gateway_bars(symbol, table, interval, bar_start, bar_end, label, callback)
+
+    def bars_where(self, symbol, interval, bar_start, bar_end):
+        return ','.join(
             [
                 "DISP_NAME='%s'" % symbol,
                 "BARINTERVAL=%d" % interval,
@@ -2348,13 +4772,23 @@ class RTX(object):
             ]
         )
 
-        #print('barchart where=%s' % repr(where))
-
-        cb = API_Callback(self, '%s;%s' % (table, where), 'barchart', callback, self.callback_timeout['BARCHART'])
-        self.cxn_get('TA_SRV', BARCHART_TOPIC).request(table, BARCHART_FIELDS, where, cb)
+    def request_gateway_bars(self, symbol, table, interval, bar_start, bar_end, label, callback):
+        where = self.bars_where(symbol, interval, bar_start, bar_end)
+        cb = API_Callback(self, '%s;%s' % (table, where), label, callback, self.callback_timeout['BARCHART'])
+        self.gateway_request('TA_SRV', BARCHART_TOPIC, table, BARCHART_FIELDS, where, cb)
         self.bardata_callbacks.append(cb)
 
-    def format_barchart(self, rows):
+    def record_bar_cache_metrics(self, interval, hit):
+        m = self.bar_cache_metrics.setdefault(str(interval), {'hit': 0, 'miss': 0})
+        m['hit' if hit else 'miss'] += 1
+
+    def query_bar_cache_metrics(self):
+        ret = dict(self.bar_cache_metrics)
+        if self.bar_archive:
+            ret['archive'] = self.bar_archive.query_metrics()
+        return ret
+
+    def format_barchart(self, rows, serialize=True):
         #pprint({'format_barchart': rows})
         bars = None
         if type(rows) == list and len(rows) == 1:
@@ -2368,18 +4802,67 @@ class RTX(object):
             #print('types = %s' % repr(types))
             if types == {'DISP_NAME': str, 'TRD_DATE': list, 'TRDTIM_1': list, 'OPEN_PRC': list, 'HIGH_1': list, 'LOW_1': list,
                          'SETTLE': list, 'ACVOL_1': list}:
-                bars = [
-                    self.format_barchart_date(row['TRD_DATE'][i], row['TRDTIM_1'][i], self.id) + [
-                        self.parse_tql_float(row['OPEN_PRC'][i], self.id, 'OPEN_PRC'),
-                        self.parse_tql_float(row['HIGH_1'][i], self.id, 'HIGH_1'),
-                        self.parse_tql_float(row['LOW_1'][i], self.id, 'LOW_1'),
-                        self.parse_tql_float(row['SETTLE'][i], self.id, 'SETTLE'),
-                        self.parse_tql_int(row['ACVOL_1'][i], self.id, 'ACVOL_1')
-                    ] for i in range(len(row['TRD_DATE']))
-                ]
+                bars = self.decode_barchart(row)
         if not bars:
             self.error_handler(self, 'barchart data format failed: %s' % repr(rows))
-        return json.dumps(bars)
+        return json.dumps(bars) if serialize else bars
+
+    def decode_barchart(self, row):
+        """convert the gateway's parallel barchart columns into bar rows, decoding each column as a whole"""
+        stamps = self.decode_tql_timestamps(row['TRD_DATE'], row['TRDTIM_1'])
+        columns = [self.decode_tql_column(row[f], f, float_2) for f in ['OPEN_PRC', 'HIGH_1', 'LOW_1', 'SETTLE']]
+        columns.append(self.decode_tql_column(row['ACVOL_1'], 'ACVOL_1', int))
+        return [list(label) + list(values) for label, values in zip(self.format_timestamps(stamps), zip(*columns))]
+
+    def decode_tql_timestamps(self, dates, times):
+        """return local time as naive epoch seconds for parallel API date and time columns; None for invalid elements"""
+        day_seconds = {}
+        for bdate in set(dates):
+            bar_date = self.parse_tql_date(bdate, self.id, 'TRD_DATE')
+            day_seconds[bdate] = (bar_date.toordinal() - NAIVE_EPOCH_ORDINAL) * 86400 if bar_date else None
+        time_seconds = {}
+        for btime in set(times):
+            bar_time = self.parse_tql_time(btime, self.id, 'TRDTIM_1')
+            time_seconds[btime] = bar_time.hour * 3600 + bar_time.minute * 60 + bar_time.second if bar_time else None
+        convert = self.feed_converter.convert_seconds
+        stamps = []
+        for bdate, btime in zip(dates, times):
+            day, seconds = day_seconds[bdate], time_seconds[btime]
+            stamps.append(None if day is None or seconds is None else convert(day + seconds))
+        return stamps
+
+    def format_timestamps(self, stamps):
+        """return ('yyyy-mm-dd', 'hh:mm:ss') or ('', '') for each naive epoch timestamp"""
+        dates = {}
+        times = {}
+        labels = []
+        for stamp in stamps:
+            if stamp is None:
+                labels.append(('', ''))
+            else:
+                day, seconds = divmod(stamp, 86400)
+                if not day in dates:
+                    dates[day] = (NAIVE_EPOCH + datetime.timedelta(days=day)).date().isoformat()
+                if not seconds in times:
+                    times[seconds] = '%02d:%02d:%02d' % (seconds // 3600, seconds // 60 % 60, seconds % 60)
+                labels.append((dates[day], times[seconds]))
+        return labels
+
+    def decode_tql_column(self, column, label, convert):
+        """convert a column of TQL values, masking field error values as zero"""
+        masked = [i for i, v in enumerate(column) if str(v)[:6].lower() == 'error ']
+        if masked:
+            self.warning(f"{self} Field Parse Failure: {label} {len(masked)} values masked, first={column[masked[0]]}")
+            column = list(column)
+            for i in masked:
+                column[i] = None
+        return [convert(v) if v else convert(0) for v in column]
+
+    def format_barchart_columns(self, bars):
+        """return bar rows as {'date': [...], 'time': [...], 'open': [...], ...} or None"""
+        if bars:
+            return dict(zip(BARCHART_COLUMNS, [list(column) for column in zip(*bars)]))
+        return {column: [] for column in BARCHART_COLUMNS} if bars is not None else None
 
     def format_barchart_date(self, bdate, btime, pid):
         """return date and time as tuple ('yyyy-mm-dd', 'hh:mm:ss') or ('', '')"""
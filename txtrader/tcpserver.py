@@ -51,9 +51,12 @@ class tcpserver(basic.NetstringReceiver):
             'querydata': self.cmd_query_data,
             'symbols': self.cmd_symbols,
             'positions': self.cmd_positions,
+            'pnl': self.cmd_pnl,
             'orders': self.cmd_orders,
             'tickets': self.cmd_tickets,
             'executions': self.cmd_executions,
+            'orderssince': self.cmd_orders_since,
+            'executionssince': self.cmd_executions_since,
             'globalcancel': self.cmd_global_cancel,
             'cancel': self.cmd_cancel,
             'setaccount': self.cmd_setaccount,
@@ -108,8 +111,9 @@ class tcpserver(basic.NetstringReceiver):
             self.options = json.loads(options_field) if options_field else {}
         if self.factory.validate(username, password):
             self.authmap.add(self.transport.getPeer())
+            self.send('.Authorized %s' % self.factory.api.channel)
+            # open_client may send delta snapshots, which the client expects after the authorization response
             self.factory.api.open_client(self)
-            return '.Authorized %s' % self.factory.api.channel
         else:
             self.check_authorized()
 
@@ -158,8 +162,14 @@ class tcpserver(basic.NetstringReceiver):
     def cmd_getbars(self, line):
         if self.check_authorized() and self.check_initialized():
             _, symbol, period, start_date, start_time, end_date, end_time = line.split()[:7]
+            bar_format = line.split()[7] if len(line.split()) > 7 else 'rows'
             self.factory.api.query_bars(
-                symbol, period, ' '.join((start_date, start_time)), ' '.join((end_date, end_time)), self.send
+                symbol,
+                period,
+                ' '.join((start_date, start_time)),
+                ' '.join((end_date, end_time)),
+                self.send,
+                columns=bar_format == 'columns'
             )
 
     def cmd_add(self, line):
@@ -234,19 +244,68 @@ class tcpserver(basic.NetstringReceiver):
 
     def cmd_positions(self, line):
         if self.check_authorized() and self.check_initialized():
-            self.factory.api.request_positions(self.defer_response(self.send_response, 'positions'))
+            refresh = line.split()[1:2] == ['refresh']
+            self.factory.api.request_positions(self.defer_response(self.send_response, 'positions'), refresh)
+
+    def _order_query(self, line):
+        """parse '[refresh] [key=value ...]' order query arguments; values are comma-separated lists
+
+        an unknown key is answered with an error response, and returns a None query
+        """
+        refresh = False
+        query = {}
+        for token in line.split()[1:]:
+            if token == 'refresh':
+                refresh = True
+            elif '=' in token:
+                key, value = token.split('=', 1)
+                if key == 'refresh':
+                    refresh = value.lower() in ['1', 'true', 'yes']
+                else:
+                    query[key] = value
+        try:
+            self.factory.api.order_query(query)
+        except ValueError as ex:
+            self.send_response(str(ex), 'error')
+            query = None
+        return refresh, query
+
+    def cmd_pnl(self, line):
+        if self.check_authorized() and self.check_initialized():
+            account = line.split()[1] if len(line.split()) > 1 else None
+            self.send_response(json.dumps(self.factory.api.query_pnl(account)), 'pnl')
 
     def cmd_orders(self, line):
         if self.check_authorized() and self.check_initialized():
-            self.factory.api.request_orders(self.defer_response(self.send_response, 'orders'))
+            refresh, query = self._order_query(line)
+            if query is not None:
+                self.factory.api.request_orders(self.defer_response(self.send_response, 'orders'), refresh, **query)
 
     def cmd_tickets(self, line):
         if self.check_authorized() and self.check_initialized():
-            self.factory.api.request_tickets(self.defer_response(self.send_response, 'tickets'))
+            refresh, query = self._order_query(line)
+            if query is not None:
+                self.factory.api.request_tickets(self.defer_response(self.send_response, 'tickets'), refresh, **query)
 
     def cmd_executions(self, line):
         if self.check_authorized() and self.check_initialized():
-            self.factory.api.request_executions(self.defer_response(self.send_response, 'executions'))
+            refresh, query = self._order_query(line)
+            if query is not None:
+                self.factory.api.request_executions(
+                    self.defer_response(self.send_response, 'executions'), refresh, **query
+                )
+
+    def cmd_orders_since(self, line):
+        if self.check_authorized() and self.check_initialized():
+            seq = int(line.split()[1]) if len(line.split()) > 1 else 0
+            epoch = line.split()[2] if len(line.split()) > 2 else ''
+            self.send_response(self.factory.api.query_changes_since('orders', seq, epoch), 'orders-since')
+
+    def cmd_executions_since(self, line):
+        if self.check_authorized() and self.check_initialized():
+            seq = int(line.split()[1]) if len(line.split()) > 1 else 0
+            epoch = line.split()[2] if len(line.split()) > 2 else ''
+            self.send_response(self.factory.api.query_changes_since('executions', seq, epoch), 'executions-since')
 
     def cmd_global_cancel(self, line):
         if self.check_authorized() and self.check_initialized():
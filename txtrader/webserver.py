@@ -22,11 +22,22 @@ import os
 from datetime import datetime
 import ujson as json
 from txtrader import HEADER
+from txtrader.rtx import ORDER_QUERY_KEYS
 import traceback
 
 USABLE_BEFORE_INIT = ['status', 'uptime', 'version', 'help', 'shutdown']
 
 
+def is_true(value):
+    """interpret an optional request argument (GET string or POST json value) as a boolean"""
+    return str(value).lower() in ['1', 'true', 'yes']
+
+
+def order_query_args(args):
+    """return the order filter and projection arguments present in a request"""
+    return {k: args[k] for k in ORDER_QUERY_KEYS if k in args}
+
+
 class webserver(object):
 
     def __init__(self, api):
@@ -44,6 +55,9 @@ class webserver(object):
     def render(self, d, data):
         d.callback(json.dumps(data))
 
+    def render_json(self, d, text):
+        d.callback(text)
+
     def json_shutdown(self, args, d):
         """shutdown(message) 
 
@@ -181,11 +195,19 @@ class webserver(object):
         self.api.request_account_data(account, fields, d)
 
     def json_query_positions(self, args, d):
-        """query_positions() => {'account': {'fieldname': data, ...}, ...}
+        """query_positions([refresh]) => {'account': {'fieldname': data, ...}, ...}
 
         Return dict keyed by account containing dicts of position data fields
+        refresh=true forces a gateway query instead of answering from the position cache
         """
-        self.api.request_positions(d)
+        self.api.request_positions(d, refresh=is_true(args.get('refresh')))
+
+    def json_query_pnl(self, args, d):
+        """query_pnl(['account']) => {'account': {'realized': pnl, 'unrealized': pnl, 'total': pnl, 'symbols': {...}}, ...}
+
+        Return realized and unrealized P&L by account, with per-symbol position, cost, mark and P&L
+        """
+        self.render(d, self.api.query_pnl(args.get('account')))
 
     def json_query_order(self, args, d):
         """query_order('id') => {'fieldname': data, ...}
@@ -196,18 +218,42 @@ class webserver(object):
         self.api.request_order(oid, d)
 
     def json_query_orders(self, args, d):
-        """query_orders() => {'order_id': {'field': data, ...}, ...}
+        """query_orders([refresh], [status], [account], [symbol], [fields]) => {'order_id': {'field': data, ...}, ...}
 
         Return dict keyed by order id containing dicts of order data fields
+        refresh=true forces a gateway query instead of answering from the order cache
+        status, account and symbol select matching orders; fields limits the returned fields (comma-separated lists)
         """
-        self.api.request_orders(d)
+        self.api.request_orders(d, refresh=is_true(args.get('refresh')), **order_query_args(args))
+
+    def json_query_order_history(self, args, d):
+        """query_order_history('id') => [{'id': order_id, 'type': update_type, 'fields': {...}, 'time': time}, ...]
+
+        Return the complete update history of an order, including entries trimmed from the order's inline updates
+        """
+        oid = str(args['id'])
+        self.render(d, self.api.query_order_history(oid))
+
+    def json_query_orders_since(self, args, d):
+        """query_orders_since(seq, epoch) => {'seq': seq, 'epoch': epoch, 'resync': bool, 'orders': {'order_id': {'field': data, ...}, ...}, 'removed': ['order_id', ...]}
+
+        Return orders changed after change sequence number seq, and the current sequence number
+        removed lists orders archived or dropped from memory after seq
+        epoch is the value returned with seq; it identifies the server process the sequence numbers came from
+        resync=true means changes were dropped from the change log, or epoch is missing or from before a server
+        restart; the result then contains all orders
+        """
+        seq = int(args.get('seq', 0))
+        self.render_json(d, self.api.query_changes_since('orders', seq, str(args.get('epoch', ''))))
 
     def json_query_tickets(self, args, d):
-        """query_tickets() => {'order_id': {'field': data, ...}, ...}
+        """query_tickets([refresh], [status], [account], [symbol], [fields]) => {'order_id': {'field': data, ...}, ...}
 
         Return dict keyed by order id containing dicts of staged order ticket data fields
+        refresh=true forces a gateway query instead of answering from the order cache
+        status, account and symbol select matching tickets; fields limits the returned fields (comma-separated lists)
         """
-        self.api.request_tickets(d)
+        self.api.request_tickets(d, refresh=is_true(args.get('refresh')), **order_query_args(args))
 
     def json_query_execution(self, args, d):
         """query_execution('id') => {'fieldname': data, ...}
@@ -218,11 +264,25 @@ class webserver(object):
         self.api.request_execution(eid, d)
 
     def json_query_executions(self, args, d):
-        """query_executions() => {'exec_id': {'field': data, ...}, ...}
+        """query_executions([refresh], [status], [account], [symbol], [fields]) => {'exec_id': {'field': data, ...}, ...}
 
         Return dict keyed by execution id containing dicts of execution report data fields
+        refresh=true forces a gateway query instead of answering from the order cache
+        status (CURRENT_STATUS), account and symbol select matching executions; fields limits the returned fields
+        """
+        self.api.request_executions(d, refresh=is_true(args.get('refresh')), **order_query_args(args))
+
+    def json_query_executions_since(self, args, d):
+        """query_executions_since(seq, epoch) => {'seq': seq, 'epoch': epoch, 'resync': bool, 'executions': {'exec_id': {'field': data, ...}, ...}, 'removed': ['exec_id', ...]}
+
+        Return executions changed after change sequence number seq, and the current sequence number
+        removed lists executions archived or dropped from memory after seq
+        epoch is the value returned with seq; it identifies the server process the sequence numbers came from
+        resync=true means changes were dropped from the change log, or epoch is missing or from before a server
+        restart; the result then contains all executions
         """
-        self.api.request_executions(d)
+        seq = int(args.get('seq', 0))
+        self.render_json(d, self.api.query_changes_since('executions', seq, str(args.get('epoch', ''))))
 
     def json_query_order_executions(self, args, d):
         """query_executions() => {'exec_id': {'field': data, ...}, ...}
@@ -281,16 +341,53 @@ class webserver(object):
         self.api.stoplimit_order(account, route, symbol, stop_price, limit_price, quantity, d)
 
     def json_query_bars(self, args, d):
-        """query_bars('symbol', bar_period, 'start', 'end')
+        """query_bars('symbol', bar_period, 'start', 'end', ['format'])
               => ['Status: OK', [time, open, high, low, close, volume], ...]
 
         Return array containing status strings and lists of bar data if successful
+        format='columns' returns {'date': [...], 'time': [...], 'open': [...], ..., 'volume': [...]}
         """
         symbol = str(args['symbol']).upper()
         period = str(args['period']).upper()
         start = str(args['start'])
         end = str(args['end'])
-        self.api.query_bars(symbol, period, start, end, d)
+        columns = str(args.get('format', 'rows')) == 'columns'
+        self.api.query_bars(symbol, period, start, end, d, columns=columns)
+
+    def json_query_request_metrics(self, args, d):
+        """query_request_metrics() => {'table': {'sent': count, 'saved': count}, ..., 'account_data': {...}}
+
+        Return gateway requests sent and saved by coalescing, by TQL table, and account data cache counts
+        """
+        self.render(d, self.api.query_request_metrics())
+
+    def json_query_connection_stats(self, args, d):
+        """query_connection_stats() => {'session': {'service;topic': {'size': n, 'idle': n, 'waiting': n, ...}, ...}, ...}
+
+        Return gateway connection pool sizes and counters by session; avg_wait and max_wait are command queue waits in milliseconds
+        """
+        self.render(d, self.api.query_connection_stats())
+
+    def json_query_gateway_sessions(self, args, d):
+        """query_gateway_sessions() => {'name': {'host': host, 'port': port, 'routes': [route, ...], 'status': status, ...}, ...}
+
+        Return the RTGW sessions and the services routed to each
+        """
+        self.render(d, self.api.query_gateway_sessions())
+
+    def json_query_send_metrics(self, args, d):
+        """query_send_metrics() => {'class': {'rate': n, 'depth': n, 'sent': n, 'delayed': n, 'avg_wait': ms, ...}, ...}
+
+        Return gateway send queue depth and wait times by priority class
+        """
+        self.render(d, self.api.query_send_metrics())
+
+    def json_query_bar_cache_metrics(self, args, d):
+        """query_bar_cache_metrics() => {'interval': {'hit': count, 'miss': count}, ..., 'archive': {...}}
+
+        Return bar cache hit and miss counts for intraday query_bars requests by bar interval, and bar archive stats
+        """
+        self.render(d, self.api.query_bar_cache_metrics())
 
     def json_cancel_order(self, args, d):
         """cancel_order('id')